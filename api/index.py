@@ -3,10 +3,12 @@ Vercel Serverless API for AI Data Analyst
 """
 from flask import Flask, request, jsonify
 import os
+import sys
 import json
-import requests
-import pandas as pd
-from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts import http_client
+from scripts.dataset_store import datasets
 
 app = Flask(__name__)
 
@@ -19,8 +21,8 @@ PERPLEXITY_API_KEY = os.environ.get('PERPLEXITY_API_KEY', '')
 PERPLEXITY_API_URL = "https://api.perplexity.ai/chat/completions"
 PERPLEXITY_MODEL = "llama-3.1-sonar-small-128k-online"
 
-# In-memory storage for uploaded files (for demo - use cloud storage in production)
-uploaded_files = {}
+# Uploads are kept parsed in memory by scripts/dataset_store.py (for demo - use
+# cloud storage in production)
 
 HTML_TEMPLATE = '''<!DOCTYPE html>
 <html lang="en">
@@ -235,7 +237,7 @@ def call_openanalyst_api(prompt, system_message="You are a data analyst expert."
     }
 
     try:
-        response = requests.post(OPENANALYST_API_URL, headers=headers, json=payload, timeout=120)
+        response = http_client.post(OPENANALYST_API_URL, headers=headers, json=payload, timeout=120)
         response.raise_for_status()
         result = response.json()
         if "choices" in result and len(result["choices"]) > 0:
@@ -265,7 +267,7 @@ def call_perplexity_api(query):
     }
 
     try:
-        response = requests.post(PERPLEXITY_API_URL, headers=headers, json=payload, timeout=60)
+        response = http_client.post(PERPLEXITY_API_URL, headers=headers, json=payload, timeout=60)
         response.raise_for_status()
         result = response.json()
         return result.get("choices", [{}])[0].get("message", {}).get("content", "No response")
@@ -280,7 +282,7 @@ def index():
 
 @app.route('/api/files')
 def list_files():
-    return jsonify([{"name": name, "size": len(data)} for name, data in uploaded_files.items()])
+    return jsonify(datasets.list())
 
 
 @app.route('/api/upload', methods=['POST'])
@@ -289,7 +291,10 @@ def upload_file():
         return jsonify({'error': 'No file'}), 400
     file = request.files['file']
     if file.filename:
-        uploaded_files[file.filename] = file.read().decode('utf-8', errors='ignore')
+        try:
+            datasets.put(file.filename, file.read())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         return jsonify({'success': True})
     return jsonify({'error': 'Invalid file'}), 400
 
@@ -306,16 +311,15 @@ def analyze():
     # Build context from files
     context = ""
     for filename in files:
-        if filename in uploaded_files:
-            try:
-                df = pd.read_csv(StringIO(uploaded_files[filename]))
-                context += f"\\n--- {filename} ---\\n"
-                context += f"Columns: {list(df.columns)}\\n"
-                context += f"Shape: {df.shape}\\n"
-                context += f"Sample:\\n{df.head(20).to_string()}\\n"
-                context += f"Stats:\\n{df.describe().to_string()}\\n"
-            except:
-                context += f"\\n{filename}: Could not parse\\n"
+        df = datasets.get(filename)
+        if df is not None:
+            context += f"\\n--- {filename} ---\\n"
+            context += f"Columns: {list(df.columns)}\\n"
+            context += f"Shape: {df.shape}\\n"
+            context += f"Sample:\\n{df.head(20).to_string()}\\n"
+            context += f"Stats:\\n{df.describe().to_string()}\\n"
+        else:
+            context += f"\\n{filename}: Not in memory, upload it again\\n"
 
     prompt = f"Data:\\n{context}\\n\\nQuestion: {query}"
     result = call_openanalyst_api(prompt)
@@ -2,11 +2,28 @@
 AI Data Analysis Web App with Web Search
 Executes Python scripts based on user queries using AI API
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import os
 import subprocess
 import sys
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+
+from config import (EXECUTION_MODE, ANALYSIS_TIMEOUT, ANALYSIS_WORKERS, SINGLE_FLIGHT_ENABLED, ROUTER_MAX_INTENTS,
+                    LLM_CACHE_ENABLED)
+from scripts import engine, worker_pool, http_client
+from scripts.single_flight import SingleFlight
+from scripts.utils import (data_cache, load_file, ingest_reports, response_cache, similar_cache,
+                           error_output, output_section, merge_outputs, SECTION_SEPARATOR)
+from scripts.fingerprint import dataset_fingerprint
+from scripts.aggregates import get_cube
+from scripts.streaming import is_large
+from scripts.file_store import FileStore
+from scripts.web_search import cached_web_search, search_cache, SEARCH_TIMEOUT
+from scripts.router import router
+from scripts.search_index import get_index as get_search_index, stats as search_index_stats
+from scripts.vector_index import get_index as get_vector_index, stats as vector_index_stats
 
 app = Flask(__name__)
 
@@ -14,9 +31,30 @@ app = Flask(__name__)
 DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 SCRIPTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts')
 
+DATA_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
 # Ensure data folder exists
 os.makedirs(DATA_FOLDER, exist_ok=True)
 
+# Uploads, stored once per distinct content
+file_store = FileStore(DATA_FOLDER)
+
+# Analyses currently running, shared with identical requests
+flights = SingleFlight()
+
+# Build or memory-map the knowledge-base search indexes once at startup
+try:
+    get_search_index()
+    get_vector_index()
+except Exception:
+    pass  # reported by /api/retrieve
+
+# Threads waiting on the analyses of queries that ask for several at once
+fanout_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS * max(ROUTER_MAX_INTENTS, 1),
+                                     thread_name_prefix='fanout')
+# Web searches run here so a request can stop waiting after SEARCH_TIMEOUT
+search_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='web-search')
+
 
 @app.route('/')
 def index():
@@ -261,33 +299,72 @@ def index():
         btn.disabled = true;
         document.getElementById('queryInput').value = '';
 
-        var xhr = new XMLHttpRequest();
-        xhr.open('POST', '/api/analyze', true);
-        xhr.setRequestHeader('Content-Type', 'application/json');
-        xhr.onreadystatechange = function() {
-            if (xhr.readyState === 4) {
-                var loading = document.getElementById('loadingMsg');
-                if (loading) loading.remove();
-
-                var result = '';
-                var script = 'N/A';
-                try {
-                    var data = JSON.parse(xhr.responseText);
-                    result = data.result || data.error || 'No response';
-                    script = data.script || 'N/A';
-                } catch(e) {
-                    result = 'Error: ' + e.message;
-                }
+        var respDiv = null;
+        var text = '';
+        var script = 'N/A';
+
+        function showResponse(result) {
+            var loading = document.getElementById('loadingMsg');
+            if (loading) loading.remove();
+            var div = document.createElement('div');
+            div.className = 'message assistant';
+            div.innerHTML = '<div class="bubble"></div><div class="script-info">Script: ' + script + '</div>';
+            div.firstChild.textContent = result;
+            chatArea.appendChild(div);
+            chatArea.scrollTop = chatArea.scrollHeight;
+            return div;
+        }
 
-                var respDiv = document.createElement('div');
-                respDiv.className = 'message assistant';
-                respDiv.innerHTML = '<div class="bubble">' + result.replace(/</g, '&lt;') + '</div><div class="script-info">Script: ' + script + '</div>';
-                chatArea.appendChild(respDiv);
+        // Server-Sent Events: start, chunk (answer text as it is generated), done or error
+        function handleEvent(block) {
+            var event = 'message';
+            var data = '';
+            var lines = block.split('\\n');
+            for (var i = 0; i < lines.length; i++) {
+                if (lines[i].indexOf('event: ') === 0) event = lines[i].slice(7);
+                else if (lines[i].indexOf('data: ') === 0) data += lines[i].slice(6);
+            }
+            if (!data) return;
+            var payload = JSON.parse(data);
+            if (event === 'start') {
+                script = payload.script || 'N/A';
+            } else if (event === 'chunk') {
+                if (!respDiv) respDiv = showResponse('');
+                text += payload.text;
+                respDiv.firstChild.textContent = text;
                 chatArea.scrollTop = chatArea.scrollHeight;
-                btn.disabled = false;
+            } else if (event === 'done' || event === 'error') {
+                var result = payload.result || payload.error || 'No response';
+                if (!respDiv) respDiv = showResponse(result);
+                else respDiv.firstChild.textContent = result;
             }
-        };
-        xhr.send(JSON.stringify({query: query, files: selectedFiles}));
+        }
+
+        fetch('/api/analyze', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({query: query, files: selectedFiles, stream: true})
+        }).then(function(response) {
+            var reader = response.body.getReader();
+            var decoder = new TextDecoder();
+            var buffer = '';
+            function pump() {
+                return reader.read().then(function(chunk) {
+                    if (chunk.done) return;
+                    buffer += decoder.decode(chunk.value, {stream: true});
+                    var blocks = buffer.split('\\n\\n');
+                    buffer = blocks.pop();
+                    blocks.forEach(handleEvent);
+                    return pump();
+                });
+            }
+            return pump();
+        }).catch(function(e) {
+            if (!respDiv) respDiv = showResponse('Error: ' + e.message);
+        }).then(function() {
+            if (!respDiv) showResponse('No response');
+            btn.disabled = false;
+        });
     }
 
     function webSearch() {
@@ -355,16 +432,7 @@ def index():
 @app.route('/api/files')
 def list_files():
     """List available data files"""
-    files = []
-    if os.path.exists(DATA_FOLDER):
-        for f in os.listdir(DATA_FOLDER):
-            if f.endswith(('.csv', '.xlsx', '.xls')):
-                path = os.path.join(DATA_FOLDER, f)
-                files.append({
-                    'name': f,
-                    'size': os.path.getsize(path)
-                })
-    return jsonify(sorted(files, key=lambda x: x['name']))
+    return jsonify(file_store.list(DATA_EXTENSIONS))
 
 
 @app.route('/api/upload', methods=['POST'])
@@ -377,9 +445,21 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    if file.filename.endswith(('.csv', '.xlsx', '.xls')):
-        filepath = os.path.join(DATA_FOLDER, file.filename)
-        file.save(filepath)
+    if file.filename.endswith(DATA_EXTENSIONS):
+        filepath, created = file_store.save(file.filename, file.stream)
+
+        # Parse once now: writes the typed columnar copy, warms the cache
+        # and materializes the aggregate cube used by the analysis prompts.
+        # Identical bytes were already prepared; files too large to load are
+        # read in chunks on first analysis instead.
+        if not created or is_large([filepath]):
+            return jsonify({'success': True, 'filename': file.filename})
+        try:
+            df = data_cache.get(filepath, load_file)
+            if df is not None:
+                get_cube(df, dataset_fingerprint([filepath]))
+        except Exception:
+            pass  # parse errors are reported when the file is analyzed
         return jsonify({'success': True, 'filename': file.filename})
 
     return jsonify({'error': 'Invalid file type'}), 400
@@ -387,117 +467,308 @@ def upload_file():
 
 def detect_query_type(query):
     """Detect the type of analysis needed based on query keywords"""
-    query_lower = query.lower()
-
-    if any(word in query_lower for word in ['summary', 'overview', 'describe', 'what is this', 'about']):
-        return 'summary', 'summary_analysis.py'
-    if any(word in query_lower for word in ['top', 'best', 'highest', 'most', 'largest', 'greatest', 'leading']):
-        return 'top', 'top_analysis.py'
-    if any(word in query_lower for word in ['compare', 'versus', 'vs', 'difference', 'between']):
-        return 'compare', 'compare_analysis.py'
-    if any(word in query_lower for word in ['trend', 'time', 'over time', 'growth', 'change', 'monthly', 'yearly', 'pattern']):
-        return 'trend', 'trend_analysis.py'
-    if any(word in query_lower for word in ['profit', 'margin', 'earnings', 'revenue', 'income', 'cost']):
-        return 'profit', 'profit_analysis.py'
-    if any(word in query_lower for word in ['region', 'location', 'geography', 'state', 'city', 'country', 'area']):
-        return 'region', 'region_analysis.py'
-    return 'custom', 'custom_query.py'
+    return router.detect(query)
+
+
+def route_query(query, file_paths):
+    """[(type, script)] for every analysis the query asks for, best match first"""
+    return [(name, script) for name, script, _ in router.route(query, ROUTER_MAX_INTENTS)]
+
+
+class ScriptError(Exception):
+    """Raised when an analysis script exits with an error"""
+
+
+def run_script(query_type, script_name, query, file_paths, cache):
+    """Run an analysis script in a fresh interpreter and parse its JSON output"""
+    script_path = os.path.join(SCRIPTS_FOLDER, script_name)
+
+    if query_type == 'summary':
+        cmd = [sys.executable, script_path] + file_paths
+    else:
+        cmd = [sys.executable, script_path, query] + file_paths
+
+    env = dict(os.environ,
+               LLM_CACHE='1' if cache['use_cache'] else '0',
+               LLM_CACHE_REFRESH='1' if cache['refresh'] else '0')
+    result = subprocess.run(
+        cmd,
+        capture_output=True,
+        text=True,
+        timeout=ANALYSIS_TIMEOUT,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env
+    )
+
+    output = result.stdout.strip()
+    if result.returncode != 0:
+        raise ScriptError(result.stderr or 'Script execution failed')
+
+    try:
+        return json.loads(output)
+    except json.JSONDecodeError:
+        return {'result': output}
 
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     """Analyze data using appropriate Python script"""
     data = request.json
+    query, file_paths, error = parse_analysis_request(data)
+    if error:
+        return jsonify({'error': error, 'script': 'N/A'})
+
+    routes = route_query(query, file_paths)
+    script_name = ' + '.join(script for _, script in routes)
+    cache = cache_options(data)
+
+    if data.get('stream'):
+        return Response(
+            stream_with_context(stream_analysis(routes, script_name, query, file_paths, cache)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    try:
+        output_data = flights.run(
+            flight_key(routes, query, file_paths, cache),
+            lambda: execute_routes(routes, query, file_paths, cache),
+            ANALYSIS_TIMEOUT
+        )
+    except (subprocess.TimeoutExpired, FutureTimeout):
+        return jsonify({'error': 'Analysis timed out (2 min limit)', 'script': script_name})
+    except Exception as e:
+        return jsonify({'error': str(e), 'script': script_name})
+
+    return jsonify(analysis_response(output_data, script_name))
+
+
+def parse_analysis_request(data):
+    """Validate an analyze request body; returns (query, file_paths, error)"""
     query = data.get('query', '')
     files = data.get('files', [])
 
     if not query:
-        return jsonify({'error': 'No query provided', 'script': 'N/A'})
+        return query, [], 'No query provided'
 
     if not files:
-        return jsonify({'error': 'No files selected', 'script': 'N/A'})
+        return query, [], 'No files selected'
 
-    file_paths = [os.path.join(DATA_FOLDER, f) for f in files]
+    file_paths = []
+    for f in files:
+        path = file_store.resolve(f)
+        if path is None:
+            return query, file_paths, 'File not found: ' + f
+        file_paths.append(path)
 
-    for fp in file_paths:
-        if not os.path.exists(fp):
-            return jsonify({'error': 'File not found: ' + fp, 'script': 'N/A'})
+    return query, file_paths, None
 
-    query_type, script_name = detect_query_type(query)
-    script_path = os.path.join(SCRIPTS_FOLDER, script_name)
 
-    if query_type == 'summary':
-        cmd = [sys.executable, script_path] + file_paths
-    else:
-        cmd = [sys.executable, script_path, query] + file_paths
+def cache_options(data):
+    """Model cache arguments from an analyze request's refresh/no_cache flags"""
+    return {
+        'use_cache': LLM_CACHE_ENABLED and not data.get('no_cache'),
+        'refresh': bool(data.get('refresh')),
+    }
 
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=120,
-            cwd=os.path.dirname(os.path.abspath(__file__))
-        )
 
-        output = result.stdout.strip()
-        if result.returncode != 0:
-            error_msg = result.stderr or 'Script execution failed'
-            return jsonify({'error': error_msg, 'script': script_name})
+def flight_key(routes, query, file_paths, cache):
+    """Key identical in-flight analyses share, or None when coalescing is off"""
+    if not SINGLE_FLIGHT_ENABLED:
+        return None
+    keys = tuple(engine.analysis_key(query_type, query, file_paths) for query_type, _ in routes)
+    return keys + (cache['use_cache'], cache['refresh'])
 
+
+def section_name(query_type):
+    """Heading for an analysis that failed within a multi-part answer"""
+    return query_type.title() + ' Analysis'
+
+
+def execute_analysis(query_type, script_name, query, file_paths, cache):
+    """Run an analysis with the configured execution backend"""
+    if EXECUTION_MODE == 'subprocess':
+        return run_script(query_type, script_name, query, file_paths, cache)
+    if EXECUTION_MODE == 'pool':
+        return worker_pool.execute(query_type, query, file_paths, timeout=ANALYSIS_TIMEOUT, cache=cache)
+    return engine.execute(query_type, query, file_paths, timeout=ANALYSIS_TIMEOUT, cache=cache)
+
+
+def execute_routes(routes, query, file_paths, cache):
+    """Run the routed analyses and return one output dict"""
+    if len(routes) == 1:
+        query_type, script_name = routes[0]
+        return execute_analysis(query_type, script_name, query, file_paths, cache)
+    for kind, payload in fan_out(routes, query, file_paths, cache):
+        if kind == 'done':
+            return payload
+
+
+def fan_out(routes, query, file_paths, cache):
+    """Run several analyses at once on the same files
+
+    Yields each analysis as a ('chunk', markdown section) as soon as it
+    finishes, then ('done', merged output) with the sections in route order.
+    Raises concurrent.futures.TimeoutError if they do not all finish in time.
+    """
+    futures = {
+        fanout_executor.submit(execute_analysis, query_type, script_name, query, file_paths, cache): query_type
+        for query_type, script_name in routes
+    }
+    outputs = {}
+    for future in as_completed(futures, timeout=ANALYSIS_TIMEOUT):
+        query_type = futures[future]
         try:
-            output_data = json.loads(output)
-            return jsonify({
-                'result': output_data.get('result', output),
-                'title': output_data.get('title', 'Analysis'),
-                'success': output_data.get('success', True),
-                'script': script_name
-            })
-        except json.JSONDecodeError:
-            return jsonify({'result': output, 'script': script_name})
-
-    except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Analysis timed out (2 min limit)', 'script': script_name})
+            output = future.result()
+        except (subprocess.TimeoutExpired, FutureTimeout):
+            output = error_output('Analysis timed out')
+        except Exception as e:
+            output = error_output(str(e))
+        # Questions the fast path answers get the same computed table from every analysis
+        if output.get('success', True) and output in outputs.values():
+            continue
+        outputs[query_type] = output
+        yield 'chunk', output_section(output, section_name(query_type)) + SECTION_SEPARATOR
+    if len(outputs) == 1:
+        yield 'done', next(iter(outputs.values()))
+        return
+    yield 'done', merge_outputs([(section_name(t), outputs[t]) for t, _ in routes if t in outputs])
+
+
+def analysis_response(output_data, script_name):
+    """Shape an analysis output dict for the UI"""
+    if not output_data.get('success', True):
+        return {'error': output_data.get('error', 'Analysis failed'), 'script': script_name}
+
+    return {
+        'result': output_data.get('result'),
+        'title': output_data.get('title', 'Analysis'),
+        'success': output_data.get('success', True),
+        'script': script_name
+    }
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_analysis(routes, script_name, query, file_paths, cache):
+    """Run the routed analyses and emit their answer as Server-Sent Events
+
+    Sends 'chunk' events as the model generates text (in-process mode only;
+    other backends send the whole answer at the end), or one per finished
+    analysis when several run at once, then 'done' or 'error'.
+    """
+    yield sse_event('start', {'script': script_name})
+    try:
+        events = flights.stream(
+            flight_key(routes, query, file_paths, cache),
+            lambda: route_events(routes, query, file_paths, cache),
+            ANALYSIS_TIMEOUT
+        )
+        for kind, payload in events:
+            if kind == 'chunk':
+                yield sse_event('chunk', {'text': payload})
+            else:
+                output_data = payload
+    except (subprocess.TimeoutExpired, FutureTimeout):
+        yield sse_event('error', {'error': 'Analysis timed out (2 min limit)', 'script': script_name})
+        return
     except Exception as e:
-        return jsonify({'error': str(e), 'script': script_name})
+        yield sse_event('error', {'error': str(e), 'script': script_name})
+        return
+
+    response = analysis_response(output_data, script_name)
+    yield sse_event('error' if 'error' in response else 'done', response)
+
+
+def route_events(routes, query, file_paths, cache):
+    """Yield ('chunk', text) events while the routed analyses run, then ('done', output)"""
+    if len(routes) == 1:
+        query_type, script_name = routes[0]
+        return analysis_events(query_type, script_name, query, file_paths, cache)
+    return fan_out(routes, query, file_paths, cache)
+
+
+def analysis_events(query_type, script_name, query, file_paths, cache):
+    """Yield ('chunk', text) events while the model answers, then ('done', output)"""
+    if EXECUTION_MODE in ('subprocess', 'pool'):
+        yield 'done', execute_analysis(query_type, script_name, query, file_paths, cache)
+    else:
+        yield from engine.stream(query_type, query, file_paths, timeout=ANALYSIS_TIMEOUT, cache=cache)
 
 
 @app.route('/api/web-search', methods=['POST'])
 def web_search():
-    """Perform web search using Perplexity API"""
+    """Perform web search using Perplexity API, answering repeated searches from the cache"""
     data = request.json
     query = data.get('query', '')
 
     if not query:
         return jsonify({'error': 'No query provided'})
 
-    script_path = os.path.join(SCRIPTS_FOLDER, 'web_search.py')
-    cmd = [sys.executable, script_path, query]
-
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60,
-            cwd=os.path.dirname(os.path.abspath(__file__))
-        )
+        return jsonify(search_executor.submit(cached_web_search, query).result(timeout=SEARCH_TIMEOUT))
+    except FutureTimeout:
+        return jsonify({'error': 'Web search timed out'})
+    except Exception as e:
+        return jsonify({'error': str(e)})
 
-        output = result.stdout.strip()
-        if result.returncode != 0:
-            error_msg = result.stderr or 'Web search failed'
-            return jsonify({'error': error_msg})
 
-        try:
-            output_data = json.loads(output)
-            return jsonify(output_data)
-        except json.JSONDecodeError:
-            return jsonify({'result': output})
+@app.route('/api/retrieve', methods=['POST'])
+def retrieve():
+    """Search the knowledge base (rag_data.json), optionally by category and tags
 
-    except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Web search timed out'})
+    mode 'bm25' (default) ranks by keywords and 'dense' by vector similarity.
+    'queries' searches several at once and returns one result list per query.
+    """
+    data = request.json
+    queries = data.get('queries') or ([data['query']] if data.get('query') else [])
+    mode = data.get('mode', 'bm25')
+    category = data.get('category')
+    tags = data.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tags]
+
+    if not queries:
+        return jsonify({'error': 'No query provided'})
+    if mode not in ('bm25', 'dense'):
+        return jsonify({'error': 'Unknown search mode: ' + str(mode)})
+
+    try:
+        k = min(max(int(data.get('k', 5)), 1), 100)
+        index = get_search_index()
+        vectors = get_vector_index() if mode == 'dense' else None
     except Exception as e:
         return jsonify({'error': str(e)})
+    if index is None:
+        return jsonify({'error': 'No knowledge base found'})
+
+    start = time.perf_counter()
+    if mode == 'dense':
+        results = vectors.results(queries, k, index.allowed(category, tags), index.terms)
+    else:
+        results = [index.results(query, k, category, tags) for query in queries]
+    took_ms = round((time.perf_counter() - start) * 1000, 3)
+    return jsonify({'results': results if data.get('queries') else results[0], 'took_ms': took_ms})
+
+
+@app.route('/api/stats')
+def stats():
+    """Report cache and worker statistics for this server process"""
+    return jsonify({
+        'data_cache': data_cache.stats(),
+        'ingest': ingest_reports,
+        'llm_cache': response_cache.stats(),
+        'similar_query_cache': similar_cache.stats(),
+        'web_search_cache': search_cache.stats(),
+        'single_flight': flights.stats(),
+        'worker_pool': worker_pool.stats(),
+        'search_index': search_index_stats(),
+        'vector_index': vector_index_stats(),
+        'http': http_client.stats()
+    })
 
 
 if __name__ == '__main__':
@@ -0,0 +1,194 @@
+"""
+ASGI entry point
+Serves /api/analyze and /api/web-search on an asyncio event loop so slow model
+and search calls do not hold a thread each; every other route is the Flask app.
+Run with: uvicorn asgi:app --port 3000
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from config import ANALYSIS_TIMEOUT, SEARCH_TIMEOUT
+from scripts import engine, async_ai
+from scripts.utils import error_output, output_section, merge_outputs, SECTION_SEPARATOR
+from scripts.single_flight import AsyncSingleFlight
+from app import (app as flask_app, route_query, parse_analysis_request, analysis_response, sse_event, flight_key,
+                 section_name, cache_options)
+
+TIMEOUT_ERROR = 'Analysis timed out (2 min limit)'
+
+# Analyses currently running on this event loop, shared with identical requests
+flights = AsyncSingleFlight()
+# Commentary on a computed answer, shared by every analysis a question is routed to
+commentary = AsyncSingleFlight()
+
+
+async def run_analysis(query_type, query, file_paths, cache, on_chunk=None):
+    """Load data on the analysis threads, then await the model call"""
+    loop = asyncio.get_running_loop()
+    request = await loop.run_in_executor(engine.get_executor(), engine.prepare_analysis,
+                                         query_type, query, file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    if request['answer'] is not None and request['prompt'] is not None:
+        key = (request['prompt'], request['system_message'], tuple(sorted(cache.items())))
+        return await commentary.run(key, lambda: async_ai.complete_request(request, on_chunk, **cache),
+                                    ANALYSIS_TIMEOUT)
+    return await async_ai.complete_request(request, on_chunk, **cache)
+
+
+async def run_routes(routes, query, file_paths, cache):
+    """Run the routed analyses and return one output dict"""
+    if len(routes) == 1:
+        return await run_analysis(routes[0][0], query, file_paths, cache)
+    async for kind, payload in fan_out(routes, query, file_paths, cache):
+        if kind == 'done':
+            return payload
+
+
+async def fan_out(routes, query, file_paths, cache):
+    """Run several analyses at once, yielding each section as it finishes, then the merged output"""
+    async def labelled(query_type):
+        try:
+            return query_type, await run_analysis(query_type, query, file_paths, cache)
+        except Exception as e:
+            return query_type, error_output(str(e))
+
+    tasks = [asyncio.create_task(labelled(query_type)) for query_type, _ in routes]
+    outputs = {}
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=ANALYSIS_TIMEOUT):
+            query_type, output = await next_done
+            # Questions the fast path answers get the same computed table from every analysis
+            if output.get('success', True) and output in outputs.values():
+                continue
+            outputs[query_type] = output
+            yield 'chunk', output_section(output, section_name(query_type)) + SECTION_SEPARATOR
+        if len(outputs) == 1:
+            yield 'done', next(iter(outputs.values()))
+        else:
+            yield 'done', merge_outputs([(section_name(t), outputs[t]) for t, _ in routes if t in outputs])
+    finally:
+        for task in tasks:
+            task.cancel()  # timed out or the client went away
+
+
+async def analyze(request):
+    """Analyze data without blocking the event loop"""
+    data = await request.json()
+    # Resolving uploads and fingerprinting them reads files, so keep it off the loop
+    query, file_paths, error = await asyncio.to_thread(parse_analysis_request, data)
+    if error:
+        return JSONResponse({'error': error, 'script': 'N/A'})
+
+    routes = route_query(query, file_paths)
+    script_name = ' + '.join(script for _, script in routes)
+    cache = cache_options(data)
+    key = await asyncio.to_thread(flight_key, routes, query, file_paths, cache)
+
+    if data.get('stream'):
+        return StreamingResponse(
+            stream_analysis(routes, script_name, query, file_paths, cache, key),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    try:
+        output_data = await flights.run(
+            key,
+            lambda: asyncio.wait_for(run_routes(routes, query, file_paths, cache), ANALYSIS_TIMEOUT),
+            ANALYSIS_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return JSONResponse({'error': TIMEOUT_ERROR, 'script': script_name})
+    except Exception as e:
+        return JSONResponse({'error': str(e), 'script': script_name})
+
+    return JSONResponse(analysis_response(output_data, script_name))
+
+
+async def stream_analysis(routes, script_name, query, file_paths, cache, key):
+    """Run the routed analyses and emit their answer as Server-Sent Events"""
+    yield sse_event('start', {'script': script_name})
+    try:
+        events = flights.stream(
+            key,
+            lambda: route_events(routes, query, file_paths, cache),
+            ANALYSIS_TIMEOUT
+        )
+        async for kind, payload in events:
+            if kind == 'chunk':
+                yield sse_event('chunk', {'text': payload})
+            else:
+                output_data = payload
+    except asyncio.TimeoutError:
+        yield sse_event('error', {'error': TIMEOUT_ERROR, 'script': script_name})
+        return
+    except Exception as e:
+        yield sse_event('error', {'error': str(e), 'script': script_name})
+        return
+
+    response = analysis_response(output_data, script_name)
+    yield sse_event('error' if 'error' in response else 'done', response)
+
+
+def route_events(routes, query, file_paths, cache):
+    """Async ('chunk', text) ... ('done', output) events for the routed analyses"""
+    if len(routes) == 1:
+        return analysis_events(routes[0][0], query, file_paths, cache)
+    return fan_out(routes, query, file_paths, cache)
+
+
+async def analysis_events(query_type, query, file_paths, cache):
+    """Yield ('chunk', text) events while the model answers, then ('done', output)"""
+    chunks = asyncio.Queue()
+    task = asyncio.create_task(asyncio.wait_for(
+        run_analysis(query_type, query, file_paths, cache, on_chunk=chunks.put_nowait),
+        ANALYSIS_TIMEOUT))
+    task.add_done_callback(lambda _: chunks.put_nowait(None))
+    try:
+        while True:
+            text = await chunks.get()
+            if text is None:
+                break
+            yield 'chunk', text
+        yield 'done', task.result()
+    finally:
+        task.cancel()  # client went away
+
+
+async def web_search(request):
+    """Perform web search using Perplexity API without blocking"""
+    data = await request.json()
+    query = data.get('query', '')
+
+    if not query:
+        return JSONResponse({'error': 'No query provided'})
+
+    try:
+        return JSONResponse(await asyncio.wait_for(async_ai.cached_web_search(query), SEARCH_TIMEOUT))
+    except asyncio.TimeoutError:
+        return JSONResponse({'error': 'Web search timed out'})
+    except Exception as e:
+        return JSONResponse({'error': str(e)})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Close pooled upstream connections on shutdown"""
+    yield
+    await async_ai.close_client()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/analyze', analyze, methods=['POST']),
+        Route('/api/web-search', web_search, methods=['POST']),
+        Mount('/', WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan
+)
@@ -15,3 +15,76 @@ MAX_TOKENS = 4096
 PERPLEXITY_API_KEY = os.environ.get("PERPLEXITY_API_KEY", "")
 PERPLEXITY_API_URL = "https://api.perplexity.ai/chat/completions"
 PERPLEXITY_MODEL = "llama-3.1-sonar-small-128k-online"  # Online model with web search
+
+# Analysis execution
+# "inprocess" runs the analysis functions on a thread pool inside the web server,
+# "pool" sends them to long-lived worker processes forked with pandas preloaded,
+# "subprocess" launches a fresh interpreter per request
+EXECUTION_MODE = os.environ.get("EXECUTION_MODE", "inprocess")
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "4"))
+ANALYSIS_TIMEOUT = 120  # seconds
+
+# Worker process pool (EXECUTION_MODE=pool)
+POOL_WORKERS = int(os.environ.get("POOL_WORKERS", "2"))
+POOL_MAX_JOBS = int(os.environ.get("POOL_MAX_JOBS", "100"))  # recycle a worker after this many jobs
+POOL_MAX_RSS_MB = int(os.environ.get("POOL_MAX_RSS_MB", "1024"))  # ...or once its memory passes this
+
+# Folder for on-disk caches
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", ".cache")
+
+# Parsed data cache (per process); set to 0 to disable
+DATA_CACHE_MB = int(os.environ.get("DATA_CACHE_MB", "512"))
+
+# Text columns whose distinct values are at most this fraction of rows are
+# stored as pandas categories (0 disables)
+CATEGORY_MAX_RATIO = float(os.environ.get("CATEGORY_MAX_RATIO", "0.5"))
+# Threads used to read the files of a multi-file selection in parallel
+LOAD_WORKERS = int(os.environ.get("LOAD_WORKERS", "8"))
+# Selections of CSV files larger than this are read in chunks instead of loaded
+# whole (0 always loads whole); STREAM_CHUNK_ROWS rows are read at a time
+STREAM_THRESHOLD_MB = float(os.environ.get("STREAM_THRESHOLD_MB", "1024"))
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", "200000"))
+
+# Data context strings memoized per dataset fingerprint
+CONTEXT_CACHE_SIZE = int(os.environ.get("CONTEXT_CACHE_SIZE", "128"))
+CONTEXT_CACHE_DISK = os.environ.get("CONTEXT_CACHE_DISK", "0") == "1"
+# Approximate size of the data description sent with each prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "4000"))
+
+# Model response cache (memory + SQLite under CACHE_DIR)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") == "1"
+LLM_CACHE_REFRESH = os.environ.get("LLM_CACHE_REFRESH", "0") == "1"  # recompute and overwrite cached answers
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", "86400"))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "256"))
+
+# Longest a web search request waits for Perplexity
+SEARCH_TIMEOUT = int(os.environ.get("WEB_SEARCH_TIMEOUT", "60"))  # seconds
+
+# Web search results (memory + SQLite under CACHE_DIR): fresh for the TTL, then
+# served stale for up to WEB_SEARCH_STALE_TTL more while refreshed in the background
+WEB_SEARCH_CACHE_ENABLED = os.environ.get("WEB_SEARCH_CACHE", "1") == "1"
+WEB_SEARCH_CACHE_TTL = int(os.environ.get("WEB_SEARCH_CACHE_TTL", "3600"))  # seconds
+WEB_SEARCH_STALE_TTL = int(os.environ.get("WEB_SEARCH_STALE_TTL", "86400"))  # seconds
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("WEB_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+# Reuse answers to similarly worded questions on the same data and analysis
+SIMILAR_CACHE_ENABLED = os.environ.get("SIMILAR_CACHE", "1") == "1"
+SIMILAR_CACHE_THRESHOLD = float(os.environ.get("SIMILAR_CACHE_THRESHOLD", "0.85"))  # cosine similarity
+
+# Identical analyses running at the same time share one result
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT", "1") == "1"
+
+# Answer top-N, breakdown, margin and growth questions from the aggregate cube
+# without calling the model (the model only adds commentary when asked to explain)
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH", "1") == "1"
+
+# Queries matching several analyses ("top regions by profit over time") run up to
+# this many of them at once and merge the answers (1 runs only the best match)
+ROUTER_MAX_INTENTS = int(os.environ.get("ROUTER_MAX_INTENTS", "4"))
+
+# Knowledge-base documents searched by /api/retrieve (indexed under CACHE_DIR)
+RAG_DATA_PATH = os.environ.get("RAG_DATA_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_data.json"))
+
+# Connection pool for the async server (asgi.py)
+ASYNC_HTTP_POOL_SIZE = int(os.environ.get("ASYNC_HTTP_POOL_SIZE", "200"))
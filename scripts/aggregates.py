@@ -0,0 +1,254 @@
+"""
+Aggregate Cube
+Pre-computes exact sums and row counts over every low-cardinality dimension and
+month once per dataset, so analysis prompts can quote correct totals instead of
+asking the model to add up a handful of sample rows
+"""
+import sys
+import os
+import re
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CACHE_DIR, CATEGORY_MAX_RATIO
+from scripts.ingest import DATE_FORMATS
+
+# Bump when the cube layout changes so stored cubes are rebuilt
+CUBE_VERSION = 2
+CUBE_CACHE_FOLDER = os.path.join(CACHE_DIR, 'cube')
+CUBE_MEMORY_ENTRIES = 16
+
+# Text columns with more distinct values than this are not used as dimensions
+MAX_DIMENSION_VALUES = 1000
+# Rows shown per table in prompts
+TABLE_ROWS = 15
+
+ID_PATTERN = re.compile(r'(^|[\s_])id$', re.IGNORECASE)
+AVERAGE_PATTERN = re.compile(r'price|margin|rate|percent|pct|ratio|avg|average', re.IGNORECASE)
+SALES_PATTERN = re.compile(r'sales|revenue', re.IGNORECASE)
+PROFIT_PATTERN = re.compile(r'profit', re.IGNORECASE)
+GEOGRAPHY_PATTERN = re.compile(r'region|state|city|country|area|location|territory', re.IGNORECASE)
+
+MONTH = 'Month'
+ROWS = 'Rows'
+MARGIN = 'Profit Margin'
+
+# Ingest settings decide the column types a cube is built from, so stored cubes depend on them
+SETTINGS_KEY = hashlib.sha256(repr((CATEGORY_MAX_RATIO, DATE_FORMATS, MAX_DIMENSION_VALUES)).encode()).hexdigest()[:12]
+
+_cubes = OrderedDict()  # fingerprint -> cube
+_cubes_lock = threading.Lock()
+
+
+def classify_columns(df):
+    """Split columns into dimensions, the date column and summed/averaged measures"""
+    dimensions = []
+    date_column = None
+    sums = []
+    averages = []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            date_column = date_column or column
+        elif pd.api.types.is_bool_dtype(series):
+            continue
+        elif pd.api.types.is_numeric_dtype(series):
+            if ID_PATTERN.search(str(column)):
+                continue
+            (averages if AVERAGE_PATTERN.search(str(column)) else sums).append(column)
+        elif series.nunique(dropna=True) <= MAX_DIMENSION_VALUES:
+            dimensions.append(column)
+    return dimensions, date_column, sums, averages
+
+
+def first_match(pattern, columns):
+    """First column whose name matches pattern, or None"""
+    return next((c for c in columns if pattern.search(str(c))), None)
+
+
+def cube_keys(dimensions, date_column):
+    """Names of the cube's grouping columns"""
+    return list(dimensions) + ([MONTH] if date_column is not None else [])
+
+
+def counted(column):
+    """Cube column counting the rows where an averaged measure has a value"""
+    return f'{ROWS} with {column}'
+
+
+def cube_measures(sums, averages):
+    """Summed cube columns besides Rows: every measure plus the counts behind each average"""
+    return sums + averages + [counted(c) for c in averages]
+
+
+def cube_frame(df, dimensions, date_column, sums, averages):
+    """Row counts and measure sums of df per dimension/month combination"""
+    keys = {column: df[column] for column in dimensions}
+    if date_column is not None:
+        keys[MONTH] = df[date_column].dt.to_period('M').dt.to_timestamp()
+
+    frame = df[sums + averages].assign(**{ROWS: 1}, **{counted(c): df[c].notna() for c in averages})
+    if keys:
+        frame = frame.assign(**keys)
+    return regroup(frame, list(keys), cube_measures(sums, averages))
+
+
+def regroup(frame, keys, measures):
+    """Sum rows of a cube frame (or stacked partial frames) by keys"""
+    if keys:
+        return (frame.groupby(keys, observed=True, dropna=False)[[ROWS] + measures]
+                .sum()
+                .reset_index())
+    return frame[[ROWS] + measures].sum().to_frame().T
+
+
+def make_cube(frame, dimensions, date_column, sums, averages):
+    """Wrap a cube frame with the column roles the views need"""
+    primary = first_match(SALES_PATTERN, sums) or (sums[0] if sums else ROWS)
+    return {
+        'frame': frame,
+        'dimensions': dimensions,
+        'has_month': date_column is not None,
+        'sums': sums,
+        'averages': averages,
+        'primary': primary,
+        'profit': first_match(PROFIT_PATTERN, sums),
+        'sales': first_match(SALES_PATTERN, sums),
+    }
+
+
+def build_cube(df):
+    """Group the data once by every dimension and month, summing each measure"""
+    dimensions, date_column, sums, averages = classify_columns(df)
+    frame = cube_frame(df, dimensions, date_column, sums, averages)
+    return make_cube(frame, dimensions, date_column, sums, averages)
+
+
+def rollup(cube, by):
+    """Totals grouped by the given cube columns, with averages and margin derived
+
+    Averages are over the underlying rows that have a value, not averages of
+    the cube's per-group averages. Rows missing a dimension value are kept as
+    their own group, so totals always match the data.
+    """
+    measures = [ROWS] + cube_measures(cube['sums'], cube['averages'])
+    frame = cube['frame']
+    if not by:
+        frame = frame.assign(Total='All')
+        by = ['Total']
+    grouped = frame.groupby(by, observed=True, dropna=False)[measures].sum()
+    for column in cube['averages']:
+        rows = grouped.pop(counted(column))
+        grouped[column] = grouped[column] / rows.where(rows != 0)
+    grouped = grouped.rename(columns={c: f'Avg {c}' for c in cube['averages']})
+    if cube['profit'] and cube['sales']:
+        grouped[MARGIN] = grouped[cube['profit']] / grouped[cube['sales']].where(grouped[cube['sales']] != 0)
+    return grouped
+
+
+def _cube_file(fingerprint):
+    return os.path.join(CUBE_CACHE_FOLDER, f"{fingerprint}-{SETTINGS_KEY}-v{CUBE_VERSION}.pkl")
+
+
+def get_cube(df, fingerprint):
+    """Return the cube for a dataset, building and storing it on first use"""
+    with _cubes_lock:
+        cube = _cubes.get(fingerprint)
+        if cube is not None:
+            _cubes.move_to_end(fingerprint)
+            return cube
+
+    path = _cube_file(fingerprint)
+    try:
+        with open(path, 'rb') as f:
+            cube = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # Out-of-core datasets build their cube during their one pass over the files
+        cube = build_cube(df) if isinstance(df, pd.DataFrame) else df.cube()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(CUBE_CACHE_FOLDER, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cube, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    with _cubes_lock:
+        _cubes[fingerprint] = cube
+        while len(_cubes) > CUBE_MEMORY_ENTRIES:
+            _cubes.popitem(last=False)
+    return cube
+
+
+def format_table(frame, title, sort_by=None, limit=TABLE_ROWS):
+    """Render a rollup as a titled plain-text table (limit=None shows every row)"""
+    total = len(frame)
+    if sort_by is not None and sort_by in frame.columns:
+        frame = frame.sort_values(sort_by, ascending=False)
+    shown = ""
+    if limit is not None and total > limit:
+        frame = frame.head(limit)
+        shown = f" (top {limit} of {total})"
+    table = frame.to_string(float_format=lambda v: f"{v:,.2f}")
+    return f"{title}{shown}:\n{table}"
+
+
+def _dimension_tables(cube, dimensions, sort_by):
+    return [format_table(rollup(cube, [d]), f"By {d}", sort_by) for d in dimensions]
+
+
+def _top_tables(cube):
+    return _dimension_tables(cube, cube['dimensions'], cube['primary'])
+
+
+def _region_tables(cube):
+    geography = [d for d in cube['dimensions'] if GEOGRAPHY_PATTERN.search(str(d))]
+    tables = _dimension_tables(cube, geography or cube['dimensions'], cube['primary'])
+    others = [d for d in cube['dimensions'] if d not in geography]
+    if geography and others:
+        pivot = rollup(cube, [geography[0], others[0]])[cube['primary']].unstack(fill_value=0)
+        tables.append(format_table(pivot, f"{cube['primary']} by {geography[0]} and {others[0]}"))
+    return tables
+
+
+def _compare_tables(cube):
+    return _dimension_tables(cube, cube['dimensions'], cube['primary'])
+
+
+def _profit_tables(cube):
+    sort_by = cube['profit'] or cube['primary']
+    return _dimension_tables(cube, cube['dimensions'], sort_by)
+
+
+def _trend_tables(cube):
+    if not cube['has_month']:
+        return []
+    tables = [format_table(rollup(cube, [MONTH]), "By month", limit=None)]
+    if cube['dimensions']:
+        first = cube['dimensions'][0]
+        pivot = rollup(cube, [MONTH, first])[cube['primary']].unstack(fill_value=0)
+        tables.append(format_table(pivot, f"{cube['primary']} by month and {first}", limit=None))
+    return tables
+
+
+VIEWS = {
+    'top': _top_tables,
+    'region': _region_tables,
+    'compare': _compare_tables,
+    'profit': _profit_tables,
+    'trend': _trend_tables,
+}
+
+
+def aggregate_context(df, fingerprint, view):
+    """Exact aggregate tables relevant to an analysis type, as prompt text"""
+    cube = get_cube(df, fingerprint)
+    tables = [format_table(rollup(cube, []), "Overall totals")]
+    tables += VIEWS[view](cube)
+    return "\n\n".join(tables)
@@ -0,0 +1,177 @@
+"""
+Async Model and Search Calls
+Non-blocking counterparts of call_ai and web_search for the ASGI server, built on
+a pooled httpx.AsyncClient with the same retry policy as scripts/http_client.py
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (API_BASE_URL, PERPLEXITY_API_KEY, PERPLEXITY_API_URL, LLM_CACHE_ENABLED, ASYNC_HTTP_POOL_SIZE,
+                    LLM_CACHE_REFRESH, WEB_SEARCH_CACHE_ENABLED)
+from scripts import http_client
+from scripts.utils import (build_ai_request, parse_ai_response, parse_ai_chunk, cached_answer,
+                           store_answer, format_output)
+from scripts.web_search import (MISSING_KEY_OUTPUT, SEARCH_TIMEOUT, build_search_request, format_search_result,
+                                search_cache)
+
+# Failures worth retrying: the request never reached the server or the connection dropped
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient
+
+
+def get_client():
+    """Return the pooled client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(max_connections=ASYNC_HTTP_POOL_SIZE,
+                              max_keepalive_connections=ASYNC_HTTP_POOL_SIZE)
+        client = httpx.AsyncClient(limits=limits)
+        _clients[loop] = client
+    return client
+
+
+async def close_client():
+    """Close the running loop's client (call on server shutdown)"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def send(method, url, stream=False, **kwargs):
+    """Send a request, retrying connection errors and 5xx responses
+
+    With stream=True the caller must aclose() the returned response. As in
+    http_client, the timeout covers every attempt together.
+    """
+    client = get_client()
+    host = urlsplit(url).hostname
+    timeout = kwargs.get("timeout")
+    deadline = http_client.deadline_for(timeout)
+    for attempt in range(http_client.MAX_RETRIES + 1):
+        if deadline is not None:
+            kwargs["timeout"] = http_client.time_left(timeout, deadline)
+        delay = http_client.backoff_delay(attempt)
+        start = time.perf_counter()
+        try:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        except RETRY_ERRORS:
+            http_client.record(host, requests=1, request_seconds=time.perf_counter() - start)
+            if attempt == http_client.MAX_RETRIES or http_client.out_of_time(deadline, delay):
+                raise
+        else:
+            http_client.record(host, requests=1, request_seconds=time.perf_counter() - start)
+            if (response.status_code < 500 or attempt == http_client.MAX_RETRIES
+                    or http_client.out_of_time(deadline, delay)):
+                return response
+            await response.aclose()
+        http_client.record(host, retries=1)
+        await asyncio.sleep(delay)
+
+
+async def request_ai(prompt, system_message=None, on_chunk=None):
+    """Make API call to get AI response, streaming to on_chunk if given; returns (text, success)"""
+    headers, payload = build_ai_request(prompt, system_message, stream=on_chunk is not None)
+
+    try:
+        response = await send("POST", API_BASE_URL, stream=True, headers=headers, json=payload, timeout=120)
+        try:
+            response.raise_for_status()
+            if on_chunk is None or "text/event-stream" not in response.headers.get("content-type", ""):
+                await response.aread()
+                text, success = parse_ai_response(response.json())
+                if success and on_chunk:
+                    on_chunk(text)
+                return text, success
+
+            parts = []
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = parse_ai_chunk(json.loads(data))
+                except ValueError:
+                    continue
+                if chunk:
+                    parts.append(chunk)
+                    on_chunk(chunk)
+        finally:
+            await response.aclose()
+
+        text = "".join(parts)
+        return (text, True) if text else ("No response generated", False)
+
+    except httpx.HTTPError as e:
+        return f"API Error: {str(e)}", False
+
+
+async def call_ai(prompt, system_message=None, use_cache=LLM_CACHE_ENABLED, refresh=LLM_CACHE_REFRESH,
+                  query=None, scope=None, on_chunk=None):
+    """Async call_ai: same caching rules, cache lookups run off the event loop"""
+    loop = asyncio.get_running_loop()
+    if use_cache and not refresh:
+        cached = await loop.run_in_executor(None, cached_answer, prompt, system_message, query, scope)
+        if cached is not None:
+            if on_chunk:
+                on_chunk(cached)
+            return cached
+
+    text, success = await request_ai(prompt, system_message, on_chunk)
+    if use_cache and success:
+        await loop.run_in_executor(None, store_answer, text, prompt, system_message, query, scope)
+    return text
+
+
+async def complete_request(request, on_chunk=None, use_cache=LLM_CACHE_ENABLED, refresh=LLM_CACHE_REFRESH):
+    """Make a prepared model call and format its output for the UI"""
+    answer = request.get("answer")
+    if answer is not None:
+        if request["prompt"] is None:
+            if on_chunk:
+                on_chunk(answer)
+            return format_output(answer, request["title"])
+        if on_chunk:
+            on_chunk(answer + "\n\n")
+
+    result = await call_ai(request["prompt"], request["system_message"],
+                           query=request["query"], scope=request["scope"], on_chunk=on_chunk,
+                           use_cache=use_cache, refresh=refresh)
+    if answer is not None:
+        result = answer + "\n\n" + result
+    return format_output(result, request["title"])
+
+
+async def web_search(query):
+    """Perform web search using Perplexity API without blocking"""
+    if not PERPLEXITY_API_KEY:
+        return dict(MISSING_KEY_OUTPUT)
+
+    headers, payload = build_search_request(query)
+    try:
+        response = await send("POST", PERPLEXITY_API_URL, headers=headers, json=payload, timeout=SEARCH_TIMEOUT)
+        response.raise_for_status()
+        return format_search_result(response.json())
+    except httpx.HTTPError as e:
+        return {
+            "success": False,
+            "error": f"Perplexity API Error: {str(e)}"
+        }
+
+
+async def cached_web_search(query):
+    """web_search through the result cache (stale results refresh in a background task)"""
+    if not WEB_SEARCH_CACHE_ENABLED:
+        return await web_search(query)
+    return await search_cache.get_async(query, web_search)
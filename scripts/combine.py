@@ -0,0 +1,97 @@
+"""
+Combining Data Files
+Stacks the frames of several files into one, agreeing each column's dtype up
+front (merged category sets, widest numeric or date type) so the result is not
+upcast to object, and writing each column into a single preallocated array
+"""
+import numpy as np
+import pandas as pd
+
+
+def is_plain(dtype):
+    """Whether a dtype is a NumPy number, bool or naive datetime"""
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufM'
+
+
+def is_category(dtype):
+    return isinstance(dtype, pd.CategoricalDtype)
+
+
+def common_dtype(dtypes, has_missing):
+    """The dtype a column gets when its parts are stacked, or 'category'"""
+    if all(is_category(d) for d in dtypes):
+        return 'category'
+    if any(is_category(d) for d in dtypes) and \
+            all(is_category(d) or pd.api.types.is_string_dtype(d) for d in dtypes):
+        return 'category'
+    if all(is_plain(d) for d in dtypes):
+        kinds = {d.kind for d in dtypes}
+        if 'M' in kinds and kinds != {'M'}:
+            return np.dtype(object)
+        dtype = np.result_type(*dtypes)
+        if has_missing and dtype.kind in 'biu':
+            return np.dtype('float64')  # room for NaN
+        return dtype
+    if all(d == dtypes[0] for d in dtypes):
+        return dtypes[0]
+    return np.dtype(object)
+
+
+def combine_categories(parts, lengths):
+    """Stack category (or string) parts as one Categorical over the union of their categories"""
+    seen = [p.cat.categories if is_category(p.dtype) else pd.Index(p.dropna().unique())
+            for p in parts if p is not None]
+    categories = seen[0].append(seen[1:]).unique() if len(seen) > 1 else seen[0]
+
+    codes = np.empty(sum(lengths), dtype=np.int32)
+    pos = 0
+    for part, n in zip(parts, lengths):
+        out = codes[pos:pos + n]
+        if part is None:
+            out[:] = -1
+        elif is_category(part.dtype):
+            mapping = categories.get_indexer(part.cat.categories)
+            part_codes = part.cat.codes.to_numpy()
+            out[:] = np.where(part_codes >= 0, mapping[part_codes], -1)
+        else:
+            out[:] = categories.get_indexer(part.to_numpy(dtype=object))
+        pos += n
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def combine_plain(parts, lengths, dtype):
+    """Stack NumPy-typed parts into one preallocated array"""
+    values = np.empty(sum(lengths), dtype=dtype)
+    pos = 0
+    for part, n in zip(parts, lengths):
+        if part is None:
+            values[pos:pos + n] = np.datetime64('NaT') if dtype.kind == 'M' else np.nan
+        else:
+            values[pos:pos + n] = part.to_numpy(dtype=dtype)
+        pos += n
+    return values
+
+
+def combine_column(parts, lengths):
+    """Stack one column's parts (None where a file lacks the column)"""
+    present = [p for p in parts if p is not None]
+    dtype = common_dtype([p.dtype for p in present], len(present) < len(parts))
+    if dtype == 'category':
+        return combine_categories(parts, lengths)
+    if isinstance(dtype, np.dtype) and (dtype.kind in 'biufM' or dtype == object):
+        return combine_plain(parts, lengths, dtype)
+    # Extension types such as strings: pandas concatenates these in one pass
+    filled = [p if p is not None else pd.Series(index=range(n), dtype=dtype) for p, n in zip(parts, lengths)]
+    return pd.concat(filled, ignore_index=True).array
+
+
+def combine_frames(dataframes):
+    """Stack frames by column name; columns keep the order they are first seen in"""
+    columns = list(dict.fromkeys(column for df in dataframes for column in df.columns))
+    lengths = [len(df) for df in dataframes]
+    data = {
+        column: combine_column([df[column] if column in df.columns else None for df in dataframes], lengths)
+        for column in columns
+    }
+    # copy=False keeps each column's array as built instead of copying it into blocks
+    return pd.DataFrame(data, index=pd.RangeIndex(sum(lengths)), copy=False)
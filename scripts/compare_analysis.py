@@ -7,16 +7,20 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scripts.utils import load_data, get_data_context, call_ai, format_output, error_output
+from scripts.utils import load_data, get_data_context, ai_request, complete_request, error_output, to_json
+from scripts.fingerprint import dataset_fingerprint
+from scripts.aggregates import aggregate_context
 
 
-def run_compare_analysis(query, file_paths):
-    """Compare categories using AI analysis"""
+def prepare_compare_analysis(query, file_paths):
+    """Build the model request for a comparison analysis, or None if the data cannot be loaded"""
     df = load_data(file_paths)
     if df is None:
-        return error_output("Could not load data files")
+        return None
 
-    context = get_data_context(df)
+    fingerprint = dataset_fingerprint(file_paths)
+    context = get_data_context(df, fingerprint=fingerprint)
+    aggregates = aggregate_context(df, fingerprint, 'compare')
 
     prompt = f"""Based on this dataset, perform a comparison analysis:
 
@@ -25,6 +29,9 @@ USER QUERY: {query}
 DATASET:
 {context}
 
+EXACT AGGREGATES (computed over all rows, use these for totals and rankings):
+{aggregates}
+
 Please provide:
 1. **Comparison Overview**: What categories/dimensions are being compared
 2. **Side-by-Side Metrics**: Key metrics for each category (use markdown table)
@@ -37,15 +44,22 @@ Use actual numbers from the data. Present comparisons in clear tables."""
 
     system_message = "You are a data analyst expert specializing in comparative analysis. Create clear side-by-side comparisons using data tables and highlight key differences."
 
-    result = call_ai(prompt, system_message)
-    return format_output(result, "Comparison Analysis")
+    return ai_request(prompt, system_message, "Comparison Analysis", query=query, scope=f"compare:{fingerprint}")
+
+
+def run_compare_analysis(query, file_paths):
+    """Compare categories using AI analysis"""
+    request = prepare_compare_analysis(query, file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    return complete_request(request)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print(error_output("Usage: python compare_analysis.py <query> <file1> [file2] ..."))
+        print(to_json(error_output("Usage: python compare_analysis.py <query> <file1> [file2] ...")))
         sys.exit(1)
 
     query = sys.argv[1]
     file_paths = sys.argv[2:]
-    print(run_compare_analysis(query, file_paths))
+    print(to_json(run_compare_analysis(query, file_paths)))
@@ -0,0 +1,167 @@
+"""
+Data Context Builder
+Builds the dataset description sent to the model within a token budget: schema
+first, then statistics and value summaries, then a sample of rows stratified so
+every value of the low-cardinality columns is represented
+"""
+import pandas as pd
+
+# Rough characters per token for tabular English text; avoids calling a tokenizer
+CHARS_PER_TOKEN = 4
+# Text columns with at most this many values are summarized and used as strata
+MAX_SUMMARY_VALUES = 50
+TOP_VALUES_SHOWN = 10
+SAMPLE_SEED = 0
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for budgeting prompt sections"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def category_columns(df):
+    """Low-cardinality text/categorical columns, fewest values first"""
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(series) \
+                or pd.api.types.is_string_dtype(series):
+            count = series.nunique(dropna=True)
+            if 1 < count <= MAX_SUMMARY_VALUES:
+                columns.append((count, column))
+    return [column for _, column in sorted(columns, key=lambda item: item[0])]
+
+
+def stratified_sample(df, max_rows, strata):
+    """Pick up to max_rows rows covering every value of each stratum column
+
+    Columns are covered in order while they still fit; remaining slots are
+    filled with a seeded random sample. Rows keep their original order.
+    """
+    if len(df) <= max_rows:
+        return df
+    picked = pd.Index([])
+    for column in strata:
+        firsts = df.drop_duplicates(subset=[column]).index
+        combined = picked.union(firsts)
+        if len(combined) > max_rows:
+            continue
+        picked = combined
+    remaining = max_rows - len(picked)
+    if remaining > 0:
+        rest = df.index.difference(picked)
+        picked = picked.union(df.loc[rest].sample(n=min(remaining, len(rest)), random_state=SAMPLE_SEED).index)
+    return df.loc[picked.sort_values()]
+
+
+def summarize_categories(counts):
+    """One line per column with its most frequent values and counts"""
+    lines = []
+    for column, column_counts in counts.items():
+        shown = ", ".join(f"{value} ({count})" for value, count in column_counts.head(TOP_VALUES_SHOWN).items())
+        more = f", ... {len(column_counts) - TOP_VALUES_SHOWN} more" if len(column_counts) > TOP_VALUES_SHOWN else ""
+        lines.append(f"{column} ({len(column_counts)} values): {shown}{more}")
+    return "\n".join(lines)
+
+
+def date_ranges(df):
+    """(column, first, last) for every datetime column with values"""
+    ranges = []
+    for column in df.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        series = df[column].dropna()
+        if not series.empty:
+            ranges.append((column, series.min(), series.max()))
+    return ranges
+
+
+def summarize_dates(ranges):
+    """Range of every datetime column"""
+    return "\n".join(f"{column}: {first:%Y-%m-%d} to {last:%Y-%m-%d}" for column, first, last in ranges)
+
+
+def leading_lines(table, budget):
+    """Keep the header and as many row lines of a rendered table as fit the budget"""
+    lines = table.split("\n")
+    kept = [lines[0]]
+    used = estimate_tokens(lines[0])
+    for line in lines[1:]:
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def fit_rows(sample, budget, strata=()):
+    """Rendered header and row lines of a sample, cut down to fit the budget
+
+    A sample that does not fit is re-sampled smaller, still covering every
+    stratum value while it can, rather than cut to its leading rows.
+    """
+    lines = sample.to_string().split("\n")
+    rows = len(leading_lines("\n".join(lines), budget)) - 1
+    while rows < len(sample) and rows > 0:
+        smaller = stratified_sample(sample, rows, strata).to_string()
+        lines = leading_lines(smaller, budget)
+        if len(lines) - 1 == rows:
+            return lines
+        rows -= 1
+    return lines if rows else lines[:1]
+
+
+def profile_frame(df, max_rows=50):
+    """Everything the data context describes, computed from a loaded frame
+
+    Out-of-core datasets build the same dict in one pass over their chunks
+    (see scripts/streaming.py).
+    """
+    strata = category_columns(df)
+    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+    return {
+        'rows': len(df),
+        'dtypes': df.dtypes,
+        'numeric': df[numeric_cols].describe() if numeric_cols else None,
+        'dates': date_ranges(df),
+        'counts': {column: df[column].value_counts() for column in strata},
+        'strata': strata,
+        'sample': stratified_sample(df, max_rows, strata),
+    }
+
+
+def render_context(profile, token_budget=4000):
+    """Build the context string from a profile within roughly token_budget tokens"""
+    dtypes = profile['dtypes']
+    context = f"Dataset has {profile['rows']} rows and {len(dtypes)} columns.\n\n"
+    context += f"Columns: {', '.join(map(str, dtypes.index))}\n\n"
+    context += f"Data types:\n{dtypes.to_string()}"
+
+    strata = profile['strata']
+    sections = []
+    if profile['numeric'] is not None:
+        sections.append(f"Numeric column statistics:\n{profile['numeric'].to_string()}")
+    if profile['dates']:
+        sections.append(f"Date ranges:\n{summarize_dates(profile['dates'])}")
+    if strata:
+        sections.append(f"Value counts:\n{summarize_categories(profile['counts'])}")
+
+    # Summaries cover every row, so they take the budget before sample rows
+    for section in sections:
+        if estimate_tokens(context) + estimate_tokens(section) <= token_budget:
+            context += "\n\n" + section
+
+    sample = profile['sample']
+    remaining = token_budget - estimate_tokens(context) - 20
+    if len(sample) and remaining > 0:
+        lines = fit_rows(sample, remaining, strata)
+        if len(lines) > 1:
+            covered = f" covering every {', '.join(map(str, strata[:3]))}" if strata else ""
+            context += f"\n\nSample data ({len(lines) - 1} of {profile['rows']} rows{covered}):\n"
+            context += "\n".join(lines)
+
+    return context
+
+
+def build_data_context(df, max_rows=50, token_budget=4000):
+    """Build the context string describing the data within roughly token_budget tokens"""
+    return render_context(profile_frame(df, max_rows), token_budget)
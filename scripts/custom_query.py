@@ -7,16 +7,18 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scripts.utils import load_data, get_data_context, call_ai, format_output, error_output
+from scripts.utils import load_data, get_data_context, ai_request, complete_request, error_output, to_json
+from scripts.fingerprint import dataset_fingerprint
 
 
-def run_custom_query(query, file_paths):
-    """Handle custom query using AI"""
+def prepare_custom_query(query, file_paths):
+    """Build the model request for a custom query, or None if the data cannot be loaded"""
     df = load_data(file_paths)
     if df is None:
-        return error_output("Could not load data files")
+        return None
 
-    context = get_data_context(df)
+    fingerprint = dataset_fingerprint(file_paths)
+    context = get_data_context(df, fingerprint=fingerprint)
 
     prompt = f"""Based on this dataset, answer the user's question:
 
@@ -36,15 +38,22 @@ Format your response clearly with markdown. Use tables for data comparisons."""
 
     system_message = "You are a data analyst expert. Answer questions about data accurately using the actual numbers from the dataset. Provide clear, actionable insights."
 
-    result = call_ai(prompt, system_message)
-    return format_output(result, "Analysis Result")
+    return ai_request(prompt, system_message, "Analysis Result", query=query, scope=f"custom:{fingerprint}")
+
+
+def run_custom_query(query, file_paths):
+    """Handle custom query using AI"""
+    request = prepare_custom_query(query, file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    return complete_request(request)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print(error_output("Usage: python custom_query.py <query> <file1> [file2] ..."))
+        print(to_json(error_output("Usage: python custom_query.py <query> <file1> [file2] ...")))
         sys.exit(1)
 
     query = sys.argv[1]
     file_paths = sys.argv[2:]
-    print(run_custom_query(query, file_paths))
+    print(to_json(run_custom_query(query, file_paths)))
@@ -0,0 +1,104 @@
+"""
+In-memory Dataset Store
+Keeps each upload parsed once as a typed DataFrame next to a zlib-compressed
+copy of its raw bytes, evicting least recently used datasets to stay within a
+total byte budget. Used by the Vercel API, which has no disk to cache on.
+The budget comes from the environment: DATASET_STORE_MB
+"""
+import os
+import io
+import zlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from scripts.ingest import ingest
+
+BUDGET_MB = int(os.environ.get("DATASET_STORE_MB", "256"))
+COMPRESSION_LEVEL = 6
+
+
+def parse_upload(name, data):
+    """Parse uploaded bytes as CSV or Excel and apply the typed ingest"""
+    if name.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(io.BytesIO(data))
+    else:
+        df = pd.read_csv(io.BytesIO(data), encoding_errors='ignore')
+    return ingest(df)[0]
+
+
+class DatasetStore:
+    """Thread-safe LRU store of parsed uploads bounded by their memory use"""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # name -> entry dict
+        self._lock = threading.Lock()
+
+    def put(self, name, data):
+        """Parse and store an upload, replacing any earlier one of that name
+
+        Raises ValueError if the file cannot be parsed or alone exceeds the budget.
+        """
+        try:
+            df = parse_upload(name, data)
+        except Exception as e:
+            raise ValueError(f"Could not parse {name}: {e}")
+        raw = zlib.compress(data, COMPRESSION_LEVEL)
+        frame_bytes = int(df.memory_usage(deep=True).sum())
+        entry = {
+            'df': df,
+            'raw': raw,
+            'size': len(data),
+            'memory_bytes': frame_bytes + len(raw),
+        }
+        if entry['memory_bytes'] > self.budget_bytes:
+            raise ValueError(f"{name} needs {entry['memory_bytes'] // (1024 * 1024)} MB parsed, "
+                             f"more than the {self.budget_bytes // (1024 * 1024)} MB dataset budget")
+
+        with self._lock:
+            if name in self._entries:
+                self.used_bytes -= self._entries.pop(name)['memory_bytes']
+            while self._entries and self.used_bytes + entry['memory_bytes'] > self.budget_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.used_bytes -= evicted['memory_bytes']
+                self.evictions += 1
+            self._entries[name] = entry
+            self.used_bytes += entry['memory_bytes']
+        return entry
+
+    def get(self, name):
+        """The parsed frame for an upload, or None; frames are shared and must not be modified"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            self._entries.move_to_end(name)
+            return entry['df']
+
+    def raw(self, name):
+        """The original bytes of an upload, or None"""
+        with self._lock:
+            entry = self._entries.get(name)
+        return zlib.decompress(entry['raw']) if entry is not None else None
+
+    def list(self):
+        """Name, upload size and memory use of every stored dataset"""
+        with self._lock:
+            return [{'name': name, 'size': entry['size'], 'memory_bytes': entry['memory_bytes']}
+                    for name, entry in self._entries.items()]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'used_bytes': self.used_bytes,
+                'budget_bytes': self.budget_bytes,
+                'evictions': self.evictions
+            }
+
+
+datasets = DatasetStore(BUDGET_MB * 1024 * 1024)
@@ -0,0 +1,129 @@
+"""
+In-process Analysis Engine
+Imports the analysis scripts once and runs them on a bounded thread pool,
+returning result dicts directly instead of launching a script per request
+"""
+import sys
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ANALYSIS_WORKERS, ANALYSIS_TIMEOUT, FAST_PATH_ENABLED
+from scripts.utils import stream_sink, complete_request, error_output
+from scripts.fingerprint import dataset_fingerprint
+from scripts.summary_analysis import prepare_summary_analysis
+from scripts.top_analysis import prepare_top_analysis
+from scripts.compare_analysis import prepare_compare_analysis
+from scripts.trend_analysis import prepare_trend_analysis
+from scripts.profit_analysis import prepare_profit_analysis
+from scripts.region_analysis import prepare_region_analysis
+from scripts.custom_query import prepare_custom_query
+from scripts.fast_path import prepare_fast_answer
+from scripts.single_flight import SingleFlight
+
+# query type -> (function building the model request, whether it takes the user query)
+ANALYSES = {
+    'summary': (prepare_summary_analysis, False),
+    'top': (prepare_top_analysis, True),
+    'compare': (prepare_compare_analysis, True),
+    'trend': (prepare_trend_analysis, True),
+    'profit': (prepare_profit_analysis, True),
+    'region': (prepare_region_analysis, True),
+    'custom': (prepare_custom_query, True),
+}
+
+_executor = None
+# Commentary on a computed answer, shared by every analysis a question is routed to
+_commentary = SingleFlight()
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the shared worker pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='analysis')
+        return _executor
+
+
+def prepare_analysis(query_type, query, file_paths):
+    """Load the data and build the model request, or None if the data cannot be loaded
+
+    Questions the aggregate cube answers exactly get a computed answer instead.
+    """
+    func, takes_query = ANALYSES.get(query_type, ANALYSES['custom'])
+    if FAST_PATH_ENABLED and takes_query:
+        request = prepare_fast_answer(query, file_paths)
+        if request is not None:
+            return request
+    if takes_query:
+        return func(query, file_paths)
+    return func(file_paths)
+
+
+def analysis_key(query_type, query, file_paths):
+    """Identity of an analysis: its type, the query if it uses one, and the file contents"""
+    if query_type not in ANALYSES:
+        query_type = 'custom'
+    takes_query = ANALYSES[query_type][1]
+    return query_type, query if takes_query else None, dataset_fingerprint(file_paths)
+
+
+def run_analysis(query_type, query, file_paths, cache=None):
+    """Run an analysis in the calling thread and return its output dict
+
+    cache holds complete_request's use_cache/refresh arguments, if any.
+    """
+    cache = cache or {}
+    request = prepare_analysis(query_type, query, file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    if request['answer'] is not None and request['prompt'] is not None:
+        key = (request['prompt'], request['system_message'], tuple(sorted(cache.items())))
+        return _commentary.run(key, lambda: complete_request(request, **cache), ANALYSIS_TIMEOUT)
+    return complete_request(request, **cache)
+
+
+def execute(query_type, query, file_paths, timeout=ANALYSIS_TIMEOUT, cache=None):
+    """Run an analysis on the worker pool and wait for its output dict
+
+    Raises concurrent.futures.TimeoutError if it does not finish in time.
+    The worker thread cannot be interrupted, so it finishes in the background.
+    """
+    future = get_executor().submit(run_analysis, query_type, query, file_paths, cache)
+    return future.result(timeout=timeout)
+
+
+def stream(query_type, query, file_paths, timeout=ANALYSIS_TIMEOUT, cache=None):
+    """Run an analysis on the worker pool, yielding its answer as it is generated
+
+    Yields ('chunk', text) for each piece of the model's answer and finally
+    ('done', output dict). Raises concurrent.futures.TimeoutError on timeout.
+    """
+    events = queue.Queue()
+
+    def job():
+        token = stream_sink.set(lambda text: events.put(('chunk', text)))
+        try:
+            return run_analysis(query_type, query, file_paths, cache)
+        finally:
+            stream_sink.reset(token)
+
+    future = get_executor().submit(job)
+    future.add_done_callback(lambda _: events.put(('done', None)))
+    deadline = time.monotonic() + timeout
+
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            kind, text = events.get(timeout=max(remaining, 0))
+        except queue.Empty:
+            raise FutureTimeout()
+        if kind == 'done':
+            yield 'done', future.result()
+            return
+        yield 'chunk', text
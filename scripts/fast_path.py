@@ -0,0 +1,352 @@
+"""
+Deterministic Fast Path
+Answers common question shapes exactly from the aggregate cube instead of the
+model: top/bottom N by a metric, a metric broken down by a dimension, profit
+margin by a dimension and period-over-period growth, optionally filtered to
+dimension values or years named in the question. The model is only asked for
+commentary on the computed table when the question asks for an explanation
+"""
+import sys
+import os
+import re
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.utils import load_data, ai_request
+from scripts.fingerprint import dataset_fingerprint
+from scripts.aggregates import MONTH, ROWS, MARGIN, get_cube, rollup
+
+DEFAULT_TOP_N = 10
+# Tables longer than this are cut in the answer
+MAX_TABLE_ROWS = 50
+
+NARRATIVE_PATTERN = re.compile(
+    r'\b(why|explain\w*|insights?|recommend\w*|suggest\w*|interpret\w*|commentary|narrative|'
+    r'story|summar\w*|analy[sz]\w*|describe|reasons?|what does|should)\b')
+# Shapes the cube cannot answer exactly
+UNSUPPORTED_PATTERN = re.compile(
+    r'\b(exclud\w*|except|without|not|other than|correlat\w*|forecast\w*|predict\w*|median|'
+    r'distribution|outliers?|between|vs|versus|compare\w*|percentile|'
+    r'january|february|march|april|may|june|july|august|september|october|november|december|'
+    r'q[1-4]|last|this|previous|ytd|week\w*|days?)\b')
+# Threshold filters on values ("where margin is above 50%", "orders over 5000"); the
+# growth phrases that contain "over" are removed before this is checked
+THRESHOLD_PATTERN = re.compile(
+    r'[<>=\u2264\u2265]|\b(above|over|under|below|more than|less than|fewer than|greater than|'
+    r'at least|at most|where|exceed\w*|higher than|lower than|only)\b')
+# Parts of a year the cube's year filter would widen to the whole year
+PARTIAL_PERIOD_PATTERN = re.compile(
+    r'\b(first|second|third|fourth|half|h[12]|since|until|before|after|through|to date)\b')
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9,
+    'ten': 10, 'eleven': 11, 'twelve': 12, 'fifteen': 15, 'twenty': 20, 'dozen': 12,
+}
+COUNT = r'(\d+|' + '|'.join(NUMBER_WORDS) + ')'
+TOP_PATTERN = re.compile(
+    r'(?:\b' + COUNT + r'\s+)?\b(top|bottom|best|worst|highest|lowest|largest|smallest|leading|most|least)\b'
+    r'(?:\s+' + COUNT + r'\b)?')
+ASCENDING_WORDS = {'bottom', 'worst', 'lowest', 'smallest', 'least'}
+GROWTH_PATTERN = re.compile(
+    r'\b(growth|grow\w*|month over month|mom|year over year|yoy|quarter over quarter|qoq|'
+    r'period over period|change)\b')
+AVERAGE_PATTERN = re.compile(r'\b(average|avg|mean)\b')
+# Ratio wording the cube has no column for unless a column is named that way
+RATIO_PATTERN = re.compile(r'\b(ratio|rates?|shares?|percent\w*|proportion|fraction|size|typical)\b')
+PER_PATTERN = re.compile(r'\bper (\w+)')
+YEAR_PATTERN = re.compile(r'\b((?:19|20)\d\d)\b')
+
+# Words that do not identify a column on their own
+GENERIC_WORDS = {'total', 'per', 'of', 'the', 'and', 'sum', 'avg', 'average', 'id', 'amount', 'value', 'sold'}
+# Only phrases that clearly ask for a count of rows: a bare "orders" may mean order value or size
+ROW_ALIASES = ['number of rows', 'number of records', 'number of orders', 'number of transactions',
+               'order count', 'transaction count', 'row count', 'record count', 'how many']
+MONTH_ALIASES = ['month', 'monthly']
+
+
+def singular(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def normalize(text):
+    """Lowercase words with simple plurals singularized, joined by single spaces"""
+    return ' '.join(singular(w) for w in re.findall(r'[a-z0-9]+', str(text).lower()))
+
+
+def column_aliases(column):
+    """The full column name plus each of its distinctive words"""
+    name = normalize(column)
+    return [name] + [w for w in name.split() if w not in GENERIC_WORDS and w != name]
+
+
+def find_mentions(text, candidates, suffixes=True):
+    """Columns named in text, in order of appearance; longer and earlier candidates win overlaps"""
+    spans = []
+    # Allow suffixes so "profit" matches "profitable" and "month" "monthly"
+    ending = r'\w*' if suffixes else r'\b'
+    for priority, (column, aliases) in enumerate(candidates):
+        for alias in aliases:
+            for match in re.finditer(rf'\b{re.escape(alias)}{ending}', text):
+                spans.append((match.start(), -(match.end() - match.start()), priority, match.end(), column))
+    taken = []
+    mentions = []
+    for start, _, _, end, column in sorted(spans, key=lambda s: (s[1], s[2], s[0])):
+        if any(start < e and s < end for s, e in taken):
+            continue
+        taken.append((start, end))
+        mentions.append((start, column))
+    found = []
+    for _, column in sorted(mentions):
+        if column not in found:
+            found.append(column)
+    return found
+
+
+def find_filters(text, cube):
+    """(dimension, value) pairs for dimension values named in text"""
+    filters = []
+    frame = cube['frame']
+    for dimension in cube['dimensions']:
+        for value in frame[dimension].dropna().unique():
+            alias = normalize(value)
+            if len(alias) > 2 and re.search(rf'\b{re.escape(alias)}\b', text):
+                filters.append((dimension, value))
+    return filters
+
+
+def parse_query(query, cube):
+    """Work out the question shape, or None if it is not one the cube answers exactly"""
+    text = normalize(query)
+    raw = query.lower()
+    if UNSUPPORTED_PATTERN.search(raw) or PARTIAL_PERIOD_PATTERN.search(raw):
+        return None
+    if THRESHOLD_PATTERN.search(GROWTH_PATTERN.sub(' ', raw)):
+        return None
+
+    filters = find_filters(text, cube)
+    # A named value is a filter, so its words do not also name a column
+    for _, value in filters:
+        text = re.sub(rf'\b{re.escape(normalize(value))}\b', ' ', text)
+
+    dimension_candidates = [(d, column_aliases(d)) for d in cube['dimensions']]
+    if cube['has_month']:
+        dimension_candidates.append((MONTH, MONTH_ALIASES))
+    metric_candidates = [(c, column_aliases(c)) for c in cube['sums']]
+    if cube['profit'] and cube['sales']:
+        metric_candidates.append((MARGIN, ['profit margin', 'margin']))
+    metric_candidates += [(c, column_aliases(c)) for c in cube['averages']]
+
+    dimensions = find_mentions(text, dimension_candidates)
+    metrics = find_mentions(text, metric_candidates) or \
+        find_mentions(text, [(ROWS, [normalize(alias) for alias in ROW_ALIASES])], suffixes=False)
+    # Without a named metric any answer would be a guess ("best customer satisfaction")
+    if not metrics:
+        return None
+    metric = metrics[0]
+    average = bool(AVERAGE_PATTERN.search(raw))
+    # Only averages of summed or averaged columns are exact; "average order size" is not
+    if average and metric not in cube['sums'] + cube['averages']:
+        return None
+    # "price per unit" is a column, but "profit per unit" is a ratio and "top brands per
+    # region" a ranking within each region, neither of which the cube answers
+    named = set(normalize(metric).split())
+    if any(word not in named for word in PER_PATTERN.findall(text)):
+        return None
+    named.update(w for _, aliases in dimension_candidates for alias in aliases for w in alias.split())
+    if any(word not in named for word in RATIO_PATTERN.findall(text)):
+        return None
+    # One grouping only: "sales by region and brand" is not "sales by region"
+    grouped = [d for d in dimensions if d != MONTH]
+    if len(grouped) > 1:
+        return None
+    years = [int(y) for y in YEAR_PATTERN.findall(raw)] if cube['has_month'] else []
+
+    shape = {
+        'metric': metric,
+        'dimension': next((d for d in dimensions if d != MONTH), None),
+        'filters': filters,
+        'years': years,
+        'average': average and metric in cube['sums'],
+        'narrative': bool(NARRATIVE_PATTERN.search(raw)),
+    }
+
+    # "why is the West region ahead" ranks every region rather than only West
+    shape['filters'] = [(d, v) for d, v in filters if d != shape['dimension']]
+
+    growth = GROWTH_PATTERN.search(raw)
+    top = TOP_PATTERN.search(raw)
+    if growth and cube['has_month']:
+        period = 'year' if re.search(r'\b(year|yoy|annual\w*|yearly)\b', raw) else \
+            'quarter' if re.search(r'\b(quarter\w*|qoq)\b', raw) else 'month'
+        return {**shape, 'kind': 'growth', 'period': period}
+    if shape['dimension'] is None:
+        if MONTH in dimensions:
+            return {**shape, 'kind': 'breakdown', 'dimension': MONTH}
+        return None
+    if MONTH in dimensions:
+        return None  # "sales by region by month" needs both groupings
+    if top:
+        count = top.group(1) or top.group(3)
+        count = DEFAULT_TOP_N if count is None else int(NUMBER_WORDS.get(count, count))
+        return {**shape, 'kind': 'top', 'count': count, 'ascending': top.group(2) in ASCENDING_WORDS}
+    return {**shape, 'kind': 'margin' if shape['metric'] == MARGIN else 'breakdown'}
+
+
+def filtered_cube(cube, filters, years):
+    """The cube restricted to the named dimension values and years"""
+    frame = cube['frame']
+    for dimension in {d for d, _ in filters}:
+        frame = frame[frame[dimension].isin([v for d, v in filters if d == dimension])]
+    if years:
+        frame = frame[frame[MONTH].dt.year.isin(years)]
+    return {**cube, 'frame': frame}
+
+
+def metric_values(table, cube, metric, average):
+    """The metric column of a rollup, as a per-row mean when asked for an average"""
+    if metric in cube['averages']:
+        return table[f'Avg {metric}'], f'Avg {metric}'
+    if average:
+        return table[metric] / table[ROWS], f'Avg {metric}'
+    return table[metric], metric
+
+
+def period_label(timestamps, period):
+    if period == 'year':
+        return timestamps.dt.year.astype(str)
+    if period == 'quarter':
+        return timestamps.dt.to_period('Q').astype(str)
+    return timestamps.dt.strftime('%Y-%m')
+
+
+def growth_table(cube, shape):
+    """Metric per period with the change from the previous period"""
+    frame = cube['frame']
+    if frame.empty:
+        return None
+    period = shape['period']
+    labels = period_label(frame[MONTH], period)
+    regrouped = {**cube, 'frame': frame.assign(**{period.title(): labels})}
+    by = [period.title()] + ([shape['dimension']] if shape['dimension'] else [])
+    table = rollup(regrouped, by)
+    values, name = metric_values(table, cube, shape['metric'], shape['average'])
+
+    if not shape['dimension']:
+        result = pd.DataFrame({name: values})
+        result['Change'] = values.diff()
+        result['% Change'] = values.pct_change()
+        return result, f"{name} by {period} with {period}-over-{period} change"
+
+    series = values.unstack(period.title())
+    if series.shape[1] < 2:
+        return None
+    previous, latest = series.columns[-2], series.columns[-1]
+    result = pd.DataFrame({str(previous): series[previous], str(latest): series[latest]})
+    result['Change'] = result[str(latest)] - result[str(previous)]
+    result['% Change'] = result['Change'] / result[str(previous)].where(result[str(previous)] != 0)
+    result = result.sort_values('% Change', ascending=False)
+    return result, f"{name} growth by {shape['dimension']}, {previous} to {latest}"
+
+
+def answer_table(cube, shape):
+    """(table, title) for a parsed question over an already filtered cube"""
+    if shape['kind'] == 'growth':
+        return growth_table(cube, shape)
+
+    dimension = shape['dimension']
+    table = rollup(cube, [dimension])
+    values, name = metric_values(table, cube, shape['metric'], shape['average'])
+    result = pd.DataFrame({name: values})
+    if name in cube['sums'] + [ROWS]:
+        result['Share'] = values / values.sum()
+
+    if shape['kind'] == 'top':
+        result = result.sort_values(name, ascending=shape['ascending']).head(shape['count'])
+        which = 'Bottom' if shape['ascending'] else 'Top'
+        return result, f"{which} {len(result)} {dimension} by {name}"
+    if dimension == MONTH:
+        result.index = result.index.strftime('%Y-%m')
+        return result, f"{name} by month"
+    return result.sort_values(name, ascending=False), f"{name} by {dimension}"
+
+
+def format_value(value, column):
+    if pd.isna(value):
+        return ''
+    if column in ('Share', '% Change', MARGIN) or 'Margin' in str(column):
+        return f"{value:.1%}"
+    if float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.2f}"
+
+
+def markdown_table(frame):
+    """Render a frame (its index as the first column) as a markdown table"""
+    frame = frame.head(MAX_TABLE_ROWS)
+    header = [str(frame.index.name or '')] + [str(c) for c in frame.columns]
+    lines = ['| ' + ' | '.join(header) + ' |', '|' + '---|' * len(header)]
+    for label, row in frame.iterrows():
+        cells = [str(label)] + [format_value(row[c], c) for c in frame.columns]
+        lines.append('| ' + ' | '.join(cells) + ' |')
+    return '\n'.join(lines)
+
+
+def fast_answer(df, fingerprint, query):
+    """(markdown answer, title, wants_narrative) for questions the cube answers exactly, else None"""
+    cube = get_cube(df, fingerprint)
+    shape = parse_query(query, cube)
+    if shape is None:
+        return None
+    cube = filtered_cube(cube, shape['filters'], shape['years'])
+    if cube['frame'].empty:
+        return None
+    answer = answer_table(cube, shape)
+    if answer is None:
+        return None
+    table, title = answer
+
+    scope = []
+    if shape['filters']:
+        scope.append(', '.join(str(v) for _, v in shape['filters']))
+    if shape['years']:
+        scope.append(', '.join(map(str, shape['years'])))
+    if scope:
+        title += f" ({'; '.join(scope)})"
+    rows = int(cube['frame'][ROWS].sum())
+    which = "matching" if scope else "all"
+    text = f"**{title}**\n\n{markdown_table(table)}\n\n_Computed exactly from {which} {rows:,} rows._"
+    return text, title, shape['narrative']
+
+
+def prepare_fast_answer(query, file_paths):
+    """Build a request carrying the computed answer, or None if the question needs the full analysis
+
+    The request only has a model prompt when the user asked for commentary.
+    """
+    df = load_data(file_paths)
+    if df is None:
+        return None
+    fingerprint = dataset_fingerprint(file_paths)
+    found = fast_answer(df, fingerprint, query)
+    if found is None:
+        return None
+    text, title, narrative = found
+    if not narrative:
+        return ai_request(None, None, title, answer=text)
+
+    prompt = f"""The following table was computed exactly from the user's dataset:
+
+{text}
+
+USER QUERY: {query}
+
+Answer the query using only the numbers in the table. Do not repeat the table; give a short
+explanation of what it shows, notable leaders and laggards, and any follow-up worth checking."""
+
+    system_message = "You are a data analyst expert. Explain exact computed results clearly and concisely."
+
+    return ai_request(prompt, system_message, title, query=query, scope=f"fast:{fingerprint}", answer=text)
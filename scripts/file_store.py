@@ -0,0 +1,127 @@
+"""
+Content-addressed Upload Storage
+Uploaded files are streamed to disk in chunks, hashed as they arrive and stored
+once under their SHA-256 in a hidden .objects folder; a JSON index maps each
+upload name to its current hash. Stored files never change, so caches can key
+on the hash instead of checking sizes and mtimes.
+"""
+import os
+import re
+import json
+import hashlib
+import threading
+
+OBJECTS_DIR_NAME = '.objects'
+INDEX_NAME = '.names.json'
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+OBJECT_NAME_PATTERN = re.compile(r'^([0-9a-f]{64})\.\w+$')
+
+
+def object_hash(file_path):
+    """The content hash of a stored upload, or None for other paths"""
+    folder, name = os.path.split(file_path)
+    if os.path.basename(folder) != OBJECTS_DIR_NAME:
+        return None
+    match = OBJECT_NAME_PATTERN.match(name)
+    return match.group(1) if match else None
+
+
+def upload_name(file_path):
+    """The name a stored upload is currently indexed under, or None for other paths
+
+    Lets per-file metadata follow an upload name across edited re-uploads,
+    which are stored under a new hash.
+    """
+    digest = object_hash(file_path)
+    if digest is None:
+        return None
+    index_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(file_path))), INDEX_NAME)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    names = sorted(name for name, entry in index.items() if entry.get('hash') == digest)
+    return names[0] if names else None
+
+
+class FileStore:
+    """Uploads under a data folder, addressed by name through the index"""
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = os.path.join(root, OBJECTS_DIR_NAME)
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self._lock = threading.Lock()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def object_path(self, digest, name):
+        """Where the content with this hash is stored (the extension picks the parser)"""
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(self.objects, digest + extension)
+
+    def save(self, name, stream):
+        """Store an upload from a file-like stream under name
+
+        Returns (path, created): created is False when identical bytes were
+        already stored, in which case nothing new is written.
+        """
+        os.makedirs(self.objects, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.objects, f"upload.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            path = self.object_path(digest.hexdigest(), name)
+            created = not os.path.exists(path)
+            if created:
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            index = self._read_index()
+            index[name] = {'hash': digest.hexdigest(), 'size': size}
+            self._write_index(index)
+        return path, created
+
+    def resolve(self, name):
+        """Path of the file uploaded as name, or of a plain file of that name in the folder"""
+        entry = self._read_index().get(name)
+        if entry is not None:
+            path = self.object_path(entry['hash'], name)
+            if os.path.exists(path):
+                return path
+        if os.path.basename(name) != name or name.startswith('.'):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    def list(self, extensions):
+        """Name and size of every upload and plain data file with one of the extensions"""
+        files = {}
+        if os.path.exists(self.root):
+            for name in os.listdir(self.root):
+                if name.endswith(extensions):
+                    files[name] = {'name': name, 'size': os.path.getsize(os.path.join(self.root, name))}
+        for name, entry in self._read_index().items():
+            if name.endswith(extensions):
+                files[name] = {'name': name, 'size': entry['size']}
+        return sorted(files.values(), key=lambda x: x['name'])
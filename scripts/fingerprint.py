@@ -0,0 +1,49 @@
+"""
+Dataset Fingerprints
+Content hashes of data files, memoized by (path, size, mtime) so each file is
+hashed once per change, and combined into a key for a selection of files
+"""
+import os
+import hashlib
+import threading
+
+from scripts.file_store import object_hash
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_hashes = {}  # path -> (size, mtime, sha256 hex digest)
+_lock = threading.Lock()
+
+
+def hash_file(file_path):
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path):
+    """Content hash of a file, recomputed only when its size or mtime changes"""
+    stored = object_hash(file_path)
+    if stored is not None:
+        return stored  # uploads are stored under their hash
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    with _lock:
+        entry = _hashes.get(path)
+    if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+        return entry[2]
+    digest = hash_file(path)
+    with _lock:
+        _hashes[path] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+
+def dataset_fingerprint(file_paths):
+    """Key for a selection of files: their content hashes in selection order"""
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        digest.update(file_fingerprint(file_path).encode())
+    return digest.hexdigest()
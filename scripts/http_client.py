@@ -0,0 +1,170 @@
+"""
+Shared HTTP Client
+One keep-alive requests.Session per upstream host with a bounded connection pool,
+jittered exponential retries on connection errors and 5xx responses, and timing
+of new connections (TCP + TLS handshake) versus whole requests. A call's timeout
+bounds all of its attempts together: each retry only gets the time that is left.
+Settings come from the environment so the Vercel API can use it without config.py:
+HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF
+"""
+import os
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.5"))  # seconds, doubled per attempt
+MAX_BACKOFF = 10.0
+
+_stats = {}  # host -> counters
+_stats_lock = threading.Lock()
+
+
+def record(host, **amounts):
+    """Add to the counters kept for a host"""
+    with _stats_lock:
+        counters = _stats.setdefault(host, {
+            "requests": 0, "retries": 0, "connections": 0,
+            "handshake_seconds": 0.0, "request_seconds": 0.0
+        })
+        for name, amount in amounts.items():
+            counters[name] += amount
+
+
+def deadline_for(timeout):
+    """Monotonic time by which every attempt of a call must be done, or None without a timeout"""
+    if isinstance(timeout, (int, float)):
+        return time.monotonic() + timeout
+    if isinstance(timeout, tuple) and None not in timeout:
+        return time.monotonic() + sum(timeout)
+    return None
+
+
+def time_left(timeout, deadline):
+    """A call's timeout (seconds or (connect, read)) cut to the time left before its deadline"""
+    left = max(deadline - time.monotonic(), 0.001)
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) for t in timeout)
+    return min(timeout, left)
+
+
+def backoff_delay(attempt, backoff=BACKOFF):
+    """Full jitter: uniform between 0 and the exponential cap"""
+    return random.uniform(0, min(MAX_BACKOFF, backoff * 2 ** attempt))
+
+
+def out_of_time(deadline, delay):
+    """Whether waiting delay seconds before another attempt would pass the deadline"""
+    return deadline is not None and time.monotonic() + delay >= deadline
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        record(self.host, connections=1, handshake_seconds=time.perf_counter() - start)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        record(self.host, connections=1, handshake_seconds=time.perf_counter() - start)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report how long they took to open"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+class HTTPClient:
+    """Keep-alive sessions per host with retries"""
+
+    def __init__(self, pool_size=POOL_SIZE, max_retries=MAX_RETRIES, backoff=BACKOFF):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        """Return the pooled session for the URL's host"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = TimedAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount(f"{parts.scheme}://{parts.netloc}", adapter)
+                self._sessions[key] = session
+            return session
+
+    def request(self, method, url, **kwargs):
+        """Send a request, retrying connection errors and 5xx responses
+
+        After the last attempt a 5xx response is returned as-is so callers can
+        raise_for_status() as before; connection errors are re-raised. The
+        timeout covers every attempt, so no retry starts once it has run out.
+        """
+        session = self.session(url)
+        host = urlsplit(url).hostname
+        timeout = kwargs.get("timeout")
+        deadline = deadline_for(timeout)
+        for attempt in range(self.max_retries + 1):
+            if deadline is not None:
+                kwargs["timeout"] = time_left(timeout, deadline)
+            delay = backoff_delay(attempt, self.backoff)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError:
+                record(host, requests=1, request_seconds=time.perf_counter() - start)
+                if attempt == self.max_retries or out_of_time(deadline, delay):
+                    raise
+            else:
+                record(host, requests=1, request_seconds=time.perf_counter() - start)
+                if response.status_code < 500 or attempt == self.max_retries or out_of_time(deadline, delay):
+                    return response
+                response.close()
+            record(host, retries=1)
+            time.sleep(delay)
+
+    def post(self, url, **kwargs):
+        """POST through the pooled session for the URL's host"""
+        return self.request("POST", url, **kwargs)
+
+
+client = HTTPClient()
+
+
+def post(url, **kwargs):
+    """POST through the shared client"""
+    return client.post(url, **kwargs)
+
+
+def stats():
+    """Per-host request, retry and connection counters with total times"""
+    with _stats_lock:
+        return {host: dict(counters) for host, counters in _stats.items()}
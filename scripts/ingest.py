@@ -0,0 +1,197 @@
+"""
+Typed Ingest
+Converts text columns that hold formatted numbers ("$6,000 ", "12,000", "50%")
+into numeric dtypes with vectorized string operations, parses date columns with
+a format inferred once from a sample, downcasts numbers and dictionary-encodes
+low-cardinality text columns as categoricals
+"""
+import sys
+import os
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CATEGORY_MAX_RATIO
+
+# Characters that mark a text column as formatted numbers rather than plain text
+NUMBER_FORMAT_PATTERN = r'[$,%]'
+# Accounting-style negatives: "($1,200)" -> "-$1,200"
+PARENTHESES_PATTERN = r'^\((.*)\)$'
+
+
+def is_text_column(series):
+    """True for object/string columns that contain only strings"""
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return False
+    return pd.api.types.infer_dtype(series, skipna=True) == 'string'
+
+
+def parse_formatted_numbers(series):
+    """Return the column as numbers if every value is a formatted number, else None"""
+    text = series.str.strip()
+    present = text.notna() & (text != '')
+    if not present.any() or not text[present].str.contains(NUMBER_FORMAT_PATTERN).any():
+        return None
+
+    is_percent = text[present].str.endswith('%')
+    if is_percent.any() and not is_percent.all():
+        return None
+
+    cleaned = (text.where(present)
+               .str.replace(PARENTHESES_PATTERN, r'-\1', regex=True)
+               .str.replace(r'[$,%\s]', '', regex=True))
+    numbers = pd.to_numeric(cleaned, errors='coerce')
+    if numbers[present].isna().any():
+        return None
+    if is_percent.all():
+        numbers = numbers / 100
+    return numbers
+
+
+# Smallest integer dtype used: element-wise products such as price x units
+# silently overflow in int8/int16, while aggregations upcast anyway
+MIN_INTEGER_DTYPE = 'int32'
+
+
+def downcast_integers(series):
+    """Downcast an integer column, but not below MIN_INTEGER_DTYPE"""
+    series = pd.to_numeric(series, downcast='integer')
+    if series.dtype.itemsize < pd.api.types.pandas_dtype(MIN_INTEGER_DTYPE).itemsize:
+        series = series.astype(MIN_INTEGER_DTYPE)
+    return series
+
+
+def downcast_numeric(series):
+    """Shrink numeric columns to the smallest safe dtype
+
+    Whole-number floats without gaps become integers. Other floats stay float64:
+    float32 loses cents on large sales totals and sums.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return downcast_integers(series)
+    if pd.api.types.is_float_dtype(series) and series.notna().all():
+        values = series.to_numpy()
+        if (values == values.round()).all() and abs(values).max(initial=0) < 2 ** 63:
+            return downcast_integers(series.astype('int64'))
+    return series
+
+
+def convert_numeric_columns(df):
+    """Convert formatted-number text columns to numbers and downcast numeric columns"""
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        if is_text_column(series):
+            numbers = parse_formatted_numbers(series)
+            if numbers is None:
+                continue
+            series = numbers
+        if pd.api.types.is_numeric_dtype(series):
+            converted[column] = downcast_numeric(series)
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+# Formats tried in order when inferring a date column; month-first wins ties
+DATE_FORMATS = [
+    '%m/%d/%Y', '%d/%m/%Y', '%Y-%m-%d', '%Y/%m/%d', '%m-%d-%Y', '%d-%m-%Y',
+    '%d.%m.%Y', '%m/%d/%y', '%d/%m/%y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S',
+    '%m/%d/%Y %H:%M', '%b %d, %Y', '%B %d, %Y', '%d %b %Y', '%d %B %Y', '%Y%m%d',
+]
+DATE_SAMPLE_SIZE = 200
+# Quick pre-check so ordinary text columns are not tried against every format
+DATE_LIKE_PATTERN = r'^\s*\d{1,4}[-/. ]|^\s*[A-Za-z]{3,9} \d{1,2}, \d{4}|^\d{8}$'
+
+
+def infer_date_format(series):
+    """Return the first DATE_FORMATS entry that parses a sample of the column, or None"""
+    sample = series.dropna().drop_duplicates().head(DATE_SAMPLE_SIZE).str.strip()
+    if sample.empty or not sample.str.contains(DATE_LIKE_PATTERN).all():
+        return None
+    for date_format in DATE_FORMATS:
+        parsed = pd.to_datetime(sample, format=date_format, errors='coerce')
+        if parsed.notna().all():
+            return date_format
+    return None
+
+
+def parse_dates(series, date_format):
+    """Parse a whole column with a fixed format, or return None if any value fails"""
+    present = series.notna()
+    parsed = pd.to_datetime(series.str.strip(), format=date_format, errors='coerce')
+    if parsed[present].isna().any():
+        return None
+    return parsed
+
+
+def convert_date_columns(df, known_formats=None):
+    """Parse date-like text columns into datetime64
+
+    known_formats maps column -> format from an earlier load of the same file and
+    is tried before inferring. Returns the new frame and the formats used.
+    """
+    known_formats = known_formats or {}
+    converted = {}
+    formats = {}
+    for column in df.columns:
+        series = df[column]
+        if not is_text_column(series):
+            continue
+        parsed = None
+        date_format = known_formats.get(column)
+        if date_format:
+            parsed = parse_dates(series, date_format)
+        if parsed is None:
+            date_format = infer_date_format(series)
+            if date_format:
+                parsed = parse_dates(series, date_format)
+        if parsed is not None:
+            converted[column] = parsed
+            formats[column] = date_format
+    if not converted:
+        return df, {}
+    return df.assign(**converted), formats
+
+
+def encode_categories(df, max_ratio=CATEGORY_MAX_RATIO):
+    """Convert text columns with few distinct values to category dtype
+
+    A column qualifies when its distinct values are at most max_ratio of its rows.
+    Returns the new frame and the names of the converted columns.
+    """
+    if len(df) == 0 or max_ratio <= 0:
+        return df, []
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        if not is_text_column(series):
+            continue
+        if series.nunique(dropna=True) <= len(series) * max_ratio:
+            converted[column] = series.astype('category')
+    if not converted:
+        return df, []
+    return df.assign(**converted), list(converted)
+
+
+def ingest(df, date_formats=None):
+    """Apply all ingest-time type conversions to a freshly parsed file
+
+    date_formats are the formats recorded for this file by an earlier ingest.
+    Returns the typed frame and a report of what changed and the memory saved.
+    """
+    bytes_before = int(df.memory_usage(deep=True).sum())
+    df = convert_numeric_columns(df)
+    df, formats = convert_date_columns(df, date_formats)
+    df, categorical = encode_categories(df)
+    bytes_after = int(df.memory_usage(deep=True).sum())
+    report = {
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_saved": bytes_before - bytes_after,
+        "date_formats": formats,
+        "categorical_columns": categorical
+    }
+    return df, report
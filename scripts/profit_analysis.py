@@ -7,16 +7,20 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scripts.utils import load_data, get_data_context, call_ai, format_output, error_output
+from scripts.utils import load_data, get_data_context, ai_request, complete_request, error_output, to_json
+from scripts.fingerprint import dataset_fingerprint
+from scripts.aggregates import aggregate_context
 
 
-def run_profit_analysis(query, file_paths):
-    """Analyze profitability using AI"""
+def prepare_profit_analysis(query, file_paths):
+    """Build the model request for a profitability analysis, or None if the data cannot be loaded"""
     df = load_data(file_paths)
     if df is None:
-        return error_output("Could not load data files")
+        return None
 
-    context = get_data_context(df)
+    fingerprint = dataset_fingerprint(file_paths)
+    context = get_data_context(df, fingerprint=fingerprint)
+    aggregates = aggregate_context(df, fingerprint, 'profit')
 
     prompt = f"""Based on this dataset, perform a profitability analysis:
 
@@ -25,6 +29,9 @@ USER QUERY: {query}
 DATASET:
 {context}
 
+EXACT AGGREGATES (computed over all rows, use these for totals and rankings):
+{aggregates}
+
 Please provide:
 1. **Profit Overview**: Total profit, average profit, profit range
 2. **Margin Analysis**: Profit margins by category (if available)
@@ -38,15 +45,22 @@ Use actual numbers. Calculate totals, averages, and percentages. Present in tabl
 
     system_message = "You are a financial analyst expert. Provide detailed profitability analysis with actual calculations, margins, and actionable recommendations."
 
-    result = call_ai(prompt, system_message)
-    return format_output(result, "Profit Analysis")
+    return ai_request(prompt, system_message, "Profit Analysis", query=query, scope=f"profit:{fingerprint}")
+
+
+def run_profit_analysis(query, file_paths):
+    """Analyze profitability using AI"""
+    request = prepare_profit_analysis(query, file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    return complete_request(request)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print(error_output("Usage: python profit_analysis.py <query> <file1> [file2] ..."))
+        print(to_json(error_output("Usage: python profit_analysis.py <query> <file1> [file2] ...")))
         sys.exit(1)
 
     query = sys.argv[1]
     file_paths = sys.argv[2:]
-    print(run_profit_analysis(query, file_paths))
+    print(to_json(run_profit_analysis(query, file_paths)))
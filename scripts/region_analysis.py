@@ -7,16 +7,20 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scripts.utils import load_data, get_data_context, call_ai, format_output, error_output
+from scripts.utils import load_data, get_data_context, ai_request, complete_request, error_output, to_json
+from scripts.fingerprint import dataset_fingerprint
+from scripts.aggregates import aggregate_context
 
 
-def run_region_analysis(query, file_paths):
-    """Analyze regional data using AI"""
+def prepare_region_analysis(query, file_paths):
+    """Build the model request for a regional analysis, or None if the data cannot be loaded"""
     df = load_data(file_paths)
     if df is None:
-        return error_output("Could not load data files")
+        return None
 
-    context = get_data_context(df)
+    fingerprint = dataset_fingerprint(file_paths)
+    context = get_data_context(df, fingerprint=fingerprint)
+    aggregates = aggregate_context(df, fingerprint, 'region')
 
     prompt = f"""Based on this dataset, perform a geographic/regional analysis:
 
@@ -25,6 +29,9 @@ USER QUERY: {query}
 DATASET:
 {context}
 
+EXACT AGGREGATES (computed over all rows, use these for totals and rankings):
+{aggregates}
+
 Please provide:
 1. **Geographic Coverage**: What regions/locations are in the data
 2. **Regional Performance**: Metrics by region (table format)
@@ -38,15 +45,22 @@ Use actual numbers. Show region-by-region breakdown in tables."""
 
     system_message = "You are a market analyst expert in geographic analysis. Provide regional breakdowns with actual data, identify geographic patterns, and highlight regional opportunities."
 
-    result = call_ai(prompt, system_message)
-    return format_output(result, "Regional Analysis")
+    return ai_request(prompt, system_message, "Regional Analysis", query=query, scope=f"region:{fingerprint}")
+
+
+def run_region_analysis(query, file_paths):
+    """Analyze regional data using AI"""
+    request = prepare_region_analysis(query, file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    return complete_request(request)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print(error_output("Usage: python region_analysis.py <query> <file1> [file2] ..."))
+        print(to_json(error_output("Usage: python region_analysis.py <query> <file1> [file2] ...")))
         sys.exit(1)
 
     query = sys.argv[1]
     file_paths = sys.argv[2:]
-    print(run_region_analysis(query, file_paths))
+    print(to_json(run_region_analysis(query, file_paths)))
@@ -0,0 +1,148 @@
+"""
+LLM Response Cache
+Two-tier cache for model responses: an in-memory LRU in front of a SQLite table
+that survives restarts and is shared by every process using the same file
+"""
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def connect(path):
+    """Open the cache database, creating its folder if needed"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def response_key(*parts):
+    """Stable hash of everything that determines a response"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Response cache with a TTL and a cap on stored entries"""
+
+    def __init__(self, path, ttl, max_entries, memory_entries=256):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (response, created)
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        conn = connect(self.path)
+        if not self._ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._ready = True
+        return conn
+
+    def _remember(self, key, response, created):
+        with self._lock:
+            self._memory[key] = (response, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return a fresh cached response, or None"""
+        entry = self.lookup(key)
+        return entry[0] if entry is not None else None
+
+    def lookup(self, key):
+        """Return (response, created time) of an unexpired entry, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry
+                del self._memory[key]
+
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        "SELECT response, created FROM responses WHERE key = ? AND created >= ?",
+                        (key, now - self.ttl)
+                    ).fetchone()
+                    if row is not None:
+                        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            row = None
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        self._remember(key, row[0], row[1])
+        with self._lock:
+            self.disk_hits += 1
+        return row[0], row[1]
+
+    def put(self, key, response):
+        """Store a response, dropping expired and least recently used rows over the cap"""
+        now = time.time()
+        self._remember(key, response, now)
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                        (key, response, now, now)
+                    )
+                    conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass  # the memory tier still serves this process
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._memory.clear()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM responses")
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        """Hit and miss counters for this process"""
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,86 @@
+"""
+Query Router
+Matches a query against every analysis type's keywords in a single pass of one
+compiled, word-boundary regex and scores each type by its hits, so queries that
+ask for several things ("compare top regions by profit over time") can be sent
+to every matching analysis instead of only the first one listed
+"""
+import re
+
+# (analysis type, script, keywords) in tie-break order
+INTENTS = [
+    ('summary', 'summary_analysis.py', ['summary', 'summarize', 'overview', 'describe', 'what is this', 'about']),
+    ('top', 'top_analysis.py', ['top', 'best', 'highest', 'most', 'largest', 'greatest', 'leading']),
+    ('compare', 'compare_analysis.py', ['compare', 'comparison', 'versus', 'vs', 'difference', 'between']),
+    ('trend', 'trend_analysis.py', ['trend', 'trends', 'over time', 'growth', 'change', 'monthly',
+                                    'yearly', 'pattern', 'patterns']),
+    ('profit', 'profit_analysis.py', ['profit', 'profitable', 'margin', 'margins', 'earnings', 'revenue',
+                                      'income', 'cost', 'costs']),
+    ('region', 'region_analysis.py', ['region', 'regions', 'regional', 'location', 'locations', 'geography',
+                                      'state', 'states', 'city', 'cities', 'country', 'countries', 'area', 'areas']),
+]
+CUSTOM = ('custom', 'custom_query.py')
+# Generic wording that only means "summary" when nothing more specific matched
+WEAK_INTENTS = {'summary'}
+# Types that only qualify the types next to them: "top regions" is a region
+# question and "most profitable states" a profit one, not separate analyses
+QUALIFIES = {'top': {'compare', 'trend', 'profit', 'region'}, 'region': {'profit'}}
+# Types scoring less than this share of the best score are dropped
+MIN_SCORE_SHARE = 0.5
+
+
+class Router:
+    """Scores every intent of a query with one compiled regex"""
+
+    def __init__(self, intents=INTENTS):
+        self.intents = intents
+        self.scripts = {name: script for name, script, _ in intents}
+        self.order = {name: i for i, (name, _, _) in enumerate(intents)}
+        groups = []
+        for name, _, keywords in intents:
+            # Longest first so "over time" wins over "time"
+            words = sorted(keywords, key=len, reverse=True)
+            groups.append(f"(?P<{name}>{'|'.join(re.escape(w) for w in words)})")
+        self.pattern = re.compile(r'\b(?:' + '|'.join(groups) + r')\b', re.IGNORECASE)
+
+    def phrases(self, query):
+        """Analysis types of each run of adjacent keywords, in order"""
+        phrases = []
+        end = None
+        for match in self.pattern.finditer(query):
+            if end is not None and not query[end:match.start()].strip():
+                phrases[-1].append(match.lastgroup)
+            else:
+                phrases.append([match.lastgroup])
+            end = match.end()
+        return phrases
+
+    def scores(self, query):
+        """Score per matching analysis type (one point per phrase naming it)"""
+        scores = {}
+        for names in self.phrases(query):
+            names = set(names)
+            for name in names:
+                if not QUALIFIES.get(name, set()) & names:
+                    scores[name] = scores.get(name, 0) + 1
+        return scores
+
+    def route(self, query, limit=None):
+        """[(type, script, score)] best first, or [custom] when nothing matches"""
+        scores = self.scores(query)
+        if len(scores) > 1:
+            scores = {name: score for name, score in scores.items() if name not in WEAK_INTENTS} or scores
+        if scores:
+            best = max(scores.values())
+            scores = {name: score for name, score in scores.items() if score >= best * MIN_SCORE_SHARE}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.order[item[0]]))
+        routes = [(name, self.scripts[name], score) for name, score in ranked[:limit]]
+        return routes or [CUSTOM + (0,)]
+
+    def detect(self, query):
+        """The single best (type, script) for a query"""
+        name, script, _ = self.route(query, limit=1)[0]
+        return name, script
+
+
+router = Router()
@@ -0,0 +1,147 @@
+"""
+Web Search Cache
+Search answers (citations included) are cached by normalized query. Within the
+TTL they are returned as is; after it, the stale answer is still returned right
+away while one background request refreshes it, until it is older than the TTL
+plus the stale window and has to be fetched again. Concurrent misses for the
+same query share one fetch.
+"""
+import re
+import json
+import time
+import asyncio
+import threading
+
+from scripts.response_cache import ResponseCache, response_key
+from scripts.single_flight import SingleFlight, AsyncSingleFlight
+
+
+def normalize_query(query):
+    """Case, spacing and trailing punctuation do not change a search"""
+    return re.sub(r'\s+', ' ', query).strip().rstrip('?.!').strip().casefold()
+
+
+class SearchCache:
+    """TTL cache for web search results that serves stale entries while refreshing them"""
+
+    def __init__(self, path, ttl, stale_ttl, max_entries, memory_entries=256, scope='', timeout=60):
+        self.store = ResponseCache(path, ttl + stale_ttl, max_entries, memory_entries)
+        self.ttl = ttl
+        self.scope = scope
+        self.timeout = timeout  # how long a caller waits for another caller's fetch
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._refreshing = set()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._fetches = SingleFlight()
+        self._async_fetches = AsyncSingleFlight()
+
+    def key(self, query):
+        return response_key('web_search', self.scope, normalize_query(query))
+
+    def lookup(self, key):
+        """(result, is_stale) for a cached search, or None"""
+        entry = self.store.lookup(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        response, created = entry
+        stale = time.time() - created > self.ttl
+        with self._lock:
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.fresh_hits += 1
+        return json.loads(response), stale
+
+    def save(self, key, result):
+        """Cache a successful search result"""
+        if result.get('success'):
+            self.store.put(key, json.dumps(result))
+
+    def _claim(self, key):
+        """Whether the caller should refresh key (False if a refresh is already running)"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def _refreshed(self, key, result=None, error=False):
+        with self._lock:
+            self._refreshing.discard(key)
+            if error or not (result or {}).get('success'):
+                self.refresh_errors += 1
+        if result is not None:
+            self.save(key, result)
+
+    def _refresh(self, key, query, fetch):
+        try:
+            result = fetch(query)
+        except Exception:
+            self._refreshed(key, error=True)
+        else:
+            self._refreshed(key, result)
+
+    async def _refresh_async(self, key, query, fetch):
+        try:
+            result = await fetch(query)
+        except Exception:
+            await asyncio.to_thread(self._refreshed, key, error=True)
+        else:
+            await asyncio.to_thread(self._refreshed, key, result)
+
+    def _fetch(self, key, query, fetch):
+        result = fetch(query)
+        self.save(key, result)
+        return result
+
+    async def _fetch_async(self, key, query, fetch):
+        result = await fetch(query)
+        await asyncio.to_thread(self.save, key, result)
+        return result
+
+    def get(self, query, fetch):
+        """fetch(query)'s result, from the cache when possible; stale hits refresh in a background thread"""
+        key = self.key(query)
+        found = self.lookup(key)
+        if found is None:
+            return self._fetches.run(key, lambda: self._fetch(key, query, fetch), self.timeout)
+        result, stale = found
+        if stale and self._claim(key):
+            threading.Thread(target=self._refresh, args=(key, query, fetch), daemon=True).start()
+        return result
+
+    async def get_async(self, query, fetch):
+        """Async get for a coroutine fetch; stale hits refresh in a background task
+
+        SQLite reads and writes run on worker threads so they do not block the loop.
+        """
+        key = self.key(query)
+        found = await asyncio.to_thread(self.lookup, key)
+        if found is None:
+            return await self._async_fetches.run(key, lambda: self._fetch_async(key, query, fetch), self.timeout)
+        result, stale = found
+        if stale and self._claim(key):
+            task = asyncio.create_task(self._refresh_async(key, query, fetch))
+            self._tasks.add(task)  # keep a reference until it finishes
+            task.add_done_callback(self._tasks.discard)
+        return result
+
+    def stats(self):
+        """Hit, miss and refresh counters for this process"""
+        with self._lock:
+            return {
+                'fresh_hits': self.fresh_hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'refreshing': len(self._refreshing)
+            }
@@ -0,0 +1,321 @@
+"""
+BM25 Document Search
+Tokenizes the knowledge-base documents (rag_data.json) once into an inverted
+index whose postings already hold each term's BM25 weight in each document.
+Each term's postings are also kept highest-weight first, so a query scores only
+the leading block of every list and stops once no unseen document can make the
+top k. The index is stored as flat .npy arrays that are memory-mapped on load
+and rebuilt when the source file changes.
+"""
+import os
+import re
+import sys
+import json
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CACHE_DIR, RAG_DATA_PATH
+
+INDEX_VERSION = 1
+INDEX_DIR = os.path.join(CACHE_DIR, 'search_index')
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Postings per query term scored before checking whether the top k is settled
+CANDIDATE_BLOCK = 256
+# Fields indexed, with how many times their words count
+FIELD_WEIGHTS = {'title': 2, 'summary': 1, 'content': 1, 'tags': 2, 'category': 1}
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have how i in is it its of on or that the this to was what '
+    'when where which who why will with you your'.split())
+ARRAYS = ('offsets', 'postings', 'weights', 'impact_postings', 'impact_weights',
+          'categories', 'tag_offsets', 'tag_postings')
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [t for t in TOKEN_PATTERN.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def document_tokens(doc):
+    """Tokens of a document's indexed fields, repeated by field weight"""
+    tokens = []
+    for field, weight in FIELD_WEIGHTS.items():
+        value = doc.get(field) or ''
+        if isinstance(value, list):
+            value = ' '.join(map(str, value))
+        tokens.extend(tokenize(value) * weight)
+    return tokens
+
+
+def source_signature(path):
+    """(size, mtime) of the source file, to tell when the index is out of date"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def read_documents(path):
+    """The list of documents in a rag_data.json style file"""
+    with open(path) as f:
+        docs = json.load(f)
+    return docs if isinstance(docs, list) else docs.get('documents', [])
+
+
+def group_offsets(keys, count):
+    """CSR offsets for values sorted by an integer key in range(count)"""
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=count), out=offsets[1:])
+    return offsets
+
+
+def contains(sorted_ids, ids):
+    """Which of ids appear in an ascending id array"""
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return sorted_ids[positions] == ids
+
+
+def top_k(doc_ids, scores, k):
+    """The k highest scores, best first (ties by document id)"""
+    if len(doc_ids) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        doc_ids, scores = doc_ids[best], scores[best]
+    order = np.lexsort((doc_ids, -scores))
+    return doc_ids[order], scores[order]
+
+
+class SearchIndex:
+    """Inverted index with precomputed BM25 weights over a list of documents
+
+    Term i's postings are postings[offsets[i]:offsets[i + 1]] (document ids in
+    ascending order) with their BM25 weights at the same positions in weights;
+    impact_postings and impact_weights hold the same slices sorted by weight,
+    highest first. Each document's category is a code into meta['categories'];
+    documents with tag j are tag_postings[tag_offsets[j]:tag_offsets[j + 1]].
+    """
+
+    def __init__(self, documents, meta, arrays):
+        self.documents = documents
+        self.meta = meta
+        self.terms = {term: i for i, term in enumerate(meta['terms'])}
+        self.category_codes = {name: i for i, name in enumerate(meta['categories'])}
+        self.tag_codes = {name: i for i, name in enumerate(meta['tags'])}
+        for name in ARRAYS:
+            # Plain ndarray views: indexing a np.memmap is much slower
+            setattr(self, name, np.asarray(arrays[name]))
+
+    @classmethod
+    def build(cls, documents, k1=BM25_K1, b=BM25_B):
+        """Tokenize the documents and compute every posting's BM25 weight"""
+        vocabulary = {}
+        term_ids, tfs, lengths, distinct = [], [], [], []
+        for doc in documents:
+            counts = Counter(document_tokens(doc))
+            term_ids.extend(vocabulary.setdefault(term, len(vocabulary)) for term in counts)
+            tfs.extend(counts.values())
+            lengths.append(sum(counts.values()))
+            distinct.append(len(counts))
+
+        count = len(documents)
+        term_ids = np.array(term_ids, dtype=np.int64)
+        tfs = np.array(tfs, dtype=np.float64)
+        lengths = np.array(lengths, dtype=np.float64)
+        doc_ids = np.repeat(np.arange(count, dtype=np.uint32), distinct)
+
+        offsets = group_offsets(term_ids, len(vocabulary))
+        doc_freq = np.diff(offsets).astype(np.float64)
+        idf = np.log(1 + (count - doc_freq + 0.5) / (doc_freq + 0.5))
+        norms = k1 * (1 - b + b * lengths / max(lengths.mean(), 1)) if count else lengths
+        weights = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norms[doc_ids])).astype(np.float32)
+        by_doc = np.lexsort((doc_ids, term_ids))
+        by_impact = np.lexsort((doc_ids, -weights, term_ids))
+
+        category_names = sorted({str(doc.get('category') or '') for doc in documents})
+        category_codes = {name: i for i, name in enumerate(category_names)}
+        categories = np.array([category_codes[str(doc.get('category') or '')] for doc in documents], dtype=np.int32)
+        tag_docs = defaultdict(list)
+        for doc_id, doc in enumerate(documents):
+            for tag in dict.fromkeys(map(str, doc.get('tags') or [])):
+                tag_docs[tag].append(doc_id)
+        tag_names = sorted(tag_docs)
+        tag_keys = np.repeat(np.arange(len(tag_names)), [len(tag_docs[t]) for t in tag_names])
+        tag_postings = np.array([d for t in tag_names for d in tag_docs[t]], dtype=np.uint32)
+
+        meta = {'version': INDEX_VERSION, 'k1': k1, 'b': b, 'documents': count,
+                'terms': list(vocabulary), 'categories': category_names, 'tags': tag_names}
+        arrays = {
+            'offsets': offsets,
+            'postings': doc_ids[by_doc],
+            'weights': weights[by_doc],
+            'impact_postings': doc_ids[by_impact],
+            'impact_weights': weights[by_impact],
+            'categories': categories,
+            'tag_offsets': group_offsets(tag_keys, len(tag_names)),
+            'tag_postings': tag_postings
+        }
+        return cls(documents, meta, arrays)
+
+    def save(self, folder):
+        """Write the arrays as .npy files and the vocabulary as JSON (written last)"""
+        os.makedirs(folder, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        for name in ARRAYS:
+            tmp_path = os.path.join(folder, name + suffix)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, getattr(self, name))
+            os.replace(tmp_path, os.path.join(folder, name + '.npy'))
+        tmp_path = os.path.join(folder, 'meta' + suffix)
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f, separators=(',', ':'))
+        os.replace(tmp_path, os.path.join(folder, 'meta.json'))
+
+    @classmethod
+    def load(cls, folder, documents, signature=None):
+        """Open a saved index with its arrays memory-mapped, or None if missing or out of date"""
+        try:
+            with open(os.path.join(folder, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('version') != INDEX_VERSION or meta.get('source') != signature:
+                return None
+            if meta['documents'] != len(documents):
+                return None
+            arrays = {name: np.load(os.path.join(folder, name + '.npy'), mmap_mode='r') for name in ARRAYS}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(documents, meta, arrays)
+
+    def stats(self):
+        return {
+            'documents': self.meta['documents'],
+            'terms': len(self.terms),
+            'postings': int(len(self.postings)),
+            'categories': len(self.category_codes),
+            'tags': len(self.tag_codes)
+        }
+
+    def query_terms(self, query):
+        """Index term ids of the distinct words of a query"""
+        return [self.terms[t] for t in dict.fromkeys(tokenize(query)) if t in self.terms]
+
+    def score(self, term_ids, doc_ids):
+        """Exact BM25 scores of some documents, looked up in each term's postings"""
+        scores = np.zeros(len(doc_ids), dtype=np.float32)
+        for t in term_ids:
+            start, end = self.offsets[t], self.offsets[t + 1]
+            postings = self.postings[start:end]
+            positions = np.minimum(np.searchsorted(postings, doc_ids), end - start - 1)
+            found = postings[positions] == doc_ids
+            scores[found] += self.weights[start:end][positions[found]]
+        return scores
+
+    def matching(self, doc_ids, category=None, tags=None):
+        """Which documents are in the category and have at least one of the tags"""
+        keep = np.ones(len(doc_ids), dtype=bool)
+        if category:
+            keep &= np.asarray(self.categories[doc_ids]) == self.category_codes.get(category, -1)
+        if tags:
+            groups = [self.tag_postings[self.tag_offsets[j]:self.tag_offsets[j + 1]]
+                      for j in (self.tag_codes.get(t) for t in tags) if j is not None]
+            if len(doc_ids) * 8 > self.meta['documents']:
+                # Many documents: one lookup each in a mask over the corpus
+                tagged = np.zeros(self.meta['documents'], dtype=bool)
+                for group in groups:
+                    tagged[group] = True
+                keep &= tagged[doc_ids]
+            else:
+                tagged = np.zeros(len(doc_ids), dtype=bool)
+                for group in groups:
+                    tagged |= contains(group, doc_ids)
+                keep &= tagged
+        return keep
+
+    def candidates(self, term_ids, block):
+        """Documents in the leading block of each term's impact-ordered postings
+
+        Returns (doc ids, bound) where no other document scores above bound.
+        """
+        ids, bound = [], 0.0
+        for t in term_ids:
+            start, end = self.offsets[t], self.offsets[t + 1]
+            ids.append(self.impact_postings[start:min(start + block, end)])
+            if end - start > block:
+                bound += float(self.impact_weights[start + block])
+        return np.unique(np.concatenate(ids)), bound
+
+    def scan(self, term_ids):
+        """(doc ids, scores) of every document containing a query term"""
+        ids = np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.weights[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        scores = np.bincount(ids, weights=weights, minlength=self.meta['documents']).astype(np.float32)
+        doc_ids = np.flatnonzero(scores).astype(np.uint32)
+        return doc_ids, scores[doc_ids]
+
+    def search(self, query, k=5, category=None, tags=None):
+        """The k best [(doc id, score)] for a query, optionally filtered by category and tags
+
+        Scores the documents at the head of each term's impact-ordered postings
+        and only reads every posting when an unseen document could still beat
+        the k-th best score.
+        """
+        term_ids = self.query_terms(query)
+        if not term_ids:
+            return []
+        doc_ids, bound = self.candidates(term_ids, max(CANDIDATE_BLOCK, 4 * k))
+        doc_ids = doc_ids[self.matching(doc_ids, category, tags)]
+        doc_ids, scores = top_k(doc_ids, self.score(term_ids, doc_ids), k)
+        if bound > 0 and (len(scores) < k or scores[-1] < bound):
+            doc_ids, scores = self.scan(term_ids)
+            keep = self.matching(doc_ids, category, tags)
+            doc_ids, scores = top_k(doc_ids[keep], scores[keep], k)
+        return [(int(d), float(s)) for d, s in zip(doc_ids, scores)]
+
+    def allowed(self, category=None, tags=None):
+        """Boolean mask of the documents passing the filters, or None when unfiltered"""
+        if not category and not tags:
+            return None
+        return self.matching(np.arange(self.meta['documents'], dtype=np.uint32), category, tags)
+
+    def results(self, query, k=5, category=None, tags=None):
+        """Search results as dicts for the API, best first"""
+        return [document_result(self.documents[doc_id], doc_id, score)
+                for doc_id, score in self.search(query, k, category, tags)]
+
+
+def document_result(doc, doc_id, score):
+    """A search hit as returned by the API (the document without its content)"""
+    return {'id': doc_id, 'score': round(score, 4),
+            **{key: doc.get(key) for key in ('title', 'summary', 'category', 'tags', 'source', 'author')}}
+
+
+def open_index(source_path=RAG_DATA_PATH, folder=INDEX_DIR):
+    """Load the saved index for a documents file, building and saving it if out of date"""
+    signature = source_signature(source_path)
+    documents = read_documents(source_path)
+    index = SearchIndex.load(folder, documents, signature)
+    if index is None:
+        index = SearchIndex.build(documents)
+        index.meta['source'] = signature
+        index.save(folder)
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide index, opening it on first use (None without a documents file)"""
+    global _index
+    with _index_lock:
+        if _index is None and os.path.exists(RAG_DATA_PATH):
+            _index = open_index()
+        return _index
+
+
+def stats():
+    """Size of the loaded index, or None before it is opened"""
+    return _index.stats() if _index is not None else None
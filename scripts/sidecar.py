@@ -0,0 +1,97 @@
+"""
+Columnar Sidecar Cache
+Keeps a typed Feather copy of each data file in a hidden .cache folder next to it,
+so later loads read columns straight from Arrow instead of re-parsing CSV/Excel
+Also keeps a small JSON metadata file per data file (e.g. inferred date formats),
+keyed by upload name so it carries over to an edited re-upload of the file
+"""
+import os
+import json
+
+import pandas as pd
+
+from scripts.file_store import upload_name
+
+try:
+    import pyarrow  # noqa: F401 - Feather support
+    SIDECAR_AVAILABLE = True
+except ImportError:
+    SIDECAR_AVAILABLE = False
+
+CACHE_DIR_NAME = '.cache'
+# Bump when the stored frame changes (e.g. new ingest rules) so old copies are ignored
+SIDECAR_VERSION = 4
+
+
+def sidecar_path(file_path):
+    """Location of the Feather copy for a data file"""
+    folder, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(folder, CACHE_DIR_NAME, f"{name}.v{SIDECAR_VERSION}.feather")
+
+
+def metadata_path(file_path):
+    """Location of the JSON metadata for a data file
+
+    Stored uploads are named by content hash, so their metadata lives beside the
+    upload folder under the name they were uploaded as instead.
+    """
+    folder, name = os.path.split(os.path.abspath(file_path))
+    uploaded = upload_name(file_path)
+    if uploaded is not None:
+        folder, name = os.path.dirname(folder), uploaded
+    return os.path.join(folder, CACHE_DIR_NAME, name + '.meta.json')
+
+
+def read_metadata(file_path):
+    """Read the stored metadata for a data file, or an empty dict"""
+    try:
+        with open(metadata_path(file_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_metadata(file_path, metadata):
+    """Store metadata for a data file; returns False if it cannot be written"""
+    path = metadata_path(file_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        return False
+
+
+def read_sidecar(file_path, columns=None):
+    """Read the Feather copy if it is at least as new as the source, else None"""
+    if not SIDECAR_AVAILABLE:
+        return None
+    path = sidecar_path(file_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(file_path):
+            return None
+        return pd.read_feather(path, columns=columns)
+    except Exception:
+        # Missing, stale or unreadable copies fall back to parsing the source
+        return None
+
+
+def write_sidecar(file_path, df):
+    """Write the Feather copy of a parsed file; returns False if it cannot be stored"""
+    if not SIDECAR_AVAILABLE:
+        return False
+    path = sidecar_path(file_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.reset_index(drop=True).to_feather(tmp_path)
+        os.replace(tmp_path, path)
+        return True
+    except Exception:
+        # e.g. mixed-type object columns Arrow cannot represent
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
@@ -0,0 +1,211 @@
+"""
+Similar Query Cache
+Reuses an earlier answer when a new question is worded differently but means the
+same thing ("top 5 brands by sales" / "what are the five best selling brands").
+Queries are normalized, turned into TF-IDF vectors with NumPy and compared by
+cosine similarity, only against earlier queries on the same dataset and analysis.
+Similarity alone is not enough: queries that differ in any number, name or
+filter word ("... excluding Texas") never share an answer, and cosine similarity
+over the remaining words decides the rest
+"""
+import re
+import time
+import zlib
+import sqlite3
+import threading
+
+import numpy as np
+
+from scripts.response_cache import connect
+
+VECTOR_SIZE = 1024
+
+STOPWORDS = {
+    'a', 'an', 'the', 'what', 'which', 'who', 'are', 'is', 'was', 'were', 'be', 'of', 'in',
+    'on', 'for', 'to', 'by', 'with', 'me', 'my', 'our', 'show', 'give', 'tell', 'list',
+    'please', 'can', 'you', 'i', 'we', 'do', 'does', 'and', 'at', 'from', 'this', 'that',
+    'data', 'dataset', 'there', 'how', 'all', 'some', 'find', 'get', 'us', 'total', 'overall',
+}
+NUMBER_WORDS = {
+    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6', 'seven': '7',
+    'eight': '8', 'nine': '9', 'ten': '10', 'twenty': '20', 'fifty': '50', 'hundred': '100',
+}
+SYNONYMS = {
+    'best': 'top', 'highest': 'top', 'largest': 'top', 'greatest': 'top', 'leading': 'top',
+    'biggest': 'top', 'most': 'top', 'selling': 'sales', 'sold': 'sales', 'sell': 'sales',
+    'revenue': 'sales', 'worst': 'bottom', 'lowest': 'bottom', 'least': 'bottom',
+    'smallest': 'bottom', 'earnings': 'profit', 'profitable': 'profit', 'vs': 'versus',
+    'trending': 'trend', 'growth': 'trend',
+}
+# Words that narrow or flip what is asked; they have to appear in both queries
+FILTER_WORDS = {
+    'excluding', 'exclude', 'except', 'without', 'not', 'no', 'only', 'over', 'under', 'above',
+    'below', 'more', 'less', 'fewer', 'greater', 'than', 'between', 'before', 'after', 'since',
+    'until', 'top', 'bottom', 'first', 'last', 'versus',
+}
+# Phrasing that does not change what is asked; left out of the similarity too
+PHRASING = {
+    'rank', 'ranking', 'ranked', 'breakdown', 'break', 'down', 'look', 'like', 'see', 'want', 'know',
+    'need', 'current', 'currently', 'analysis', 'analyze', 'analyse', 'display', 'view', 'report',
+    'would', 'could', 'should', 'much', 'many', 'each', 'per', 'across', 'right', 'now',
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]+(?:\.[0-9]+)?")
+
+
+def normalize_query(query):
+    """Lowercase, drop filler words, unify numbers and synonyms, crude singulars"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(query.lower()):
+        if token in STOPWORDS:
+            continue
+        token = NUMBER_WORDS.get(token, token)
+        token = SYNONYMS.get(token, token)
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def guard_tokens(query):
+    """Tokens that must match exactly: "top 5" is never "top 10", "in Texas" never "in Ohio"
+
+    These are numbers, filter words and names, taken to be words capitalized
+    anywhere but at the start of the query.
+    """
+    guard = set()
+    for position, word in enumerate(WORD_PATTERN.findall(query)):
+        tokens = normalize_query(word)
+        if not tokens:
+            continue
+        token = tokens[0]
+        if any(c.isdigit() for c in token) or token in FILTER_WORDS:
+            guard.add(token)
+        elif position > 0 and word[0].isupper() and token not in PHRASING:
+            guard.add(token)
+    return frozenset(guard)
+
+
+def similarity_tokens(tokens, guard):
+    """The tokens left for cosine similarity once the guard and phrasing are removed"""
+    return [t for t in tokens if t not in guard and t not in PHRASING]
+
+
+def _bucket(token):
+    return zlib.crc32(token.encode()) % VECTOR_SIZE
+
+
+def tfidf_matrix(token_lists):
+    """L2-normalized TF-IDF rows over hashed token buckets"""
+    counts = np.zeros((len(token_lists), VECTOR_SIZE), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        for token in tokens:
+            counts[row, _bucket(token)] += 1
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log((1 + len(token_lists)) / (1 + document_frequency)) + 1
+    weighted = counts * idf
+    norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return weighted / norms
+
+
+class SimilarQueryCache:
+    """Answers keyed by a scope (analysis type + dataset) and matched by similarity"""
+
+    def __init__(self, path, ttl, threshold, max_per_scope=200):
+        self.path = path
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_per_scope = max_per_scope
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        conn = connect(self.path)
+        if not self._ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS similar_answers ("
+                "scope TEXT NOT NULL, guard TEXT NOT NULL, tokens TEXT NOT NULL, response TEXT NOT NULL, "
+                "created REAL NOT NULL, PRIMARY KEY (scope, guard, tokens))"
+            )
+            self._ready = True
+        return conn
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, scope, query):
+        """Return the answer to the most similar earlier query above the threshold"""
+        tokens = normalize_query(query)
+        if not tokens:
+            return None
+        guard = guard_tokens(query)
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT tokens, response FROM similar_answers WHERE scope = ? AND guard = ? AND created >= ?",
+                    (scope, " ".join(sorted(guard)), time.time() - self.ttl)
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            rows = []
+
+        terms = similarity_tokens(tokens, guard)
+        candidates = [(similarity_tokens(t.split(), guard), r) for t, r in rows]
+        if not terms:
+            # Nothing but numbers, names and filters: only the same nothing matches
+            candidates = [c for c in candidates if not c[0]]
+            self._count(bool(candidates))
+            return candidates[0][1] if candidates else None
+        if not candidates:
+            self._count(False)
+            return None
+
+        vectors = tfidf_matrix([terms] + [c[0] for c in candidates])
+        scores = vectors[1:] @ vectors[0]
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self._count(False)
+            return None
+        self._count(True)
+        return candidates[best][1]
+
+    def put(self, scope, query, response):
+        """Remember an answer, keeping the newest max_per_scope per scope"""
+        tokens = normalize_query(query)
+        if not tokens:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO similar_answers (scope, guard, tokens, response, created) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (scope, " ".join(sorted(guard_tokens(query))), " ".join(tokens), response, now)
+                    )
+                    conn.execute("DELETE FROM similar_answers WHERE created < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM similar_answers WHERE scope = ? AND rowid IN ("
+                        "SELECT rowid FROM similar_answers WHERE scope = ? "
+                        "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (scope, scope, self.max_per_scope)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        """Hit and miss counters for this process"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "threshold": self.threshold}
@@ -0,0 +1,249 @@
+"""
+Single-flight Request Coalescing
+Identical analyses that arrive while one is already running share its result:
+the first caller (the leader) does the work and later callers (followers) wait
+for it, replaying any streamed chunks, instead of each calling the model again
+
+If the leader's caller stops listening, the work carries on for any followers
+still waiting and is only cancelled once nobody is left to receive it
+"""
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+
+class Flight:
+    """One in-flight piece of work: the chunks streamed so far and its outcome"""
+
+    def __init__(self, make_queue):
+        self._make_queue = make_queue
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._queues = []
+        self._outcome = None
+        self.listeners = 1  # the leader and followers still waiting, guarded by the SingleFlight lock
+
+    def publish(self, text):
+        """Pass a streamed chunk to every follower"""
+        with self._lock:
+            self._chunks.append(text)
+            queues = list(self._queues)
+        for q in queues:
+            q.put_nowait(('chunk', text))
+
+    def finish(self, result=None, error=None):
+        """Hand the result (or the exception) to every follower"""
+        with self._lock:
+            self._outcome = ('error', error) if error is not None else ('done', result)
+            queues, self._queues = self._queues, []
+        for q in queues:
+            q.put_nowait(self._outcome)
+
+    def subscribe(self):
+        """Queue of ('chunk', text) events so far and to come, ending in 'done' or 'error'"""
+        q = self._make_queue()
+        with self._lock:
+            for text in self._chunks:
+                q.put_nowait(('chunk', text))
+            if self._outcome is not None:
+                q.put_nowait(self._outcome)
+            else:
+                self._queues.append(q)
+        return q
+
+    @property
+    def finished(self):
+        return self._outcome is not None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key across threads"""
+
+    make_queue = queue.Queue
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def join(self, key):
+        """Return (flight, is_leader) for a key, starting a flight if none is running"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.followers += 1
+                flight.listeners += 1
+                return flight, False
+            flight = self._flights[key] = Flight(self.make_queue)
+            self.leaders += 1
+            return flight, True
+
+    def land(self, key, flight, result=None, error=None):
+        """Finish a flight; calls arriving after this start a new one"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(result, error)
+
+    def leave(self, key, flight):
+        """Stop listening to a flight; True if nobody is left and it was cancelled"""
+        with self._lock:
+            flight.listeners -= 1
+            if flight.listeners or flight.finished:
+                return False
+            # No new caller can join a cancelled flight
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error=RuntimeError('Analysis was cancelled'))
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {'leaders': self.leaders, 'followers': self.followers, 'in_flight': len(self._flights)}
+
+    def run(self, key, func, timeout):
+        """Return func()'s result, shared with concurrent calls for the same key
+
+        A key of None runs func without coalescing. Followers raise
+        concurrent.futures.TimeoutError if the result does not arrive in time.
+        """
+        for kind, payload in self.stream(key, lambda: iter([('done', func())]), timeout):
+            if kind == 'done':
+                return payload
+
+    def stream(self, key, events, timeout):
+        """Yield the ('chunk', text) ... ('done', result) events of events(), shared by key"""
+        if key is None:
+            yield from events()
+            return
+
+        flight, leader = self.join(key)
+        if not leader:
+            yield from self.follow(key, flight, timeout)
+            return
+
+        source = events()
+        landed = False
+        try:
+            for kind, payload in source:
+                if kind == 'chunk':
+                    flight.publish(payload)
+                else:
+                    landed = True
+                    self.land(key, flight, result=payload)
+                yield kind, payload
+        except Exception as e:
+            if not landed:
+                landed = True
+                self.land(key, flight, error=e)
+            raise
+        finally:
+            # The caller stopped listening: finish the work for the followers still waiting
+            if not landed and not self.leave(key, flight):
+                threading.Thread(target=self.drain, args=(key, flight, source), daemon=True).start()
+
+    def drain(self, key, flight, source):
+        """Run the rest of a flight whose leader went away and land its result"""
+        try:
+            for kind, payload in source:
+                if kind == 'chunk':
+                    flight.publish(payload)
+                else:
+                    self.land(key, flight, result=payload)
+                    return
+            self.land(key, flight, error=RuntimeError('Analysis ended without a result'))
+        except Exception as e:
+            self.land(key, flight, error=e)
+
+    def follow(self, key, flight, timeout):
+        """Replay a flight's events in the calling thread"""
+        events = flight.subscribe()
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    kind, payload = events.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    raise FutureTimeout()
+                if kind == 'error':
+                    raise payload
+                yield kind, payload
+                if kind == 'done':
+                    return
+        finally:
+            self.leave(key, flight)
+
+
+class AsyncSingleFlight(SingleFlight):
+    """Coalesces concurrent coroutines with the same key on one event loop
+
+    The leader runs the work in its own task and follows it like everyone
+    else, so the task outlives a leader whose client went away.
+    """
+
+    make_queue = asyncio.Queue
+
+    def __init__(self):
+        super().__init__()
+        self._tasks = {}  # flight -> task running it
+
+    async def run(self, key, func, timeout):
+        """Await func()'s result, shared with concurrent calls for the same key"""
+        async def events():
+            yield 'done', await func()
+
+        async for kind, payload in self.stream(key, events, timeout):
+            if kind == 'done':
+                return payload
+
+    async def stream(self, key, events, timeout):
+        """Async version of SingleFlight.stream; events() is an async generator"""
+        if key is None:
+            async for event in events():
+                yield event
+            return
+
+        flight, leader = self.join(key)
+        if leader:
+            task = asyncio.create_task(self.fly(key, flight, events))
+            self._tasks[flight] = task
+            task.add_done_callback(lambda _: self._tasks.pop(flight, None))
+        async for event in self.follow(key, flight, timeout):
+            yield event
+
+    async def fly(self, key, flight, events):
+        """Run a flight's events and land its result"""
+        try:
+            async for kind, payload in events():
+                if kind == 'chunk':
+                    flight.publish(payload)
+                else:
+                    self.land(key, flight, result=payload)
+                    return
+            self.land(key, flight, error=RuntimeError('Analysis ended without a result'))
+        except Exception as e:
+            self.land(key, flight, error=e)
+
+    def leave(self, key, flight):
+        cancelled = super().leave(key, flight)
+        if cancelled and flight in self._tasks:
+            self._tasks[flight].cancel()
+        return cancelled
+
+    async def follow(self, key, flight, timeout):
+        """Replay a flight's events without blocking the loop"""
+        events = flight.subscribe()
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                kind, payload = await asyncio.wait_for(events.get(), max(deadline - time.monotonic(), 0))
+                if kind == 'error':
+                    raise payload
+                yield kind, payload
+                if kind == 'done':
+                    return
+        finally:
+            self.leave(key, flight)
@@ -0,0 +1,342 @@
+"""
+Out-of-core Datasets
+Selections of data files too large to load are read a chunk at a time. A single
+pass computes everything the prompts use: running count, mean, variance, min and
+max per numeric column, quantiles from a uniform sample, value counts, date
+ranges, the sample rows and the aggregate cube, without building the full table
+"""
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import STREAM_THRESHOLD_MB, STREAM_CHUNK_ROWS
+from scripts.ingest import ingest, is_text_column, parse_formatted_numbers, downcast_numeric
+from scripts.sidecar import read_metadata, write_metadata
+from scripts.context import MAX_SUMMARY_VALUES, SAMPLE_SEED, stratified_sample
+from scripts.aggregates import (MAX_DIMENSION_VALUES, classify_columns, cube_frame, cube_keys, cube_measures, regroup,
+                                make_cube)
+from scripts.combine import common_dtype
+
+# Numeric rows kept for quantiles; quantiles are exact for datasets up to this size
+QUANTILE_SAMPLE_ROWS = 100000
+PERCENTILES = [0.25, 0.5, 0.75]
+
+
+def is_large(file_paths):
+    """Whether a selection's CSV files together exceed STREAM_THRESHOLD_MB"""
+    if STREAM_THRESHOLD_MB <= 0:
+        return False
+    total = sum(os.path.getsize(p) for p in file_paths if p.endswith('.csv') and os.path.exists(p))
+    return total > STREAM_THRESHOLD_MB * 1024 * 1024
+
+
+def read_raw_chunks(file_path, chunk_rows, columns=None):
+    """Untyped chunks of one file; Excel files come back as a single chunk"""
+    if file_path.endswith('.csv'):
+        with pd.read_csv(file_path, chunksize=chunk_rows, usecols=columns) as reader:
+            yield from reader
+    elif file_path.endswith(('.xlsx', '.xls')):
+        yield pd.read_excel(file_path, usecols=columns)
+
+
+def column_kinds(df, date_formats):
+    """Map each column of a typed chunk to ('number',), ('date', format), ('text',) or ('other',)"""
+    kinds = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            kinds[column] = ('date', date_formats.get(column))
+        elif pd.api.types.is_bool_dtype(series):
+            kinds[column] = ('other',)
+        elif pd.api.types.is_numeric_dtype(series):
+            kinds[column] = ('number',)
+        elif isinstance(series.dtype, pd.CategoricalDtype) or is_text_column(series):
+            kinds[column] = ('text',)
+        else:
+            kinds[column] = ('other',)
+    return kinds
+
+
+def conform(chunk, kinds):
+    """Give a later chunk the columns and column types inferred from the first one"""
+    chunk = chunk.reindex(columns=list(kinds))
+    converted = {}
+    for column, kind in kinds.items():
+        series = chunk[column]
+        if kind[0] == 'number':
+            if not pd.api.types.is_numeric_dtype(series):
+                numbers = parse_formatted_numbers(series) if is_text_column(series) else None
+                series = numbers if numbers is not None else pd.to_numeric(series, errors='coerce')
+            converted[column] = downcast_numeric(series)
+        elif kind[0] == 'date' and not pd.api.types.is_datetime64_any_dtype(series):
+            text = series.astype('str').str.strip().where(series.notna())
+            converted[column] = pd.to_datetime(text, format=kind[1], errors='coerce')
+        elif kind[0] == 'text' and not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            converted[column] = series.astype('str').where(series.notna())
+    return chunk.assign(**converted) if converted else chunk
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of numeric columns, merged chunk by chunk"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        n = len(columns)
+        self.count = np.zeros(n)
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)  # sum of squared deviations from the mean
+        self.min = np.full(n, np.nan)
+        self.max = np.full(n, np.nan)
+
+    def add(self, values):
+        """Merge a 2-D float array (rows x columns, NaN for missing) into the totals"""
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        has = count > 0
+        if not has.any():
+            return
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(has, np.nansum(values, axis=0) / count, 0.0)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+            total = self.count + count
+            delta = mean - self.mean
+            # Chan et al. pairwise update of mean and squared deviations
+            self.mean = np.where(has, self.mean + delta * count / total, self.mean)
+            self.m2 = np.where(has, self.m2 + m2 + delta ** 2 * self.count * count / total, self.m2)
+        self.count = total
+        self.min = np.where(has, np.fmin(self.min, np.where(present, values, np.inf).min(axis=0)), self.min)
+        self.max = np.where(has, np.fmax(self.max, np.where(present, values, -np.inf).max(axis=0)), self.max)
+
+    def describe(self, quantiles):
+        """Statistics laid out like DataFrame.describe(), quantiles taken from a sample"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(self.m2 / (self.count - 1))
+        empty = self.count == 0
+        rows = {
+            'count': self.count,
+            'mean': np.where(empty, np.nan, self.mean),
+            'std': np.where(self.count > 1, std, np.nan),
+            'min': np.where(empty, np.nan, self.min),
+        }
+        for q in PERCENTILES:
+            rows[f"{q:.0%}"] = quantiles.loc[q].to_numpy(dtype='float64')
+        rows['max'] = np.where(empty, np.nan, self.max)
+        return pd.DataFrame(rows, index=self.columns).T
+
+
+class Reservoir:
+    """Uniform random sample of up to size rows, kept as the rows with the smallest random keys"""
+
+    def __init__(self, size, seed=SAMPLE_SEED):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.frame = None
+        self.keys = None
+
+    def add(self, frame):
+        keys = self.rng.random(len(frame))
+        if self.frame is not None:
+            if len(self.frame) >= self.size:
+                keep = keys < self.keys.max()
+                frame, keys = frame[keep], keys[keep]
+            frame = pd.concat([self.frame, frame])
+            keys = np.concatenate([self.keys, keys])
+        if len(frame) > self.size:
+            smallest = np.argpartition(keys, self.size - 1)[:self.size]
+            frame, keys = frame.iloc[smallest], keys[smallest]
+        self.frame, self.keys = frame, keys
+
+    def rows(self):
+        """The sampled rows in their original order"""
+        return self.frame.sort_index() if self.frame is not None else pd.DataFrame()
+
+
+class StreamProfile:
+    """Accumulates the data context profile (see context.profile_frame) over chunks"""
+
+    def __init__(self, kinds, max_rows):
+        self.kinds = kinds
+        self.numeric = [c for c, kind in kinds.items() if kind[0] == 'number']
+        self.text = [c for c, kind in kinds.items() if kind[0] == 'text']
+        self.dates = [c for c, kind in kinds.items() if kind[0] == 'date']
+        self.rows = 0
+        self.dtypes = {}
+        self.stats = RunningStats(self.numeric)
+        self.quantile_sample = Reservoir(QUANTILE_SAMPLE_ROWS)
+        self.row_sample = Reservoir(max_rows)
+        self.counts = {column: pd.Series(dtype='int64') for column in self.text}
+        self.high_cardinality = set()  # text columns with more than MAX_DIMENSION_VALUES values
+        self.date_ranges = {}
+        self.first_rows = {column: {} for column in self.text}  # column -> value -> row position
+        self.first_frames = []
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        for column in chunk.columns:
+            dtype = chunk[column].dtype
+            if column in self.dtypes and dtype != self.dtypes[column]:
+                dtype = common_dtype([self.dtypes[column], dtype], False)
+                dtype = pd.CategoricalDtype() if dtype == 'category' else dtype
+            self.dtypes[column] = dtype
+
+        if self.numeric:
+            values = chunk[self.numeric].to_numpy(dtype='float64', na_value=np.nan)
+            self.stats.add(values)
+            self.quantile_sample.add(pd.DataFrame(values, columns=self.numeric, index=chunk.index))
+        self.row_sample.add(chunk)
+
+        for column in self.dates:
+            series = chunk[column].dropna()
+            if not series.empty:
+                first, last = series.min(), series.max()
+                if column in self.date_ranges:
+                    first = min(first, self.date_ranges[column][0])
+                    last = max(last, self.date_ranges[column][1])
+                self.date_ranges[column] = (first, last)
+
+        for column in self.text:
+            if column in self.high_cardinality:
+                continue
+            counts = chunk[column].value_counts()
+            counts = self.counts[column].add(counts[counts > 0], fill_value=0)
+            if len(counts) > MAX_DIMENSION_VALUES:
+                self.high_cardinality.add(column)
+                self.counts[column] = None
+                self.first_rows[column] = None
+                continue
+            self.counts[column] = counts
+            self._track_first_rows(chunk, column)
+
+    def _track_first_rows(self, chunk, column):
+        """Remember the first row of each value while the column could still be a stratum"""
+        seen = self.first_rows[column]
+        if seen is None:
+            return
+        if len(self.counts[column]) > MAX_SUMMARY_VALUES:
+            self.first_rows[column] = None
+            return
+        firsts = chunk[column].drop_duplicates()
+        new = firsts[[value not in seen for value in firsts.astype(object)]]
+        if len(new):
+            for position, value in new.astype(object).items():
+                seen[value] = position
+            self.first_frames.append(chunk.loc[new.index])
+
+    def result(self):
+        """The profile dict render_context expects"""
+        counts = {c: self.counts[c].astype('int64').sort_values(ascending=False, kind='stable')
+                  for c in self.text if self.counts[c] is not None}
+        # Fewest values first, ties in column order, as context.category_columns does
+        strata = sorted((c for c in self.text if c in counts and 1 < len(counts[c]) <= MAX_SUMMARY_VALUES),
+                        key=lambda c: len(counts[c]))
+
+        # Sample from the first row of every stratum value plus the random rows
+        positions = {p for c in strata for p in self.first_rows[c].values()}
+        candidates = [f[f.index.isin(positions)] for f in self.first_frames] + [self.row_sample.rows()]
+        candidates = pd.concat([f for f in candidates if len(f)])
+        candidates = candidates[~candidates.index.duplicated()].sort_index()
+
+        numeric = None
+        if self.numeric:
+            quantiles = self.quantile_sample.rows().quantile(PERCENTILES)
+            numeric = self.stats.describe(quantiles)
+        return {
+            'rows': self.rows,
+            'dtypes': pd.Series(self.dtypes, dtype=object),
+            'numeric': numeric,
+            'dates': [(c, *self.date_ranges[c]) for c in self.dates if c in self.date_ranges],
+            'counts': {c: counts[c] for c in strata},
+            'strata': strata,
+            'sample': stratified_sample(candidates, self.row_sample.size, strata),
+        }
+
+
+class CubeBuilder:
+    """Accumulates the aggregate cube (see aggregates.build_cube) over chunks
+
+    Dimensions are chosen from the first chunk and dropped again if a later
+    chunk pushes them past MAX_DIMENSION_VALUES; partial sums are regrouped
+    after every chunk, so memory stays bounded by the cube's size.
+    """
+
+    def __init__(self, first_chunk):
+        self.dimensions, self.date_column, self.sums, self.averages = classify_columns(first_chunk)
+        self.measures = cube_measures(self.sums, self.averages)
+        self.frame = None
+
+    def add(self, chunk, high_cardinality):
+        dropped = [d for d in self.dimensions if d in high_cardinality]
+        if dropped:
+            self.dimensions = [d for d in self.dimensions if d not in dropped]
+            if self.frame is not None:
+                keys = cube_keys(self.dimensions, self.date_column)
+                self.frame = regroup(self.frame.drop(columns=dropped), keys, self.measures)
+
+        part = cube_frame(chunk, self.dimensions, self.date_column, self.sums, self.averages)
+        if self.frame is not None:
+            keys = cube_keys(self.dimensions, self.date_column)
+            part = regroup(pd.concat([self.frame, part], ignore_index=True), keys, self.measures)
+        self.frame = part
+
+    def result(self):
+        return make_cube(self.frame, self.dimensions, self.date_column, self.sums, self.averages)
+
+
+class ChunkedDataset:
+    """A selection of data files read a chunk at a time instead of loaded whole
+
+    load_data returns one in place of a DataFrame for selections larger than
+    STREAM_THRESHOLD_MB. get_data_context and aggregate_context accept it and
+    make one pass over the files. Column names and types follow the first chunk.
+    """
+
+    def __init__(self, file_paths, columns=None, chunk_rows=STREAM_CHUNK_ROWS):
+        self.file_paths = list(file_paths)
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self._scans = {}  # max_rows -> (profile, cube)
+
+    def chunks(self):
+        """Typed chunks of every file, indexed by row position across the selection"""
+        kinds = None
+        start = 0
+        for file_path in self.file_paths:
+            for chunk in read_raw_chunks(file_path, self.chunk_rows, self.columns):
+                if kinds is None:
+                    metadata = read_metadata(file_path)
+                    chunk, report = ingest(chunk, metadata.get("date_formats"))
+                    if report["date_formats"] != metadata.get("date_formats"):
+                        write_metadata(file_path, {**metadata, "date_formats": report["date_formats"]})
+                    kinds = column_kinds(chunk, report["date_formats"])
+                else:
+                    chunk = conform(chunk, kinds)
+                chunk.index = pd.RangeIndex(start, start + len(chunk))
+                start += len(chunk)
+                yield kinds, chunk
+
+    def scan(self, max_rows=50):
+        """One pass over the files; returns (context profile, aggregate cube)"""
+        if max_rows not in self._scans:
+            profile = cube = None
+            for kinds, chunk in self.chunks():
+                if profile is None:
+                    profile = StreamProfile(kinds, max_rows)
+                    cube = CubeBuilder(chunk)
+                profile.add(chunk)
+                cube.add(chunk, profile.high_cardinality)
+            if profile is None:
+                raise ValueError("No data in the selected files")
+            self._scans[max_rows] = (profile.result(), cube.result())
+        return self._scans[max_rows]
+
+    def profile(self, max_rows=50):
+        """Profile for context.render_context"""
+        return self.scan(max_rows)[0]
+
+    def cube(self):
+        """Aggregate cube, reusing an earlier scan if there was one"""
+        max_rows = next(iter(self._scans), 50)
+        return self.scan(max_rows)[1]
@@ -7,16 +7,17 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scripts.utils import load_data, get_data_context, call_ai, format_output, error_output
+from scripts.utils import load_data, get_data_context, ai_request, complete_request, error_output, to_json
+from scripts.fingerprint import dataset_fingerprint
 
 
-def run_summary_analysis(file_paths):
-    """Generate AI-powered summary analysis"""
+def prepare_summary_analysis(file_paths):
+    """Build the model request for a dataset summary, or None if the data cannot be loaded"""
     df = load_data(file_paths)
     if df is None:
-        return error_output("Could not load data files")
+        return None
 
-    context = get_data_context(df)
+    context = get_data_context(df, fingerprint=dataset_fingerprint(file_paths))
 
     prompt = f"""Analyze this dataset and provide a comprehensive summary:
 
@@ -33,14 +34,21 @@ Format your response in clear markdown with headers and bullet points."""
 
     system_message = "You are a data analyst expert. Provide clear, actionable insights from data. Use markdown formatting."
 
-    result = call_ai(prompt, system_message)
-    return format_output(result, "Data Summary")
+    return ai_request(prompt, system_message, "Data Summary")
+
+
+def run_summary_analysis(file_paths):
+    """Generate AI-powered summary analysis"""
+    request = prepare_summary_analysis(file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    return complete_request(request)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print(error_output("Please provide at least one data file path"))
+        print(to_json(error_output("Please provide at least one data file path")))
         sys.exit(1)
 
     file_paths = sys.argv[1:]
-    print(run_summary_analysis(file_paths))
+    print(to_json(run_summary_analysis(file_paths)))
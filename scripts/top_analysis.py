@@ -7,16 +7,20 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scripts.utils import load_data, get_data_context, call_ai, format_output, error_output
+from scripts.utils import load_data, get_data_context, ai_request, complete_request, error_output, to_json
+from scripts.fingerprint import dataset_fingerprint
+from scripts.aggregates import aggregate_context
 
 
-def run_top_analysis(query, file_paths):
-    """Find top performers using AI analysis"""
+def prepare_top_analysis(query, file_paths):
+    """Build the model request for a top performers analysis, or None if the data cannot be loaded"""
     df = load_data(file_paths)
     if df is None:
-        return error_output("Could not load data files")
+        return None
 
-    context = get_data_context(df)
+    fingerprint = dataset_fingerprint(file_paths)
+    context = get_data_context(df, fingerprint=fingerprint)
+    aggregates = aggregate_context(df, fingerprint, 'top')
 
     prompt = f"""Based on this dataset, answer the user's query about top performers:
 
@@ -25,6 +29,9 @@ USER QUERY: {query}
 DATASET:
 {context}
 
+EXACT AGGREGATES (computed over all rows, use these for totals and rankings):
+{aggregates}
+
 Please provide:
 1. **Top Performers**: List the top items/categories based on the query
 2. **Rankings**: Show rankings with actual values and percentages
@@ -36,15 +43,22 @@ Use actual numbers from the data. Format with markdown tables where appropriate.
 
     system_message = "You are a data analyst expert. When asked about 'top' or 'best', analyze the data to find and rank the highest performers. Always use actual numbers from the data."
 
-    result = call_ai(prompt, system_message)
-    return format_output(result, "Top Performers Analysis")
+    return ai_request(prompt, system_message, "Top Performers Analysis", query=query, scope=f"top:{fingerprint}")
+
+
+def run_top_analysis(query, file_paths):
+    """Find top performers using AI analysis"""
+    request = prepare_top_analysis(query, file_paths)
+    if request is None:
+        return error_output("Could not load data files")
+    return complete_request(request)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print(error_output("Usage: python top_analysis.py <query> <file1> [file2] ..."))
+        print(to_json(error_output("Usage: python top_analysis.py <query> <file1> [file2] ...")))
         sys.exit(1)
 
     query = sys.argv[1]
     file_paths = sys.argv[2:]
-    print(run_top_analysis(query, file_paths))
+    print(to_json(run_top_analysis(query, file_paths)))
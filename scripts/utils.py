@@ -6,50 +6,260 @@ import requests
 import json
 import sys
 import os
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path for config import
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import API_KEY, API_BASE_URL, MODEL, MAX_TOKENS
+from config import (API_KEY, API_BASE_URL, MODEL, MAX_TOKENS, DATA_CACHE_MB, LOAD_WORKERS, ANALYSIS_TIMEOUT,
+                    CACHE_DIR, CONTEXT_CACHE_SIZE, CONTEXT_CACHE_DISK, CONTEXT_TOKEN_BUDGET,
+                    LLM_CACHE_ENABLED, LLM_CACHE_REFRESH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MEMORY_ENTRIES,
+                    SIMILAR_CACHE_ENABLED, SIMILAR_CACHE_THRESHOLD)
+from scripts import http_client
+from scripts.file_store import object_hash
+from scripts.single_flight import SingleFlight
+from scripts.sidecar import read_sidecar, write_sidecar, read_metadata, write_metadata
+from scripts.ingest import ingest
+from scripts.combine import combine_frames
+from scripts.context import build_data_context, render_context
+from scripts.streaming import ChunkedDataset, is_large
+from scripts.response_cache import ResponseCache, response_key
+from scripts.similar_cache import SimilarQueryCache
 
 
-def load_data(file_paths):
-    """Load and combine data from multiple files"""
-    dataframes = []
-    for file_path in file_paths:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        elif file_path.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file_path)
+class DataFrameCache:
+    """Process-wide LRU cache of parsed files, bounded by DataFrame memory usage
+
+    Entries are keyed by (path, size, mtime) so an edited or replaced file is
+    parsed again; stored uploads are keyed by their content hash alone. Cached
+    frames are shared between callers and must not be modified in place, and
+    callers missing on the same file at the same time share one parse.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (df, nbytes)
+        self._lock = threading.Lock()
+        self._loads = SingleFlight()
+
+    def get(self, file_path, loader, columns=None):
+        """Return the parsed file, calling loader(file_path, columns) on a miss"""
+        selected = tuple(columns) if columns is not None else None
+        stored = object_hash(file_path)
+        if stored is not None:
+            key = (stored, selected)
         else:
-            continue
-        dataframes.append(df)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return loader(file_path, columns)
+            key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, selected)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        return self._loads.run(key, lambda: self._load(key, file_path, loader, columns), ANALYSIS_TIMEOUT)
+
+    def _load(self, key, file_path, loader, columns):
+        df = loader(file_path, columns)
+        if df is not None:
+            self.put(key, df)
+        return df
+
+    def put(self, key, df):
+        """Store a frame, evicting least recently used entries to fit the budget"""
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.budget_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.used_bytes -= self._entries.pop(key)[1]
+            while self._entries and self.used_bytes + nbytes > self.budget_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted_bytes
+                self.evictions += 1
+            self._entries[key] = (df, nbytes)
+            self.used_bytes += nbytes
+
+    def clear(self):
+        """Drop every cached frame"""
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+    def stats(self):
+        """Counters for sizing the cache"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "used_bytes": self.used_bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+data_cache = DataFrameCache(DATA_CACHE_MB * 1024 * 1024)
+
+# Ingest reports (type conversions, memory saved) for files parsed by this process
+ingest_reports = {}
+
+# Callback receiving streamed answer chunks for analyses run in this context
+stream_sink = contextvars.ContextVar('stream_sink', default=None)
+
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, 'llm_responses.sqlite3')
+response_cache = ResponseCache(LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MEMORY_ENTRIES)
+similar_cache = SimilarQueryCache(LLM_CACHE_PATH, LLM_CACHE_TTL, SIMILAR_CACHE_THRESHOLD)
+
+
+def read_file(file_path):
+    """Parse a single CSV or Excel file, or return None for other file types"""
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path)
+    if file_path.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(file_path)
+    return None
+
+
+def load_file(file_path, columns=None):
+    """Load one typed data file, preferring its columnar sidecar copy when up to date"""
+    df = read_sidecar(file_path, columns)
+    if df is not None:
+        return df
+    df = read_file(file_path)
+    if df is None:
+        return None
+    metadata = read_metadata(file_path)
+    df, report = ingest(df, metadata.get("date_formats"))
+    ingest_reports[os.path.abspath(file_path)] = report
+    if report["date_formats"] != metadata.get("date_formats"):
+        write_metadata(file_path, {**metadata, "date_formats": report["date_formats"]})
+    write_sidecar(file_path, df)
+    return df[columns] if columns is not None else df
+
+
+_load_executor = None
+_load_executor_lock = threading.Lock()
+
+
+def get_load_executor():
+    """Return the thread pool that reads files in parallel, creating it on first use"""
+    global _load_executor
+    with _load_executor_lock:
+        if _load_executor is None:
+            _load_executor = ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix='load')
+        return _load_executor
+
+
+def load_data(file_paths, columns=None):
+    """Load and combine data from multiple files, optionally only some columns
+
+    Files are read in parallel (the pandas parsers release the GIL) and stacked
+    with matching column dtypes. Selections too large to hold in memory come
+    back as a ChunkedDataset, which the context and aggregate builders read in
+    one pass.
+    """
+    if is_large(file_paths):
+        return ChunkedDataset(file_paths, columns)
+    if len(file_paths) > 1:
+        loaded = get_load_executor().map(lambda path: data_cache.get(path, load_file, columns), file_paths)
+    else:
+        loaded = [data_cache.get(path, load_file, columns) for path in file_paths]
+    dataframes = [df for df in loaded if df is not None]
 
     if not dataframes:
         return None
 
     # Combine all dataframes
-    combined = pd.concat(dataframes, ignore_index=True) if len(dataframes) > 1 else dataframes[0]
+    combined = combine_frames(dataframes) if len(dataframes) > 1 else dataframes[0]
     return combined
 
 
-def get_data_context(df, max_rows=50):
-    """Generate a context string describing the data"""
-    context = f"Dataset has {len(df)} rows and {len(df.columns)} columns.\n\n"
-    context += f"Columns: {', '.join(df.columns.tolist())}\n\n"
-    context += f"Data types:\n{df.dtypes.to_string()}\n\n"
-    context += f"Sample data (first {min(max_rows, len(df))} rows):\n"
-    context += df.head(max_rows).to_string()
+# Bump when get_data_context output changes so stored contexts are rebuilt
+CONTEXT_VERSION = 2
+CONTEXT_CACHE_FOLDER = os.path.join(CACHE_DIR, 'context')
+
+_contexts = OrderedDict()  # (fingerprint, max_rows) -> context string
+_contexts_lock = threading.Lock()
+
+
+def _context_file(key):
+    fingerprint, max_rows, token_budget = key
+    return os.path.join(CONTEXT_CACHE_FOLDER,
+                        f"{fingerprint}-{max_rows}-{token_budget}-v{CONTEXT_VERSION}.txt")
 
-    # Add basic statistics for numeric columns
-    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-    if numeric_cols:
-        context += f"\n\nNumeric column statistics:\n{df[numeric_cols].describe().to_string()}"
 
-    return context
+def _cached_context(key):
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is not None:
+            _contexts.move_to_end(key)
+            return context
+    if CONTEXT_CACHE_DISK:
+        try:
+            with open(_context_file(key), encoding='utf-8') as f:
+                context = f.read()
+        except OSError:
+            return None
+        _store_context(key, context, write_disk=False)
+        return context
+    return None
 
 
-def call_ai(prompt, system_message=None):
-    """Make API call to get AI response"""
+def _store_context(key, context, write_disk=True):
+    with _contexts_lock:
+        _contexts[key] = context
+        _contexts.move_to_end(key)
+        while len(_contexts) > CONTEXT_CACHE_SIZE:
+            _contexts.popitem(last=False)
+    if write_disk and CONTEXT_CACHE_DISK:
+        path = _context_file(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(CONTEXT_CACHE_FOLDER, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(context)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+
+def get_data_context(df, max_rows=50, fingerprint=None, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Generate a context string describing the data
+
+    When the dataset fingerprint is given the string is memoized per
+    (fingerprint, max_rows, token_budget), in memory and optionally on disk.
+    """
+    if fingerprint is not None:
+        key = (fingerprint, max_rows, token_budget)
+        context = _cached_context(key)
+        if context is None:
+            context = _build_context(df, max_rows, token_budget)
+            _store_context(key, context)
+        return context
+    return _build_context(df, max_rows, token_budget)
+
+
+def _build_context(df, max_rows, token_budget):
+    if isinstance(df, ChunkedDataset):
+        return render_context(df.profile(max_rows), token_budget)
+    return build_data_context(df, max_rows, token_budget)
+
+
+def build_ai_request(prompt, system_message=None, stream=False):
+    """Headers and payload for the AI API"""
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {API_KEY}"
@@ -65,43 +275,209 @@ def call_ai(prompt, system_message=None):
         "max_tokens": MAX_TOKENS,
         "messages": messages
     }
+    if stream:
+        payload["stream"] = True
+    return headers, payload
+
+
+def parse_ai_response(result):
+    """Extract the answer from a complete response; returns (text, success)"""
+    # OpenAI format response
+    if "choices" in result and len(result["choices"]) > 0:
+        content = result["choices"][0].get("message", {}).get("content")
+        return (content, True) if content else ("No response generated", False)
+    # Anthropic format response
+    if "content" in result and len(result["content"]) > 0:
+        text = result["content"][0].get("text")
+        return (text, True) if text else ("No response generated", False)
+    return "No response generated", False
+
+
+def parse_ai_chunk(event):
+    """Extract the text delta from one streamed event, or an empty string"""
+    # OpenAI format chunk
+    if event.get("choices"):
+        return event["choices"][0].get("delta", {}).get("content") or ""
+    # Anthropic format chunk
+    if event.get("type") == "content_block_delta":
+        return event.get("delta", {}).get("text") or ""
+    return ""
+
+
+def request_ai(prompt, system_message=None):
+    """Make API call to get AI response; returns (text, success)"""
+    headers, payload = build_ai_request(prompt, system_message)
 
     try:
-        response = requests.post(
+        response = http_client.post(
             API_BASE_URL,
             headers=headers,
             json=payload,
             timeout=120
         )
         response.raise_for_status()
-        result = response.json()
+        return parse_ai_response(response.json())
+
+    except requests.exceptions.RequestException as e:
+        return f"API Error: {str(e)}", False
+
+
+def stream_request_ai(prompt, system_message, on_chunk):
+    """Make a streaming API call, passing each text chunk to on_chunk as it arrives
 
-        # OpenAI format response
-        if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0].get("message", {}).get("content", "No response generated")
-        # Anthropic format response
-        if "content" in result and len(result["content"]) > 0:
-            return result["content"][0].get("text", "No response generated")
-        return "No response generated"
+    Returns (full text, success) once the stream ends.
+    """
+    headers, payload = build_ai_request(prompt, system_message, stream=True)
+
+    try:
+        with http_client.post(API_BASE_URL, headers=headers, json=payload, timeout=120, stream=True) as response:
+            response.raise_for_status()
+            if "text/event-stream" not in response.headers.get("Content-Type", ""):
+                # Upstream answered in one piece
+                text, success = parse_ai_response(response.json())
+                if success:
+                    on_chunk(text)
+                return text, success
+
+            response.encoding = "utf-8"
+            parts = []
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = parse_ai_chunk(json.loads(data))
+                except ValueError:
+                    continue
+                if chunk:
+                    parts.append(chunk)
+                    on_chunk(chunk)
+
+        text = "".join(parts)
+        return (text, True) if text else ("No response generated", False)
 
     except requests.exceptions.RequestException as e:
-        return f"API Error: {str(e)}"
+        return f"API Error: {str(e)}", False
+
+
+def cached_answer(prompt, system_message=None, query=None, scope=None):
+    """Look up an earlier answer to this exact request, or to a similar query in scope"""
+    cached = response_cache.get(response_key(MODEL, MAX_TOKENS, system_message, prompt))
+    if cached is None and SIMILAR_CACHE_ENABLED and query and scope:
+        cached = similar_cache.get(scope, query)
+    return cached
+
+
+def store_answer(text, prompt, system_message=None, query=None, scope=None):
+    """Remember a successful answer for cached_answer"""
+    response_cache.put(response_key(MODEL, MAX_TOKENS, system_message, prompt), text)
+    if SIMILAR_CACHE_ENABLED and query and scope:
+        similar_cache.put(scope, query, text)
+
+
+def call_ai(prompt, system_message=None, use_cache=LLM_CACHE_ENABLED, refresh=LLM_CACHE_REFRESH,
+            query=None, scope=None, on_chunk=None):
+    """Get AI response, reusing a cached answer to an identical request
+
+    When the user's query and a scope (analysis type + dataset fingerprint) are
+    given, an answer to a similarly worded query in the same scope is reused too.
+    use_cache=False bypasses the caches entirely; refresh=True skips the lookup
+    but stores the new answer. Errors are never cached.
+
+    If on_chunk is given (or a stream_sink is set for the current context) the
+    answer is streamed and each piece passed to it; the full text is still returned.
+    """
+    on_chunk = on_chunk or stream_sink.get()
+    if use_cache and not refresh:
+        cached = cached_answer(prompt, system_message, query, scope)
+        if cached is not None:
+            if on_chunk:
+                on_chunk(cached)
+            return cached
+
+    if on_chunk:
+        text, success = stream_request_ai(prompt, system_message, on_chunk)
+    else:
+        text, success = request_ai(prompt, system_message)
+    if use_cache and success:
+        store_answer(text, prompt, system_message, query, scope)
+    return text
+
+
+def ai_request(prompt, system_message, title, query=None, scope=None, answer=None):
+    """Describe a model call prepared by an analysis script
+
+    answer is text computed without the model; with no prompt it is the whole result.
+    """
+    return {
+        "prompt": prompt,
+        "system_message": system_message,
+        "title": title,
+        "query": query,
+        "scope": scope,
+        "answer": answer
+    }
+
+
+def complete_request(request, on_chunk=None, use_cache=LLM_CACHE_ENABLED, refresh=LLM_CACHE_REFRESH):
+    """Make a prepared model call and format its output for the UI"""
+    answer = request.get("answer")
+    if answer is not None:
+        on_chunk = on_chunk or stream_sink.get()
+        if request["prompt"] is None:
+            if on_chunk:
+                on_chunk(answer)
+            return format_output(answer, request["title"])
+        if on_chunk:
+            on_chunk(answer + "\n\n")
+
+    result = call_ai(request["prompt"], request["system_message"],
+                     query=request["query"], scope=request["scope"], on_chunk=on_chunk,
+                     use_cache=use_cache, refresh=refresh)
+    if answer is not None:
+        result = answer + "\n\n" + result
+    return format_output(result, request["title"])
 
 
 def format_output(result, title="Analysis Result"):
-    """Format output as JSON for the UI"""
-    output = {
+    """Format output for the UI"""
+    return {
         "success": True,
         "title": title,
         "result": result
     }
-    return json.dumps(output, indent=2)
+
+
+SECTION_SEPARATOR = "\n\n---\n\n"
+
+
+def output_section(output, name):
+    """One analysis of a multi-part answer as a markdown section"""
+    if output.get("success", True):
+        return f"## {output.get('title', name)}\n\n{output.get('result')}"
+    return f"## {name}\n\n{output.get('error', 'Analysis failed')}"
+
+
+def merge_outputs(outputs):
+    """Combine [(name, output dict)] into one output, in order; fails only if every part failed"""
+    succeeded = [output for _, output in outputs if output.get("success", True)]
+    if not succeeded:
+        return error_output("; ".join(output.get("error", "Analysis failed") for _, output in outputs))
+    result = SECTION_SEPARATOR.join(output_section(output, name) for name, output in outputs)
+    title = "Combined Analysis: " + ", ".join(output.get("title", "Analysis") for output in succeeded)
+    return format_output(result, title)
 
 
 def error_output(message):
-    """Format error output as JSON"""
-    output = {
+    """Format error output for the UI"""
+    return {
         "success": False,
         "error": message
     }
+
+
+def to_json(output):
+    """Serialize an output dict as JSON for command-line use"""
     return json.dumps(output, indent=2)
@@ -0,0 +1,267 @@
+"""
+Dense Document Search
+Embeds the knowledge-base documents (rag_data.json) offline, without a model:
+every word maps to a fixed pseudo-random vector derived from its hash, and a
+document is the tf-weighted sum of its words' vectors (a random projection of
+its hashed bag of words), normalized to unit length. The vectors are one
+float32 .npy matrix, memory-mapped on load; documents added to the end of the
+source file are appended in place instead of rebuilding the matrix. Processes
+sharing the index folder take a file lock to open, append to or rebuild it.
+"""
+import io
+import os
+import sys
+import json
+import hashlib
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import numpy.lib.format as npy_format
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import CACHE_DIR, RAG_DATA_PATH
+from scripts.search_index import tokenize, document_tokens, read_documents, document_result
+
+INDEX_VERSION = 1
+INDEX_DIR = os.path.join(CACHE_DIR, 'vector_index')
+VECTOR_DIM = 256
+# Documents scored per matrix multiply, bounding the score matrix for large batches
+SEARCH_BLOCK_ROWS = 262144
+
+
+@lru_cache(maxsize=131072)
+def word_vector(word):
+    """The fixed pseudo-random direction of a word"""
+    seed = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'little')
+    return np.random.default_rng(seed).standard_normal(VECTOR_DIM, dtype=np.float32)
+
+
+def embed_tokens(tokens):
+    """Unit-length vector of a bag of words (1 + log tf weighting)"""
+    counts = Counter(tokens)
+    if not counts:
+        return np.zeros(VECTOR_DIM, dtype=np.float32)
+    weights = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    vector = weights @ np.stack([word_vector(word) for word in counts])
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_documents(documents):
+    """(n, VECTOR_DIM) float32 matrix of document vectors"""
+    matrix = np.zeros((len(documents), VECTOR_DIM), dtype=np.float32)
+    for i, doc in enumerate(documents):
+        matrix[i] = embed_tokens(document_tokens(doc))
+    return matrix
+
+
+def embed_queries(queries, vocabulary=None):
+    """(n, VECTOR_DIM) float32 matrix of query vectors, ignoring words outside vocabulary if given
+
+    A query with no words left is a zero row.
+    """
+    if not queries:
+        return np.zeros((0, VECTOR_DIM), dtype=np.float32)
+    return np.stack([embed_tokens([t for t in tokenize(q) if vocabulary is None or t in vocabulary])
+                     for q in queries])
+
+
+def documents_digest(documents, digest=None):
+    """Running hash of documents in order, extended from a previous digest state"""
+    digest = digest or hashlib.sha256()
+    for doc in documents:
+        digest.update(json.dumps(doc, sort_keys=True).encode())
+    return digest
+
+
+def append_rows(path, rows):
+    """Append rows to a 2-D C-order .npy file in place, updating its header
+
+    np.save leaves room in the header for the row count to grow, so only the
+    new rows are written. The new header is checked to fit before anything is.
+    """
+    with open(path, 'r+b') as f:
+        version = npy_format.read_magic(f)
+        read_header, write_header = ((npy_format.read_array_header_1_0, npy_format.write_array_header_1_0)
+                                     if version == (1, 0) else
+                                     (npy_format.read_array_header_2_0, npy_format.write_array_header_2_0))
+        shape, fortran_order, dtype = read_header(f)
+        data_start = f.tell()
+        if fortran_order or dtype != rows.dtype or shape[1:] != rows.shape[1:]:
+            raise ValueError(f"Cannot append {rows.dtype}{rows.shape} rows to {dtype}{shape} in {path}")
+        header = io.BytesIO()
+        write_header(header, {'descr': npy_format.dtype_to_descr(dtype), 'fortran_order': False,
+                              'shape': (shape[0] + len(rows),) + shape[1:]})
+        if header.tell() != data_start:
+            raise ValueError(f"Header of {path} cannot grow in place")
+        f.seek(data_start + shape[0] * rows.itemsize * int(np.prod(shape[1:])))
+        f.write(np.ascontiguousarray(rows).tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(header.getvalue())
+
+
+@contextmanager
+def folder_lock(folder):
+    """Hold an exclusive lock on an index folder across processes"""
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, '.lock'), 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class VectorIndex:
+    """Unit-length document vectors searched by cosine similarity"""
+
+    def __init__(self, folder, meta, vectors, documents):
+        self.folder = folder
+        self.meta = meta
+        self.vectors = vectors
+        self.documents = documents
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, 'vectors.npy')
+
+    @classmethod
+    def build(cls, folder, documents):
+        """Embed every document and write the matrix"""
+        os.makedirs(folder, exist_ok=True)
+        vectors = embed_documents(documents)
+        tmp_path = os.path.join(folder, f"vectors.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, vectors)
+        os.replace(tmp_path, os.path.join(folder, 'vectors.npy'))
+        meta = {'version': INDEX_VERSION, 'dim': VECTOR_DIM, 'documents': len(documents),
+                'digest': documents_digest(documents).hexdigest()}
+        index = cls(folder, meta, None, documents)
+        index.write_meta()
+        index.vectors = np.load(index.path, mmap_mode='r')
+        return index
+
+    @classmethod
+    def load(cls, folder, documents):
+        """Open a saved index with the matrix memory-mapped, or None if missing"""
+        try:
+            with open(os.path.join(folder, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('version') != INDEX_VERSION or meta.get('dim') != VECTOR_DIM:
+                return None
+            vectors = np.load(os.path.join(folder, 'vectors.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if vectors.shape != (meta['documents'], VECTOR_DIM):
+            return None
+        return cls(folder, meta, vectors, documents)
+
+    def write_meta(self):
+        tmp_path = os.path.join(self.folder, f"meta.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, os.path.join(self.folder, 'meta.json'))
+
+    def append(self, documents, digest):
+        """Embed new documents onto the end of the matrix; digest covers all documents so far"""
+        if documents:
+            append_rows(self.path, embed_documents(documents))
+        self.documents = self.documents + documents
+        self.meta['documents'] += len(documents)
+        self.meta['digest'] = digest.hexdigest()
+        self.write_meta()
+        self.vectors = np.load(self.path, mmap_mode='r')
+
+    def stats(self):
+        return {'documents': self.meta['documents'], 'dim': VECTOR_DIM, 'bytes': int(self.vectors.nbytes)}
+
+    def search(self, queries, k=5, allowed=None, vocabulary=None):
+        """The k most similar [(doc id, cosine)] for each query, best first
+
+        All queries are scored together: one (queries x documents) matrix
+        multiply per block of documents, then argpartition for the top k.
+        allowed, if given, is a boolean mask of documents that may be returned.
+        Words outside vocabulary (the corpus' terms) are ignored, and a query
+        left with no words has no direction and matches nothing, as in BM25.
+        """
+        count = len(self.vectors)
+        k = min(k, count)
+        if k == 0:
+            return [[] for _ in queries]
+        q = embed_queries(queries, vocabulary)
+        best_ids = np.empty((len(q), 0), dtype=np.int64)
+        best_scores = np.empty((len(q), 0), dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            scores = q @ self.vectors[start:start + SEARCH_BLOCK_ROWS].T
+            if allowed is not None:
+                scores[:, ~allowed[start:start + SEARCH_BLOCK_ROWS]] = -np.inf
+            ids = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+            best_ids = np.concatenate([best_ids, ids + start], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, ids, axis=1)], axis=1)
+        order = np.argsort(-best_scores, axis=1, kind='stable')[:, :k]
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        known = q.any(axis=1)
+        return [[(int(d), float(s)) for d, s in zip(ids, scores) if s > -np.inf] if has_words else []
+                for ids, scores, has_words in zip(best_ids, best_scores, known)]
+
+    def results(self, queries, k=5, allowed=None, vocabulary=None):
+        """Search results as dicts for the API, one best-first list per query"""
+        return [[document_result(self.documents[doc_id], doc_id, score) for doc_id, score in found]
+                for found in self.search(queries, k, allowed, vocabulary)]
+
+
+def open_index(source_path=RAG_DATA_PATH, folder=INDEX_DIR):
+    """Load the saved vectors for a documents file, appending new documents or rebuilding if edited
+
+    The folder is locked throughout, so another process never sees appended
+    rows before the meta file that counts them.
+    """
+    documents = read_documents(source_path)
+    with folder_lock(folder):
+        return _open_locked(folder, documents)
+
+
+def _open_locked(folder, documents):
+    index = VectorIndex.load(folder, documents)
+    if index is not None and index.meta['documents'] <= len(documents):
+        count = index.meta['documents']
+        digest = documents_digest(documents[:count])
+        if digest.hexdigest() == index.meta['digest']:
+            index.documents = documents[:count]
+            if count < len(documents):
+                try:
+                    index.append(documents[count:], documents_digest(documents[count:], digest))
+                except ValueError:
+                    return VectorIndex.build(folder, documents)  # the header has no room left
+            return index
+    return VectorIndex.build(folder, documents)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide index, opening it on first use (None without a documents file)"""
+    global _index
+    with _index_lock:
+        if _index is None and os.path.exists(RAG_DATA_PATH):
+            _index = open_index()
+        return _index
+
+
+def stats():
+    """Size of the loaded index, or None before it is opened"""
+    return _index.stats() if _index is not None else None
@@ -9,18 +9,25 @@ import requests
 import json
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import PERPLEXITY_API_KEY, PERPLEXITY_API_URL, PERPLEXITY_MODEL
+from config import (PERPLEXITY_API_KEY, PERPLEXITY_API_URL, PERPLEXITY_MODEL, CACHE_DIR,
+                    WEB_SEARCH_CACHE_ENABLED, WEB_SEARCH_CACHE_TTL, WEB_SEARCH_STALE_TTL,
+                    WEB_SEARCH_CACHE_MAX_ENTRIES, SEARCH_TIMEOUT)
+from scripts import http_client
+from scripts.search_cache import SearchCache
 
 
-def web_search(query):
-    """Perform web search using Perplexity API"""
+MISSING_KEY_OUTPUT = {
+    "success": False,
+    "error": "Perplexity API key not configured. Please set PERPLEXITY_API_KEY in your .env file"
+}
 
-    if not PERPLEXITY_API_KEY:
-        return {
-            "success": False,
-            "error": "Perplexity API key not configured. Please set PERPLEXITY_API_KEY in your .env file"
-        }
+search_cache = SearchCache(os.path.join(CACHE_DIR, 'web_search.sqlite3'), WEB_SEARCH_CACHE_TTL,
+                           WEB_SEARCH_STALE_TTL, WEB_SEARCH_CACHE_MAX_ENTRIES, scope=PERPLEXITY_MODEL,
+                           timeout=SEARCH_TIMEOUT)
 
+
+def build_search_request(query):
+    """Headers and payload for the Perplexity API"""
     headers = {
         "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
         "Content-Type": "application/json"
@@ -43,36 +50,50 @@ def web_search(query):
         "return_citations": True,
         "return_related_questions": True
     }
+    return headers, payload
+
+
+def format_search_result(result):
+    """Turn a Perplexity response into the UI output, with citations appended"""
+    # Extract the response
+    content = result.get("choices", [{}])[0].get("message", {}).get("content", "No response")
+
+    # Extract citations if available
+    citations = result.get("citations", [])
+
+    # Format output
+    output = content
+
+    if citations:
+        output += "\n\n**Sources:**\n"
+        for i, citation in enumerate(citations, 1):
+            output += f"{i}. {citation}\n"
+
+    return {
+        "success": True,
+        "title": "Web Search Results",
+        "result": output,
+        "citations": citations
+    }
+
+
+def web_search(query):
+    """Perform web search using Perplexity API"""
+
+    if not PERPLEXITY_API_KEY:
+        return dict(MISSING_KEY_OUTPUT)
+
+    headers, payload = build_search_request(query)
 
     try:
-        response = requests.post(
+        response = http_client.post(
             PERPLEXITY_API_URL,
             headers=headers,
             json=payload,
-            timeout=60
+            timeout=SEARCH_TIMEOUT
         )
         response.raise_for_status()
-        result = response.json()
-
-        # Extract the response
-        content = result.get("choices", [{}])[0].get("message", {}).get("content", "No response")
-
-        # Extract citations if available
-        citations = result.get("citations", [])
-
-        # Format output
-        output = content
-
-        if citations:
-            output += "\n\n**Sources:**\n"
-            for i, citation in enumerate(citations, 1):
-                output += f"{i}. {citation}\n"
-
-        return {
-            "success": True,
-            "title": "Web Search Results",
-            "result": output
-        }
+        return format_search_result(response.json())
 
     except requests.exceptions.RequestException as e:
         return {
@@ -81,6 +102,13 @@ def web_search(query):
         }
 
 
+def cached_web_search(query):
+    """web_search through the result cache (stale results refresh in the background)"""
+    if not WEB_SEARCH_CACHE_ENABLED:
+        return web_search(query)
+    return search_cache.get(query, web_search)
+
+
 def format_output(data):
     """Format output as JSON"""
     return json.dumps(data, indent=2)
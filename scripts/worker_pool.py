@@ -0,0 +1,207 @@
+"""
+Worker Process Pool
+Keeps long-lived analysis worker processes forked from a server that has already
+imported pandas, config and the analysis scripts, so each job keeps the process
+isolation of a subprocess without paying for interpreter start-up
+"""
+import sys
+import os
+import atexit
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import TimeoutError as FutureTimeout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import POOL_WORKERS, POOL_MAX_JOBS, POOL_MAX_RSS_MB, ANALYSIS_TIMEOUT
+
+# Modules imported once in the fork server and inherited by every worker
+PRELOAD = ['config', 'pandas', 'scripts.utils', 'scripts.engine']
+
+
+class WorkerError(Exception):
+    """Raised when an analysis fails inside a worker process"""
+
+
+def current_rss():
+    """Resident memory of the current process in bytes (0 if unknown)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Peak rather than current RSS, but good enough to decide on recycling
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _worker_main(conn):
+    """Serve analysis jobs from the parent until the pipe closes"""
+    from scripts.engine import run_analysis
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        try:
+            conn.send((True, run_analysis(*job), current_rss()))
+        except Exception as e:
+            conn.send((False, str(e), current_rss()))
+    conn.close()
+
+
+class Worker:
+    """A single warm worker process and the pipe used to talk to it"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.rss = 0
+
+    def run(self, job, timeout):
+        """Send a job and wait for its result dict"""
+        self.conn.send(job)
+        if not self.conn.poll(timeout):
+            raise FutureTimeout()
+        ok, payload, rss = self.conn.recv()
+        self.jobs += 1
+        self.rss = rss
+        if not ok:
+            raise WorkerError(payload)
+        return payload
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it does not"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Fixed-size pool of warm workers, recycled after max_jobs or max_rss bytes"""
+
+    def __init__(self, size=POOL_WORKERS, max_jobs=POOL_MAX_JOBS, max_rss=POOL_MAX_RSS_MB * 1024 * 1024):
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._ctx = multiprocessing.get_context(method)
+        if method == 'forkserver':
+            self._ctx.set_forkserver_preload(PRELOAD)
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+        self.recycled = 0
+        self._idle = queue.LifoQueue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        worker = Worker(self._ctx)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop()
+
+    def execute(self, query_type, query, file_paths, timeout=ANALYSIS_TIMEOUT, cache=None):
+        """Run an analysis on a warm worker and return its output dict
+
+        Raises concurrent.futures.TimeoutError if it does not finish in time,
+        counting the wait for an idle worker; a worker that overruns is then
+        killed and replaced, like subprocess.run would. A worker that exits
+        mid-job is replaced too, and the job raises WorkerError.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise FutureTimeout()
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._idle.put(worker)
+            raise FutureTimeout()
+
+        healthy = False
+        try:
+            result = worker.run((query_type, query, file_paths, cache), remaining)
+            healthy = True
+            return result
+        except WorkerError:
+            healthy = True
+            raise
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            # The worker died mid-job (crash, OOM kill); it is replaced below
+            raise WorkerError('worker exited unexpectedly') from e
+        finally:
+            if not healthy or worker.jobs >= self.max_jobs or worker.rss >= self.max_rss:
+                self._retire(worker)
+                with self._lock:
+                    self.recycled += 1
+                worker = self._spawn()
+            self._idle.put(worker)
+
+    def stats(self):
+        """Current pool state for monitoring"""
+        with self._lock:
+            workers = list(self._workers)
+            recycled = self.recycled
+        return {
+            'workers': len(workers),
+            'idle': self._idle.qsize(),
+            'recycled': recycled,
+            'rss_bytes': sum(w.rss for w in workers),
+        }
+
+    def close(self):
+        """Stop every worker"""
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared worker pool, starting it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def execute(query_type, query, file_paths, timeout=ANALYSIS_TIMEOUT, cache=None):
+    """Run an analysis on the shared worker pool"""
+    return get_pool().execute(query_type, query, file_paths, timeout, cache)
+
+
+def stats():
+    """The shared pool's stats, or None if it has not been started"""
+    with _pool_lock:
+        pool = _pool
+    return pool.stats() if pool is not None else None
@@ -0,0 +1,46 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.aggregates import build_cube, rollup
+from scripts.streaming import CubeBuilder
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'Region': ['West', 'West', None, 'East', 'East', None],
+        'Brand': ['Coke', 'Fanta', 'Coke', 'Coke', None, 'Fanta'],
+        'Total Sales': [10.0, 20.0, 30.0, 40.0, 50.0, 60.0],
+        'Price per Unit': [1.0, np.nan, 3.0, 4.0, 5.0, 6.0],
+    })
+
+
+def test_missing_dimension_values_keep_totals(df):
+    cube = build_cube(df)
+    for by in (['Region'], ['Brand'], ['Region', 'Brand']):
+        table = rollup(cube, by)
+        assert table['Total Sales'].sum() == df['Total Sales'].sum()
+        assert table['Rows'].sum() == len(df)
+
+
+def test_averages_are_over_rows_with_values(df):
+    cube = build_cube(df)
+    overall = rollup(cube, [])
+    assert overall['Avg Price per Unit'].iloc[0] == pytest.approx(df['Price per Unit'].mean())
+    by_region = rollup(cube, ['Region'])['Avg Price per Unit']
+    assert by_region['West'] == pytest.approx(1.0)
+    assert by_region['East'] == pytest.approx(4.5)
+
+
+def test_chunked_cube_matches_whole_cube(df):
+    builder = CubeBuilder(df.iloc[:3])
+    for start in range(0, len(df), 3):
+        builder.add(df.iloc[start:start + 3], set())
+    chunked = rollup(builder.result(), ['Brand'])
+    whole = rollup(build_cube(df), ['Brand'])
+    pd.testing.assert_frame_equal(chunked, whole)
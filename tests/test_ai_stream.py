@@ -0,0 +1,27 @@
+import sys
+import os
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.utils import parse_ai_chunk
+
+
+@pytest.mark.parametrize('event, text', [
+    ({'choices': [{'delta': {'content': 'Sales '}}]}, 'Sales '),
+    ({'choices': [{'delta': {'role': 'assistant'}}]}, ''),
+    ({'choices': [{'delta': {}, 'finish_reason': 'stop'}]}, ''),
+    ({'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': 'grew'}}, 'grew'),
+    ({'type': 'message_start', 'message': {}}, ''),
+    ({'type': 'ping'}, ''),
+])
+def test_chunk_text(event, text):
+    assert parse_ai_chunk(event) == text
+
+
+def test_chunks_join_to_the_answer():
+    events = ['{"choices": [{"delta": {"content": "Top brand: "}}]}',
+              '{"choices": [{"delta": {"content": "Coke"}}]}',
+              '{"choices": [{"delta": {}, "finish_reason": "stop"}]}']
+    assert "".join(parse_ai_chunk(json.loads(e)) for e in events) == "Top brand: Coke"
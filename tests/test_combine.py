@@ -0,0 +1,52 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.combine import combine_frames
+
+
+def test_integers_and_floats_widen():
+    df = combine_frames([pd.DataFrame({'Units': np.array([1, 2], dtype='int32')}),
+                         pd.DataFrame({'Units': [2.5]})])
+    assert df['Units'].dtype == 'float64'
+    assert df['Units'].tolist() == [1, 2, 2.5]
+
+
+def test_missing_column_makes_room_for_nan():
+    df = combine_frames([pd.DataFrame({'Units': np.array([1, 2], dtype='int32'), 'Region': ['W', 'E']}),
+                         pd.DataFrame({'Region': ['N']})])
+    assert df['Units'].dtype == 'float64'
+    assert df['Units'].isna().tolist() == [False, False, True]
+
+
+def test_categories_are_merged():
+    df = combine_frames([pd.DataFrame({'Region': pd.Categorical(['West', 'East'])}),
+                         pd.DataFrame({'Region': pd.Categorical(['North', 'West'])})])
+    assert isinstance(df['Region'].dtype, pd.CategoricalDtype)
+    assert set(df['Region'].cat.categories) == {'West', 'East', 'North'}
+    assert df['Region'].tolist() == ['West', 'East', 'North', 'West']
+
+
+def test_category_and_text_stay_categorical():
+    df = combine_frames([pd.DataFrame({'Region': pd.Categorical(['West'])}),
+                         pd.DataFrame({'Region': ['South', None]})])
+    assert isinstance(df['Region'].dtype, pd.CategoricalDtype)
+    assert df['Region'].tolist()[:2] == ['West', 'South']
+    assert pd.isna(df['Region'].iloc[2])
+
+
+def test_dates_and_numbers_fall_back_to_object():
+    df = combine_frames([pd.DataFrame({'When': pd.to_datetime(['2024-01-02'])}),
+                         pd.DataFrame({'When': [2024]})])
+    assert df['When'].dtype == object
+    assert df['When'].tolist() == [pd.Timestamp(2024, 1, 2), 2024]
+
+
+def test_matches_concat_values():
+    parts = [pd.DataFrame({'Sales': [1.5, 2.0], 'City': ['Miami', 'Dallas']}),
+             pd.DataFrame({'City': ['Chicago'], 'Sales': [3.25]})]
+    expected = pd.concat(parts, ignore_index=True)
+    pd.testing.assert_frame_equal(combine_frames(parts), expected, check_dtype=False)
@@ -0,0 +1,31 @@
+import sys
+import os
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.context import fit_rows, estimate_tokens
+
+
+def test_tight_budget_keeps_every_stratum():
+    regions = ['North', 'South', 'East', 'West']
+    # Sorted so the leading rows are all one region
+    sample = pd.DataFrame({'Region': sorted(regions * 10), 'Units': range(40)})
+    header = sample.to_string().split("\n")[0]
+    budget = estimate_tokens(header) + 6 * estimate_tokens(sample.to_string().split("\n")[1])
+
+    lines = fit_rows(sample, budget, ['Region'])
+    assert 4 < len(lines) - 1 < 40
+    assert sum(estimate_tokens(line) for line in lines) <= budget
+    assert all(any(region in line for line in lines[1:]) for region in regions)
+
+
+def test_sample_that_fits_is_kept_whole():
+    sample = pd.DataFrame({'Region': ['North', 'South'], 'Units': [1, 2]})
+    assert fit_rows(sample, 1000, ['Region']) == sample.to_string().split("\n")
+
+
+def test_no_room_leaves_only_the_header():
+    sample = pd.DataFrame({'Region': ['North', 'South'], 'Units': [1, 2]})
+    header = sample.to_string().split("\n")[0]
+    assert fit_rows(sample, estimate_tokens(header), ['Region']) == [header]
@@ -0,0 +1,39 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.dataset_store import DatasetStore
+
+SALES = b'Region,Total Sales\nWest,"$1,000"\nEast,$250\n'
+
+
+def test_upload_is_parsed_once_with_typed_ingest():
+    store = DatasetStore(1024 * 1024)
+    store.put('sales.csv', SALES)
+    df = store.get('sales.csv')
+    assert df['Total Sales'].tolist() == [1000, 250]
+    assert store.get('sales.csv') is df
+    assert store.raw('sales.csv') == SALES
+
+
+def test_reupload_replaces_the_parsed_frame():
+    store = DatasetStore(1024 * 1024)
+    store.put('sales.csv', SALES)
+    used = store.used_bytes
+    store.put('sales.csv', SALES + b'South,$5\n')
+    assert store.get('sales.csv')['Total Sales'].tolist() == [1000, 250, 5]
+    assert store.stats()['entries'] == 1
+    assert store.used_bytes > used
+    assert store.used_bytes == sum(entry['memory_bytes'] for entry in store.list())
+
+
+def test_least_recently_used_upload_is_evicted():
+    one = DatasetStore(1024 * 1024).put('a.csv', SALES)['memory_bytes']
+    store = DatasetStore(2 * one + one // 2)
+    store.put('a.csv', SALES)
+    store.put('b.csv', SALES)
+    store.get('a.csv')
+    store.put('c.csv', SALES)
+    assert store.get('b.csv') is None
+    assert store.get('a.csv') is not None and store.get('c.csv') is not None
+    assert store.stats()['evictions'] == 1
@@ -0,0 +1,97 @@
+import sys
+import os
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.aggregates import build_cube
+from scripts.fast_path import parse_query, answer_table, filtered_cube
+
+
+@pytest.fixture(scope='module')
+def cube():
+    df = pd.DataFrame({
+        'Retailer': ['BevCo', 'BevCo', 'DrinkMart', 'FizzHub', 'FizzHub', 'DrinkMart'],
+        'Invoice Date': pd.to_datetime(['2022-01-05', '2022-02-10', '2022-01-20',
+                                        '2022-03-01', '2023-01-15', '2023-02-01']),
+        'State': ['Texas', 'Ohio', 'Texas', 'Iowa', 'Ohio', 'Iowa'],
+        'Beverage Brand': ['Coke', 'Sprite', 'Fanta', 'Coke', 'Sprite', 'Dasani'],
+        'Price per Unit': [0.5, 0.6, 0.4, 0.5, 0.7, 0.3],
+        'Units Sold': [100, 200, 300, 400, 500, 600],
+        'Total Sales': [50.0, 120.0, 120.0, 200.0, 350.0, 180.0],
+        'Operating Profit': [10.0, 30.0, 20.0, 80.0, 70.0, 90.0],
+    })
+    return build_cube(df)
+
+
+def answer(query, cube):
+    shape = parse_query(query, cube)
+    table, _ = answer_table(filtered_cube(cube, shape['filters'], shape['years']), shape)
+    return shape, table
+
+
+def test_top_n_by_metric(cube):
+    shape, table = answer("top 2 retailers by total sales", cube)
+    assert shape['metric'] == 'Total Sales'
+    assert list(table.index) == ['FizzHub', 'DrinkMart']
+
+
+def test_number_word_count(cube):
+    shape, table = answer("top three brands by units sold", cube)
+    assert shape['count'] == 3
+    assert len(table) == 3
+
+
+@pytest.mark.parametrize('query', [
+    "which retailer has the best customer satisfaction",
+    "top retailers by number of stores",
+    "the five best selling brands",
+    "average order size by retailer",
+    "top 10 states by profit per unit",
+    "sales per customer by state",
+    "conversion rate by retailer",
+])
+def test_unanswerable_questions_fall_through(query, cube):
+    assert parse_query(query, cube) is None
+
+
+@pytest.mark.parametrize('query', [
+    "total sales by state where price per unit is above 0.5",
+    "sales by retailer for orders over 100",
+    "top 2 states by sales where units sold is more than 200",
+    "total sales by state with units sold at least 300",
+    "total sales > 100 by retailer",
+])
+def test_threshold_filters_fall_through(query, cube):
+    assert parse_query(query, cube) is None
+
+
+@pytest.mark.parametrize('query', [
+    "sales by retailer in the first half of 2022",
+    "sales by state in H2 2022",
+    "sales by retailer in Q1 2023",
+    "sales by retailer between 2022 and 2023",
+    "sales by state since 2022",
+])
+def test_partial_periods_fall_through(query, cube):
+    assert parse_query(query, cube) is None
+
+
+@pytest.mark.parametrize('query', [
+    "sales by state and brand",
+    "top 2 brands by sales per state",
+    "total sales by retailer by month",
+])
+def test_several_groupings_fall_through(query, cube):
+    assert parse_query(query, cube) is None
+
+
+def test_growth_phrases_are_not_thresholds(cube):
+    assert parse_query("sales growth month over month", cube)['kind'] == 'growth'
+
+
+def test_column_named_per_unit_is_answered(cube):
+    shape = parse_query("price per unit by state", cube)
+    assert shape['metric'] == 'Price per Unit'
+    assert shape['dimension'] == 'State'
@@ -0,0 +1,55 @@
+import sys
+import os
+import io
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.file_store import FileStore, upload_name
+from scripts.sidecar import read_metadata, write_metadata
+
+
+def test_edited_upload_keeps_its_metadata(tmp_path):
+    store = FileStore(str(tmp_path))
+    first, _ = store.save('sales.csv', io.BytesIO(b'Date,Units\n01/02/2024,3\n'))
+    write_metadata(first, {'date_formats': {'Date': '%m/%d/%Y'}})
+
+    second, _ = store.save('sales.csv', io.BytesIO(b'Date,Units\n01/02/2024,3\n01/03/2024,4\n'))
+    assert second != first
+    assert upload_name(second) == 'sales.csv'
+    assert read_metadata(second) == {'date_formats': {'Date': '%m/%d/%Y'}}
+
+
+def test_plain_files_have_no_upload_name(tmp_path):
+    path = tmp_path / 'sales.csv'
+    path.write_text('Units\n3\n')
+    assert upload_name(str(path)) is None
+    write_metadata(str(path), {'date_formats': {}})
+    assert read_metadata(str(path)) == {'date_formats': {}}
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = FileStore(str(tmp_path))
+    content = b'Region,Units\nWest,3\n'
+    first, created = store.save('sales.csv', io.BytesIO(content))
+    assert created
+    again, created = store.save('copy of sales.csv', io.BytesIO(content))
+    assert not created
+    assert again == first
+    assert os.listdir(store.objects) == [os.path.basename(first)]
+    assert store.resolve('sales.csv') == store.resolve('copy of sales.csv') == first
+    assert [f['name'] for f in store.list(('.csv',))] == ['copy of sales.csv', 'sales.csv']
+
+
+def test_reupload_points_the_name_at_new_content(tmp_path):
+    store = FileStore(str(tmp_path))
+    first, _ = store.save('sales.csv', io.BytesIO(b'Units\n3\n'))
+    second, created = store.save('sales.csv', io.BytesIO(b'Units\n4\n'))
+    assert created
+    assert store.resolve('sales.csv') == second != first
+    assert open(second, 'rb').read() == b'Units\n4\n'
+
+
+def test_resolve_rejects_paths_outside_the_folder(tmp_path):
+    store = FileStore(str(tmp_path / 'data'))
+    (tmp_path / 'secret.csv').write_text('x\n1\n')
+    assert store.resolve('../secret.csv') is None
+    assert store.resolve('.names.json') is None
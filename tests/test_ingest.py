@@ -0,0 +1,72 @@
+import sys
+import os
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.ingest import parse_formatted_numbers, convert_numeric_columns, ingest
+
+
+def test_currency_and_thousands():
+    numbers = parse_formatted_numbers(pd.Series(['$6,000 ', ' $1,234.50', '($1,200)', '12,000']))
+    assert numbers.tolist() == [6000, 1234.5, -1200, 12000]
+
+
+def test_percent_becomes_a_fraction():
+    numbers = parse_formatted_numbers(pd.Series(['50%', '12.5%', '-3%']))
+    assert numbers.tolist() == pytest.approx([0.5, 0.125, -0.03])
+
+
+def test_blanks_stay_missing():
+    numbers = parse_formatted_numbers(pd.Series(['$1,000', '', None, '$2']))
+    assert numbers[[0, 3]].tolist() == [1000, 2]
+    assert numbers[[1, 2]].isna().all()
+
+
+@pytest.mark.parametrize('values', [
+    ['50%', '$3'],  # percent mixed with other numbers
+    ['$1,000', 'n/a'],  # a value that is not a number
+    ['1000', '2000'],  # plain numbers are left to read_csv
+    ['North', 'South'],
+])
+def test_columns_that_are_not_formatted_numbers(values):
+    assert parse_formatted_numbers(pd.Series(values)) is None
+
+
+def test_convert_downcasts_and_leaves_text():
+    df = convert_numeric_columns(pd.DataFrame({
+        'Total Sales': ['$6,000', '$12,500'],
+        'Margin': ['35%', '40%'],
+        'Region': ['West', 'East'],
+    }))
+    assert df['Total Sales'].dtype == 'int32'
+    assert df['Total Sales'].tolist() == [6000, 12500]
+    assert df['Margin'].tolist() == pytest.approx([0.35, 0.4])
+    assert df['Region'].tolist() == ['West', 'East']
+
+
+def test_date_format_is_inferred_and_reported():
+    df, report = ingest(pd.DataFrame({'Invoice Date': ['01/02/2024', '12/31/2023', '03/15/2024']}))
+    assert report['date_formats'] == {'Invoice Date': '%m/%d/%Y'}
+    assert df['Invoice Date'].tolist() == [pd.Timestamp(2024, 1, 2), pd.Timestamp(2023, 12, 31),
+                                          pd.Timestamp(2024, 3, 15)]
+
+
+def test_known_date_format_is_tried_first():
+    # Ambiguous on its own; month-first would be inferred
+    dates = pd.DataFrame({'Date': ['01/02/2024', '03/04/2024']})
+    df, report = ingest(dates, {'Date': '%d/%m/%Y'})
+    assert report['date_formats'] == {'Date': '%d/%m/%Y'}
+    assert df['Date'].tolist() == [pd.Timestamp(2024, 2, 1), pd.Timestamp(2024, 4, 3)]
+
+
+def test_stale_date_format_falls_back_to_inference():
+    df, report = ingest(pd.DataFrame({'Date': ['2024-01-02', '2024-03-04']}), {'Date': '%m/%d/%Y'})
+    assert report['date_formats'] == {'Date': '%Y-%m-%d'}
+    assert df['Date'].tolist() == [pd.Timestamp(2024, 1, 2), pd.Timestamp(2024, 3, 4)]
+
+
+def test_text_is_not_a_date():
+    _, report = ingest(pd.DataFrame({'City': ['Chicago', 'Miami', 'Dallas']}))
+    assert report['date_formats'] == {}
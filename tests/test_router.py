@@ -0,0 +1,33 @@
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ROUTER_MAX_INTENTS
+from scripts.router import router
+
+
+def route_names(query):
+    return [name for name, _, _ in router.route(query, ROUTER_MAX_INTENTS)]
+
+
+def test_multi_intent_query_routes_every_part():
+    assert sorted(route_names("compare top regions by profit over time")) == \
+        ['compare', 'profit', 'region', 'trend']
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("what are the most profitable states", ['profit']),
+    ("top regions", ['region']),
+    ("top 5 brands by sales", ['top']),
+    ("first time buyers", ['custom']),
+    ("summarize this data", ['summary']),
+    ("tell me about sales by region", ['region']),
+])
+def test_single_intent_queries(query, expected):
+    assert route_names(query) == expected
+
+
+def test_weaker_intents_are_cut():
+    assert route_names("trend over time, monthly trends and growth by region") == ['trend']
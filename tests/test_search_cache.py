@@ -0,0 +1,52 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.search_cache import SearchCache
+
+
+def make_cache(tmp_path):
+    return SearchCache(str(tmp_path / 'search.sqlite3'), ttl=60, stale_ttl=60, max_entries=100, timeout=5)
+
+
+def test_concurrent_misses_share_one_fetch(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    def fetch(query):
+        calls.append(query)
+        time.sleep(0.2)
+        return {'success': True, 'result': query}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('Same query?', fetch)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert cache.get('same query', fetch) == {'success': True, 'result': 'Same query?'}
+    assert len(calls) == 1
+
+
+def test_concurrent_async_misses_share_one_fetch(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    async def fetch(query):
+        calls.append(query)
+        await asyncio.sleep(0.2)
+        return {'success': True, 'result': query}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_async('same query', fetch) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result == {'success': True, 'result': 'same query'} for result in results)
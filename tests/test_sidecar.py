@@ -0,0 +1,35 @@
+import sys
+import os
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.sidecar import SIDECAR_AVAILABLE, read_sidecar, write_sidecar, sidecar_path
+from scripts.utils import load_file
+
+pytestmark = pytest.mark.skipif(not SIDECAR_AVAILABLE, reason="pyarrow is not installed")
+
+
+def write_csv(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+def test_sidecar_is_read_while_the_source_is_unchanged(tmp_path):
+    source = tmp_path / 'sales.csv'
+    write_csv(source, 'Region,Units\nWest,3\n', 1_000_000)
+    assert write_sidecar(str(source), pd.DataFrame({'Region': ['West'], 'Units': [3]}))
+    assert read_sidecar(str(source))['Units'].tolist() == [3]
+
+
+def test_changed_source_invalidates_the_sidecar(tmp_path):
+    source = tmp_path / 'sales.csv'
+    write_csv(source, 'Region,Units\nWest,3\n', 1_000_000)
+    assert load_file(str(source))['Units'].tolist() == [3]
+    assert os.path.exists(sidecar_path(str(source)))
+
+    # Edited after the sidecar was written
+    write_csv(source, 'Region,Units\nWest,3\nEast,4\n', os.path.getmtime(sidecar_path(str(source))) + 10)
+    assert read_sidecar(str(source)) is None
+    assert load_file(str(source))['Units'].tolist() == [3, 4]
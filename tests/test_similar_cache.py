@@ -0,0 +1,53 @@
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.similar_cache import SimilarQueryCache, normalize_query
+
+BASE = "top 5 brands by sales in 2023"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SimilarQueryCache(str(tmp_path / 'similar.sqlite3'), ttl=3600, threshold=0.85)
+    cache.put('top:data', BASE, 'base answer')
+    return cache
+
+
+@pytest.mark.parametrize('query', [
+    "what are the five best selling brands in 2023",
+    "Top 5 brands by sales in 2023?",
+    "list the top 5 brands by sales for 2023",
+    "ranking of the top 5 brands by sales in 2023",
+    "in 2023, top 5 brands by sales",
+])
+def test_rewording_hits(cache, query):
+    assert cache.get('top:data', query) == 'base answer'
+
+
+@pytest.mark.parametrize('query', [
+    BASE + " excluding Texas",
+    BASE + " in California",
+    "top 10 brands by sales in 2023",
+    "top 5 brands by sales in 2022",
+    "bottom 5 brands by sales in 2023",
+    "top 5 brands by sales over $1M in 2023",
+    "top 5 brands by profit in 2023",
+    "top 5 regions by sales in 2023",
+    "top 5 brands by sales in 2023 in texas",
+])
+def test_near_misses_do_not_hit(cache, query):
+    assert cache.get('top:data', query) is None
+
+
+def test_over_is_not_a_trend_word():
+    assert 'trend' not in normalize_query("sales over $1M")
+
+
+def test_guard_alone_matches_only_the_same_guard(tmp_path):
+    cache = SimilarQueryCache(str(tmp_path / 'similar.sqlite3'), ttl=3600, threshold=0.85)
+    cache.put('top:data', "top 5 in 2023", 'guard answer')
+    assert cache.get('top:data', "2023 top five") == 'guard answer'
+    assert cache.get('top:data', "top 5 brands in 2023") is None
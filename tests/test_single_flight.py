@@ -0,0 +1,98 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.single_flight import SingleFlight, AsyncSingleFlight
+
+
+def test_follower_gets_result_after_leader_disconnects():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def events():
+        yield 'chunk', 'first'
+        release.wait(5)
+        yield 'chunk', 'second'
+        yield 'done', 'result'
+
+    leader = flights.stream('key', events, 5)
+    assert next(leader) == ('chunk', 'first')
+
+    received = []
+    follower = threading.Thread(target=lambda: received.extend(flights.stream('key', events, 5)))
+    follower.start()
+    while not flights.stats()['followers']:
+        time.sleep(0.01)
+    leader.close()  # the leader's client went away
+    release.set()
+    follower.join(5)
+
+    assert received == [('chunk', 'first'), ('chunk', 'second'), ('done', 'result')]
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_flight_is_cancelled_when_nobody_listens():
+    flights = SingleFlight()
+
+    def events():
+        yield 'chunk', 'first'
+        yield 'done', 'result'
+
+    leader = flights.stream('key', events, 5)
+    next(leader)
+    flight = flights._flights['key']
+    leader.close()
+
+    assert flights.stats()['in_flight'] == 0
+    with pytest.raises(RuntimeError):
+        list(flights.follow('key', flight, 5))
+
+
+def test_async_follower_gets_result_after_leader_disconnects():
+    async def scenario():
+        flights = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def events():
+            yield 'chunk', 'first'
+            await release.wait()
+            yield 'done', 'result'
+
+        leader = flights.stream('key', events, 5)
+        assert await leader.__anext__() == ('chunk', 'first')
+        follower = asyncio.create_task(flights.run('key', lambda: None, 5))
+        while not flights.stats()['followers']:
+            await asyncio.sleep(0.01)
+        await leader.aclose()
+        release.set()
+        return await asyncio.wait_for(follower, 5)
+
+    assert asyncio.run(scenario()) == 'result'
+
+
+def test_async_flight_is_cancelled_when_nobody_listens():
+    async def scenario():
+        flights = AsyncSingleFlight()
+        cancelled = asyncio.Event()
+
+        async def events():
+            yield 'chunk', 'first'
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            yield 'done', 'result'
+
+        leader = flights.stream('key', events, 5)
+        await leader.__anext__()
+        await asyncio.sleep(0)
+        await leader.aclose()
+        await asyncio.wait_for(cancelled.wait(), 5)
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.streaming import ChunkedDataset
+from scripts.context import profile_frame
+from scripts.ingest import ingest
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 103
+    df = pd.DataFrame({
+        'Invoice Date': pd.date_range('2023-01-01', periods=n, freq='3D').strftime('%m/%d/%Y'),
+        'Region': rng.choice(['West', 'East', 'South', 'Midwest'], n),
+        'Brand': rng.choice(['Coke', 'Fanta', 'Sprite'], n),
+        'Units Sold': rng.integers(100, 5000, n),
+        'Total Sales': [f"${v:,.2f}" for v in rng.uniform(100, 20000, n)],
+    })
+    path = tmp_path / 'sales.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_chunked_profile_matches_in_memory(csv_path):
+    streamed = ChunkedDataset([csv_path], chunk_rows=10).profile()
+    expected = profile_frame(ingest(pd.read_csv(csv_path))[0])
+
+    assert streamed['rows'] == expected['rows']
+    assert list(streamed['dtypes'].index) == list(expected['dtypes'].index)
+    pd.testing.assert_frame_equal(streamed['numeric'], expected['numeric'], check_exact=False, rtol=1e-9)
+    assert streamed['dates'] == expected['dates']
+    assert streamed['strata'] == expected['strata']
+    for column in expected['strata']:
+        assert streamed['counts'][column].to_dict() == expected['counts'][column].to_dict()
+
+
+def test_chunked_sample_covers_every_stratum(csv_path):
+    profile = ChunkedDataset([csv_path], chunk_rows=10).profile(max_rows=8)
+    sample = profile['sample']
+    assert len(sample) == 8
+    for column in profile['strata']:
+        assert set(sample[column]) == set(profile['counts'][column].index)
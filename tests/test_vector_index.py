@@ -0,0 +1,83 @@
+import sys
+import os
+import json
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.vector_index import VectorIndex, append_rows, open_index, VECTOR_DIM
+from scripts.search_index import document_tokens
+
+
+@pytest.fixture
+def index(tmp_path):
+    documents = [{'content': text} for text in [
+        'quarterly sales grew in the west region',
+        'profit margins fell for diet drinks',
+        'the northeast region had the most stores',
+        'bottled water sales rose in summer',
+    ]]
+    return VectorIndex.build(str(tmp_path), documents)
+
+
+def test_known_words_find_documents(index):
+    found = index.search(['profit margins'], k=2)[0]
+    assert found[0][0] == 1
+
+
+@pytest.mark.parametrize('query', ['the of', 'zzzz qqqq', ''])
+def test_query_without_known_words_finds_nothing(index, query):
+    vocabulary = {t for doc in index.documents for t in document_tokens(doc)}
+    found = index.search([query, 'profit margins'], k=3, vocabulary=vocabulary)
+    assert found[0] == []
+    assert found[1]
+
+
+def test_stopword_query_finds_nothing_without_vocabulary(index):
+    assert index.search(['the of'], k=3) == [[]]
+
+
+def npy_without_room(path, rows):
+    """A .npy file with a compact header and no room to grow, as older writers leave"""
+    dictionary = "{'descr':'<f4','fortran_order':False,'shape':(%d,%d)}" % rows.shape
+    while (10 + len(dictionary) + 1) % 64:
+        dictionary = dictionary[:-1] + ' }'
+    with open(path, 'wb') as f:
+        f.write(b'\x93NUMPY\x01\x00' + (len(dictionary) + 1).to_bytes(2, 'little'))
+        f.write(dictionary.encode('latin1') + b'\n')
+        f.write(rows.tobytes())
+
+
+def test_append_that_cannot_fit_leaves_file_untouched(tmp_path):
+    path = str(tmp_path / 'vectors.npy')
+    npy_without_room(path, np.ones((9, 2), dtype=np.float32))
+    before = open(path, 'rb').read()
+    assert np.load(path).shape == (9, 2)
+
+    with pytest.raises(ValueError):
+        append_rows(path, np.zeros((1, 2), dtype=np.float32))
+    assert open(path, 'rb').read() == before
+
+
+def test_append_rows_grows_in_place(tmp_path):
+    path = str(tmp_path / 'vectors.npy')
+    np.save(path, np.ones((9, 2), dtype=np.float32))
+    append_rows(path, np.zeros((3, 2), dtype=np.float32))
+    loaded = np.load(path)
+    assert loaded.shape == (12, 2)
+    assert loaded[9:].sum() == 0
+
+
+def test_rows_without_meta_are_rebuilt(tmp_path):
+    source = tmp_path / 'rag_data.json'
+    folder = str(tmp_path / 'index')
+    documents = [{'content': 'sales grew in the west'}, {'content': 'profit fell in the east'}]
+    source.write_text(json.dumps(documents))
+    open_index(str(source), folder)
+
+    # An append whose meta write never happened
+    append_rows(os.path.join(folder, 'vectors.npy'), np.ones((3, VECTOR_DIM), dtype=np.float32))
+    index = open_index(str(source), folder)
+    assert len(index.vectors) == len(index.documents) == 2
+    assert index.results(['profit east'], k=5)[0][0]['id'] == 1